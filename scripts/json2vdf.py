@@ -24,32 +24,19 @@
 
 import json
 
-def json2vdf(stream):
+from steamcontroller import vdf
 
-    """
-    Read a json file and return a string in Steam vdf format
-    """
 
-    def _istr(ident, string):
-        return (ident * '\t') + string
+def _load(stream):
+    return json.load(stream, object_pairs_hook=vdf.VDFDict)
 
-    data = json.loads(stream.read(), object_pairs_hook=list)
 
-    def _json2vdf(data, indent):
-        out = ''
-        for k, val in data:
-            if isinstance(val, list):
-                if indent:
-                    out += '\n'
-                out += _istr(indent, '"{}"\n'.format(k))
-                out += _istr(indent, '{\n')
-                out += _json2vdf(val, indent + 1)
-                out += _istr(indent, '}\n')
-            else:
-                out += _istr(indent, '"{}" "{}"\n'.format(k, val))
-        return out
+def json2vdf(stream):
 
-    return  _json2vdf(data, 0)
+    """
+    Read a json file and return a string in Steam vdf format
+    """
+    return vdf.dumps(_load(stream))
 
 
 def main():
@@ -69,7 +56,7 @@ def main():
                         help='output vdf file (stdout if not specified)')
 
     args = parser.parse_args()
-    args.output.write(json2vdf(args.input))
+    vdf.dump(_load(args.input), args.output)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam Controller capture analysis (requires NumPy)"""
+
+import sys
+import json
+import argparse
+from steamcontroller.analysis import analyze, flatten
+from steamcontroller.profiles import summary
+
+def _main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('captures', metavar='FILE', nargs='+',
+                        help='capture files recorded with sc-dump.py -o')
+    parser.add_argument('-j', '--json', action='store_true',
+                        help='print a json document per capture')
+    args = parser.parse_args()
+
+    for path in args.captures:
+        try:
+            result = analyze(path)
+        except (IOError, OSError, ValueError) as e:
+            sys.stderr.write('{}: {}\n'.format(path, e))
+            continue
+        if args.json:
+            print(json.dumps({path: result}, sort_keys=True))
+        else:
+            print(path)
+            sys.stdout.write(summary(flatten(result)))
+
+
+if __name__ == '__main__':
+    _main()
@@ -25,21 +25,56 @@
 """Steam Controller USB Dumper"""
 
 import sys
-from steamcontroller import SteamController
+import argparse
+from steamcontroller import SteamController, VENDOR_ID, PRODUCT_ID
+from steamcontroller.capture import open_capture
+from steamcontroller.transport import ReplayTransport
 
 def dump(_, sci):
     print(sci)
 
 def _main():
 
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-i', '--input', metavar='FILE',
+                        help='read reports from a capture file instead of the controller')
+    parser.add_argument('-s', '--speed', type=float, default=0.0, metavar='FACTOR',
+                        help='replay speed of --input: 1 for real time, 2 twice as fast, '
+                             '0 as fast as possible (default)')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write raw reports to a binary capture file instead of printing them')
+    args = parser.parse_args()
+    if args.speed < 0:
+        parser.error('--speed must not be negative')
+
+    transport = None
+
+    sc = None
+    capture = None
     try:
-        sc = SteamController(callback=dump)
+        vendor, product = VENDOR_ID, PRODUCT_ID
+        if args.input:
+            transport = ReplayTransport(args.input, speed=args.speed or None)
+            # keep the ids of the captured device (wireless receiver...)
+            vendor, product = transport.vendor, transport.product
+        if args.output:
+            capture = open_capture(args.output, 'w', vendor=vendor, product=product)
+            sc = SteamController(callback=lambda *args: None, transport=transport)
+            sc.setCapture(capture)
+        else:
+            sc = SteamController(callback=dump, transport=transport)
         sc.run()
     except KeyboardInterrupt:
         pass
     except Exception as e:
         sys.stderr.write(str(e) + '\n')
 
+    if capture is not None:
+        capture.close()
+
+    if sc is not None:
+        sys.stderr.write('{received} reports, {dropped} dropped, {out_of_order} out of order\n'.format(**sc.stats()))
+
     print("Bye")
 
 
@@ -22,99 +22,99 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-"""Steam Controller gyro data plot"""
+"""Steam Controller report fields plot, gyro data by default"""
+
+import time
+import argparse
+from collections import OrderedDict
 
-from steamcontroller import SteamController
 from PySide import QtGui
 import pyqtgraph as pg
-import time
-import struct
+
+from steamcontroller import SCStatus
+from steamcontroller.capture import CaptureRing, CLOCK_MONOTONIC
+from steamcontroller.decoder import FIELD_OFFSETS
+from steamcontroller.manager import ControllerManager
+from steamcontroller.transport import LibUSBBus, ReplayBus
+
+IMU = ['gpitch', 'groll', 'gyaw', 'q1', 'q2', 'q3', 'q4']
+
+# Reports per second the rings are sized for (wired controllers are the
+# fastest)
+MAX_RATE = 1000
 
 run = True
-times = []
+
 
 def _main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-f', '--fields', nargs='+', default=IMU, metavar='FIELD',
+                        choices=list(FIELD_OFFSETS),
+                        help='report fields to plot: ' + ' '.join(FIELD_OFFSETS))
+    parser.add_argument('-w', '--window', type=float, default=10.0, metavar='SECONDS',
+                        help='time window shown')
+    parser.add_argument('-r', '--rate', type=float, default=30.0, metavar='HZ',
+                        help='redraws per second')
+    parser.add_argument('-i', '--input', nargs='+', metavar='FILE',
+                        help='replay capture files (looped) instead of the controllers')
+    args = parser.parse_args()
+
     app = QtGui.QApplication([])
 
     win = pg.GraphicsWindow(title="Steam Controller")
-    win.resize(1000, 600)
-    win.nextRow()
-
-    p1 = win.addPlot(name="plot1", title='Pitch')
-    win.nextColumn()
-
-    p2 = win.addPlot(name="plot2", title='Roll')
-    p2.setYLink("plot1")
-    win.nextColumn()
-
-    p3 = win.addPlot(name="plot3", title='Yaw')
-    p3.setYLink("plot1")
-    win.nextRow()
-
-    p4 = win.addPlot(name="plot4", title='Others', colspan=5)
-    win.nextRow()
-
-
-    p1.addLegend()
-    p1.showGrid(x=True, y=True, alpha=0.5)
-    p1.setYRange(-8000, 8000)
-
-    p2.addLegend()
-    p2.showGrid(x=True, y=True, alpha=0.5)
-    p2.setYRange(-8000, 8000)
-
-    p3.addLegend()
-    p3.showGrid(x=True, y=True, alpha=0.5)
-    p3.setYRange(-8000, 8000)
-
-    p4.addLegend()
-    p4.showGrid(x=True, y=True, alpha=0.5)
-    p4.setYRange(-32767, 32767)
-
-
-    imu = {
-        'gpitch' : [],
-        'groll'  : [],
-        'gyaw'   : [],
-        'q1'     : [],
-        'q2'     : [],
-        'q3'     : [],
-        'q4'     : [],
-    }
-
-    curves = {
-        'gpitch' : p1.plot(times, [], pen=(0, 2), name='vel'),
-        'groll'  : p2.plot(times, [], pen=(0, 2), name='vel'),
-        'gyaw'   : p3.plot(times, [], pen=(0, 2), name='vel'),
-        'q1'     : p4.plot(times, [], pen=(0, 4), name='1'),
-        'q2'     : p4.plot(times, [], pen=(1, 4), name='2'),
-        'q3'     : p4.plot(times, [], pen=(2, 4), name='3'),
-        'q4'     : p4.plot(times, [], pen=(3, 4), name='4'),
-    }
-
-    def update(sc, sci):
-        global times
-        if sci.status != 15361:
-            return
-        cur = time.time()
-        times.append(cur)
-        times = [x for x in times if cur - x <= 10.0]
-
-        for name in imu.keys():
-            imu[name].append(sci._asdict()[name])
-            imu[name] = imu[name][-len(times):]
-            curves[name].setData(times, imu[name])
+    win.resize(1000, 150 * len(args.fields))
+
+    plots = OrderedDict()
+    for field in args.fields:
+        plot = win.addPlot(name=field, title=field)
+        plot.addLegend()
+        plot.showGrid(x=True, y=True, alpha=0.5)
+        plot.setXRange(-args.window, 0)
+        # only the visible part is drawn, decimated keeping the peaks
+        plot.setClipToView(True)
+        plot.setDownsampling(auto=True, mode='peak')
+        if plots:
+            plot.setXLink(args.fields[0])
+        plots[field] = plot
+        win.nextRow()
+
+    rings = OrderedDict()
+    curves = {}
+
+    def factory(name):
+        # one ring and one curve per plot for each controller, kept when it
+        # reconnects
+        rings[name] = CaptureRing(int(args.window * MAX_RATE), clock=CLOCK_MONOTONIC)
+        pen = len(curves)
+        curves[name] = [(field, plot.plot(pen=(pen, 4), name=name))
+                        for field, plot in plots.items()]
+        # reports are recorded by the ring, nothing to do per report
+        return (lambda sc, sci: None), None, None, []
+
+    def opened(name, sc):
+        # before the first report of each connection
+        sc.setCapture(rings[name])
+        sc.setGyro(True)
+
+    def redraw(now):
+        for name, ring in rings.items():
+            recs = ring.window(args.window)
+            # the ring records every report, idle and status ones have no
+            # field values
+            recs = recs[recs['status'] == int(SCStatus.Input)]
+            if len(recs) == 0:
+                continue
+            t = recs['timestamp'] - now
+            for field, curve in curves[name]:
+                curve.setData(t, recs[field])
+
+    if args.input:
+        bus = ReplayBus(args.input, speed=1.0, loop=True)
+    else:
+        bus = LibUSBBus()
+    manager = ControllerManager(bus, factory, on_open=opened)
 
-    app.processEvents()
-    sc = SteamController(callback=update)
-    sc.handleEvents()
-    sc._sendControl(struct.pack('>' + 'I' * 6,
-                                0x87153284,
-                                0x03180000,
-                                0x31020008,
-                                0x07000707,
-                                0x00301400,
-                                0x2f010000))
     def closeEvent(event):
         global run
         run = False
@@ -123,14 +123,22 @@ def _main():
     win.closeEvent = closeEvent
     app.processEvents()
 
+    period = 1.0 / args.rate
+    next_draw = time.monotonic()
     try:
-        i = 0
+        manager.scan()
         while run:
-            i = i + 1
-            sc.handleEvents()
-            app.processEvents()
+            # usb reports until the next redraw, whatever their rate
+            manager.poll(max(0.0, next_draw - time.monotonic()))
+            now = time.monotonic()
+            if now >= next_draw:
+                redraw(now)
+                app.processEvents()
+                next_draw = now + period
     except KeyboardInterrupt:
         print("Bye")
+    finally:
+        manager.close()
 
 
 if __name__ == '__main__':
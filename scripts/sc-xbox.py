@@ -32,25 +32,39 @@ from steamcontroller import \
 import steamcontroller.uinput
 import steamcontroller.tools
 
-from steamcontroller.uinput import Keys
-from steamcontroller.uinput import Axes
+import os
+from operator import itemgetter
+
+# plain int codes, the Keys/Axes enums are not needed on the hot path
+from steamcontroller.uinput import BTN_A, BTN_B, BTN_X, BTN_Y, BTN_TL, BTN_TR, \
+    BTN_SELECT, BTN_START, BTN_MODE, BTN_THUMBL, BTN_THUMBR
+from steamcontroller.uinput import ABS_X, ABS_Y, ABS_RX, ABS_RY, ABS_Z, ABS_RZ, \
+    ABS_HAT0X, ABS_HAT0Y
 from steamcontroller.daemon import Daemon
 from steamcontroller.tools  import static_vars
+from steamcontroller.mapper import ButtonMapper
+from steamcontroller.latency import LatencyRecorder
+from steamcontroller.mapping import create_devices, compile_config, MappingEngine, XBOX360_CONFIG
+from steamcontroller.manager import ControllerManager
+from steamcontroller import vdf
+from steamcontroller.profiles import ProfileWatcher, install_signal_handler
+from steamcontroller.supervisor import Supervisor
+from steamcontroller.transport import HotplugMonitor, LibUSBBus
 
 button_map = {
-    SCButtons.A      : Keys.BTN_A,
-    SCButtons.B      : Keys.BTN_B,
-    SCButtons.X      : Keys.BTN_X,
-    SCButtons.Y      : Keys.BTN_Y,
-    SCButtons.LB     : Keys.BTN_TL,
-    SCButtons.RB     : Keys.BTN_TR,
-    SCButtons.Back   : Keys.BTN_SELECT,
-    SCButtons.Start  : Keys.BTN_START,
-    SCButtons.Steam  : Keys.BTN_MODE,
-    SCButtons.LPad   : Keys.BTN_THUMBL,
-    SCButtons.RPad   : Keys.BTN_THUMBR,
-    SCButtons.LGrip  : Keys.BTN_A,
-    SCButtons.RGrip  : Keys.BTN_B,
+    SCButtons.A      : BTN_A,
+    SCButtons.B      : BTN_B,
+    SCButtons.X      : BTN_X,
+    SCButtons.Y      : BTN_Y,
+    SCButtons.LB     : BTN_TL,
+    SCButtons.RB     : BTN_TR,
+    SCButtons.Back   : BTN_SELECT,
+    SCButtons.Start  : BTN_START,
+    SCButtons.Steam  : BTN_MODE,
+    SCButtons.LPad   : BTN_THUMBL,
+    SCButtons.RPad   : BTN_THUMBR,
+    SCButtons.LGrip  : BTN_A,
+    SCButtons.RGrip  : BTN_B,
 }
 
 LPAD_OUT_FILTER = 6
@@ -99,71 +113,193 @@ def lpad_func(idx, x, btn, threshold, evstick, evtouch, clicked, invert):
 
 
 axis_map = {
-    'ltrig'  : lambda x, btn: [(Axes.ABS_Z,  x, False)],
-    'rtrig'  : lambda x, btn: [(Axes.ABS_RZ, x, False)],
-    'lpad_x' : lambda x, btn: lpad_func(0, x, btn, 20000, Axes.ABS_X, Axes.ABS_HAT0X, False, False),
-    'lpad_y' : lambda x, btn: lpad_func(1, x, btn, 20000, Axes.ABS_Y, Axes.ABS_HAT0Y, False, True),
-    'rpad_x' : lambda x, btn: [(Axes.ABS_RX, x, False)],
-    'rpad_y' : lambda x, btn: [(Axes.ABS_RY, -x, False)],
+    'ltrig'  : lambda x, btn: [(ABS_Z,  x, False)],
+    'rtrig'  : lambda x, btn: [(ABS_RZ, x, False)],
+    'lpad_x' : lambda x, btn: lpad_func(0, x, btn, 20000, ABS_X, ABS_HAT0X, False, False),
+    'lpad_y' : lambda x, btn: lpad_func(1, x, btn, 20000, ABS_Y, ABS_HAT0Y, False, True),
+    'rpad_x' : lambda x, btn: [(ABS_RX, x, False)],
+    'rpad_y' : lambda x, btn: [(ABS_RY, -x, False)],
 }
 
-@static_vars(prev_buttons=0, prev_key_events=set(), prev_abs_events=set())
+button_mapper = ButtonMapper(button_map, {SCButtons.LPad: SCButtons.LPadTouch})
+
+axis_names = tuple(axis_map.keys())
+axis_values = itemgetter(*axis_names)
+
+def lpad_pending():
+    """True while lpad filters still need reports to settle"""
+    return lpad_func.fb_flt > 0 or lpad_func.out_flt[0] > 0 or lpad_func.out_flt[1] > 0
+
+@static_vars(prev_buttons=0, prev_axes=None, prev_abs_events=set())
 def scInput2Uinput(sc, sci, xb):
 
     if sci.status != SCStatus.Input:
         return
 
-    removed = scInput2Uinput.prev_buttons ^ sci.buttons
+    buttons = sci.buttons
+    axes = axis_values(sci)
 
-    key_events = []
-    abs_events = []
-
-    for btn, ev in button_map.items():
+    # Idle report: nothing changed and no filter is counting down
+    if (buttons == scInput2Uinput.prev_buttons and
+            axes == scInput2Uinput.prev_axes and
+            not lpad_pending()):
+        return
 
-        if btn == SCButtons.LPad and sci.buttons & SCButtons.LPadTouch:
-            key_events.append((ev, 0))
-        else:
-            if sci.buttons & btn:
-                key_events.append((ev, 1))
-            elif removed & btn:
-                key_events.append((ev, 0))
+    for ev in button_mapper.update(buttons):
+        xb.queueKey(*ev)
 
-    for name, func in axis_map.items():
-        for ev, val, feedback in func(sci._asdict()[name], sci.buttons):
+    abs_events = []
+    for name, x in zip(axis_names, axes):
+        for ev, val, feedback in axis_map[name](x, buttons):
             if ev != None:
                 abs_events.append((ev, val, name if feedback else None))
 
-
-
-    new = False
-    for ev in key_events:
-        if ev not in scInput2Uinput.prev_key_events:
-            xb.keyEvent(*ev)
-            new = True
-
     for ev in abs_events:
         if ev not in scInput2Uinput.prev_abs_events:
-            xb.axisEvent(*ev[:2])
+            xb.queueAxis(*ev[:2])
             sc.addFeedback(ev[2])
-            new = True
-    if new:
-        xb.synEvent()
 
-    scInput2Uinput.prev_key_events = set(key_events)
+    xb.flush()
+
     scInput2Uinput.prev_abs_events = set(abs_events)
-    scInput2Uinput.prev_buttons = sci.buttons
+    scInput2Uinput.prev_buttons = buttons
+    scInput2Uinput.prev_axes = axes
+
+def releaseUinput(xb):
+    """Release buttons and center axes, the controller is gone"""
+    for ev in button_mapper.reset():
+        xb.queueKey(*ev)
+    for ev, val, _ in scInput2Uinput.prev_abs_events:
+        if val:
+            xb.queueAxis(ev, 0)
+    xb.flush()
+    scInput2Uinput.prev_abs_events = set()
+    scInput2Uinput.prev_buttons = 0
+    scInput2Uinput.prev_axes = None
+    lpad_func.out_flt = [0, 0]
+    lpad_func.fb_flt = 0
+    lpad_func.prev_btn = 0
+
+def _outputs(latency=None, table=None):
+    """
+    uinput devices and mapping, created once and kept across controller
+    reconnections
+
+    @return tuple       (callback, callback args, release, engine)
+    """
+    if table is None:
+        xb = steamcontroller.uinput.Xbox360()
+        devices = [xb]
+        outputs = (scInput2Uinput, [xb, ], lambda: releaseUinput(xb), None)
+    else:
+        engine = MappingEngine(table, create_devices(table))
+        devices = engine.devices()
+        outputs = (engine.callback, None, engine.release, engine)
+    if latency is not None:
+        for dev in devices:
+            dev.setLatencyRecorder(latency)
+    return outputs
+
+def _connect(callback, callback_args=None, latency=None):
+    sc = SteamController(callback=callback, callback_args=callback_args)
+    if latency is not None:
+        sc.setLatencyRecorder(latency)
+    return sc
 
 class SCDaemon(Daemon):
+    latency = None
+    watcher = None
+    engine = None
+    supervisor = None
+    manager = None
+    engines = ()
+    all = False
+    workers = False
+    pin = False
+    config = None
+    preset = None
+
+    def _reload(self, table):
+        # called from the watcher thread, swapped before the next report
+        for engine in self.engines:
+            engine.setTable(table)
+
+    def stats(self):
+        stats = {}
+        for obj in (self.supervisor, self.engine):
+            if obj is not None:
+                stats.update(obj.stats())
+        if self.manager is not None:
+            for name, ctrl in self.manager.stats().items():
+                for key, val in ctrl.items():
+                    stats['{}.{}'.format(name, key)] = val
+        return stats
+
+    def _table(self):
+        table = None
+        if self.watcher is not None:
+            self.watcher.start(self._reload)
+            table = self.watcher.table()
+        return table
+
+    def _engine(self, table):
+        engine = MappingEngine(table, create_devices(table))
+        self.engines = self.engines + (engine,)
+        if self.watcher is not None and self.watcher.table() is not table:
+            # reloaded while the engine was created
+            engine.setTable(self.watcher.table())
+        return engine
+
+    def runAll(self):
+        """One process for every controller, each with its own devices"""
+        if self.watcher is not None:
+            table = self.watcher.table()
+            if not self.workers:
+                self.watcher.start(self._reload)
+        else:
+            # the scInput2Uinput state is global, use the same mapping
+            # through an engine per controller
+            table = compile_config(vdf.loads(XBOX360_CONFIG))
+
+        def factory(name):
+            if self.workers and self.watcher is not None:
+                # forked worker: watch the file from here, the parent
+                # watcher thread does not exist in this process
+                self.watcher = ProfileWatcher(self.config, self.preset)
+                self.watcher.start(self._reload)
+            engine = self._engine(table if self.watcher is None else self.watcher.table())
+            return engine.callback, None, engine.release, engine.devices()
+
+        cpus = None
+        if self.pin and hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+        self.manager = ControllerManager(LibUSBBus(), factory, latency=self.latency is not None,
+                                         workers=self.workers, cpus=cpus)
+        try:
+            self.manager.run()
+        except KeyboardInterrupt:
+            return
+        finally:
+            self.manager.close()
+
     def run(self):
-        while True:
-            try:
-                xb = steamcontroller.uinput.Xbox360()
-                sc = SteamController(callback=scInput2Uinput, callback_args=[xb, ])
-                sc.run()
-            except KeyboardInterrupt:
-                return
-            except:
-                pass
+        if self.all:
+            return self.runAll()
+        table = self._table()
+        callback, args, release, self.engine = _outputs(self.latency, table)
+        if self.engine is not None:
+            self.engines = (self.engine,)
+            if self.watcher.table() is not table:
+                # reloaded while the engine was created
+                self.engine.setTable(self.watcher.table())
+
+        self.supervisor = Supervisor(lambda: _connect(callback, args, self.latency),
+                                     release=release,
+                                     monitor=HotplugMonitor.create())
+        try:
+            self.supervisor.run()
+        except KeyboardInterrupt:
+            return
 
 if __name__ == '__main__':
     import argparse
@@ -171,8 +307,43 @@ if __name__ == '__main__':
     def _main():
         parser = argparse.ArgumentParser(description=__doc__)
         parser.add_argument('command', type=str, choices=['start', 'stop', 'restart', 'debug'])
+        parser.add_argument('-l', '--latency', metavar='FILE',
+                            help='measure latencies, SIGUSR1 appends a summary to FILE (- for stderr)')
+        parser.add_argument('-c', '--config', metavar='FILE',
+                            help='map inputs with a Steam controller configuration (vdf)')
+        parser.add_argument('-p', '--preset', metavar='NAME',
+                            help='preset of the configuration to use (first one by default)')
+        parser.add_argument('-a', '--all', action='store_true',
+                            help='serve all controllers (wired and wireless receivers), one xbox360 device each, '
+                            'latencies are then reported per controller in metrics')
+        parser.add_argument('-w', '--workers', action='store_true',
+                            help='with -a, map each controller in its own process')
+        parser.add_argument('--pin', action='store_true',
+                            help='with -w, pin each worker process to a cpu')
+        parser.add_argument('-m', '--metrics', metavar='FILE',
+                            help='SIGUSR2 appends reconnection and configuration reload metrics to FILE (- for stderr)')
         args = parser.parse_args()
         daemon = SCDaemon('/tmp/steamcontroller.pid')
+        daemon.all = args.all
+        daemon.workers = args.workers
+        daemon.pin = args.pin
+        daemon.config = args.config
+        daemon.preset = args.preset
+
+        if args.config:
+            # reloaded when the file changes
+            daemon.watcher = ProfileWatcher(args.config, args.preset)
+
+        if args.metrics:
+            stats = [daemon.stats]
+            if daemon.watcher is not None:
+                stats.append(daemon.watcher.stats)
+            install_signal_handler(stats, path=None if args.metrics == '-' else args.metrics)
+
+        if args.latency:
+            daemon.latency = LatencyRecorder()
+            if not args.all:
+                daemon.latency.installSignalHandler(path=None if args.latency == '-' else args.latency)
 
         if 'start' == args.command:
             daemon.start()
@@ -181,8 +352,6 @@ if __name__ == '__main__':
         elif 'restart' == args.command:
             daemon.restart()
         elif 'debug' == args.command:
-            xb = steamcontroller.uinput.Xbox360()
-            sc = SteamController(callback=scInput2Uinput, callback_args=[xb, ])
-            sc.run()
+            daemon.run()
 
     _main()
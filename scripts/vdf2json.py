@@ -22,45 +22,43 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from shlex import shlex
+import json
+
+from steamcontroller import vdf
+
+
+def _write_json(events, write):
+    """Write iterparse events as json, duplicated keys are kept in order"""
+    indent = 1
+    first = True
+    write('{')
+    for event, key, value in events:
+        if event == vdf.END:
+            indent -= 1
+            write('\n' + '  ' * indent + '}')
+            first = False
+            continue
+        write(('\n' if first else ',\n') + '  ' * indent + json.dumps(key) + ': ')
+        if event == vdf.START:
+            write('{')
+            indent += 1
+            first = True
+        else:
+            write(json.dumps(value))
+            first = False
+    write('\n}\n')
+
 
 def vdf2json(stream):
 
     """
     Read a Steam vdf file and return a string in json format
     """
+    out = []
+    _write_json(vdf.iterparse(stream), out.append)
+    return ''.join(out)
 
-    def _istr(ident, string):
-        return (ident * '  ') + string
-
-    jbuf = '{\n'
-    lex = shlex(stream)
-    indent = 1
 
-    while True:
-        tok = lex.get_token()
-        if not tok:
-            return jbuf + '}\n'
-        if tok == '}':
-            indent -= 1
-            jbuf += _istr(indent, '}')
-            ntok = lex.get_token()
-            lex.push_token(ntok)
-            if ntok and ntok != '}':
-                jbuf += ','
-            jbuf += '\n'
-        else:
-            ntok = lex.get_token()
-            if ntok == '{':
-                jbuf += _istr(indent, tok + ': {\n')
-                indent += 1
-            else:
-                jbuf += _istr(indent, tok + ': ' + ntok)
-                ntok = lex.get_token()
-                lex.push_token(ntok)
-                if ntok != '}':
-                    jbuf += ','
-                jbuf += '\n'
 def main():
     """
     Read Steam vdf and write json compatible conversion
@@ -79,7 +77,7 @@ def main():
                         help='output json file (stdout if not specified)')
 
     args = parser.parse_args()
-    args.output.write(vdf2json(args.input))
+    _write_json(vdf.iterparse(args.input), args.output.write)
 
 if __name__ == '__main__':
     main()
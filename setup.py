@@ -5,6 +5,11 @@ from distutils.core import setup, Extension
 uinput = Extension('libuinput',
                    sources = ['src/uinput.c'])
 
+# Optional native event pump (steamcontroller.pump falls back to python)
+scpump = Extension('libscpump',
+                   sources = ['src/pump.c'],
+                   optional = True)
+
 setup(name='python-steamcontroller',
       version='1.0',
       description='Steam Controller userland driver',
@@ -17,8 +22,9 @@ setup(name='python-steamcontroller',
                'scripts/sc-xbox.py',
                'scripts/sc-test-cmsg.py',
                'scripts/sc-gyro-plot.py',
+               'scripts/sc-analyze.py',
                'scripts/vdf2json.py',
                'scripts/json2vdf.py'],
       license='MIT',
       platforms=['Linux'],
-      ext_modules=[uinput, ])
+      ext_modules=[uinput, scpump])
@@ -18,45 +18,30 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-import usb1
-from collections import namedtuple
+import os
+import fcntl
 import struct
 from enum import IntEnum
 
-VENDOR_ID  = 0x28de
-PRODUCT_ID = 0x1142
-ENDPOINT   = 2
-
-STEAM_CONTROLER_FORMAT = [
-    ('x',   'ukn_00'),
-    ('x',   'ukn_01'),
-    ('H',   'status'),
-    ('H',   'seq'),
-    ('x',   'ukn_02'),
-    ('I',   'buttons'),
-    ('B',   'ltrig'),
-    ('B',   'rtrig'),
-    ('x',   'ukn_03'),
-    ('x',   'ukn_04'),
-    ('x',   'ukn_05'),
-    ('h',   'lpad_x'),
-    ('h',   'lpad_y'),
-    ('h',   'rpad_x'),
-    ('h',   'rpad_y'),
-    ('10x', 'ukn_06'),
-    ('h',   'gpitch'),
-    ('h',   'groll'),
-    ('h',   'gyaw'),
-    ('h',   'q1'),
-    ('h',   'q2'),
-    ('h',   'q3'),
-    ('h',   'q4'),
-    ('16x', 'ukn_07'),
-]
-
-_FORMATS, _NAMES = zip(*STEAM_CONTROLER_FORMAT)
-
-SteamControllerInput = namedtuple('SteamController', ' '.join([x for x in _NAMES if not x.startswith('ukn_')]))
+from steamcontroller.control import \
+    ControlQueue, \
+    PRIORITY_HIGH, \
+    PRIORITY_NORMAL
+from steamcontroller.decoder import \
+    STEAM_CONTROLER_FORMAT, \
+    SteamControllerInput, \
+    SteamControllerState, \
+    REPORT_SIZE
+from steamcontroller.transport import \
+    VENDOR_ID, \
+    PRODUCT_ID, \
+    ENDPOINT, \
+    TRANSFER_QUEUE_DEPTH, \
+    LibUSBTransport, \
+    ReplayTransport
+
+# Reports older than this are considered as a seq resync, not a reordering
+SEQ_REORDER_WINDOW = 64
 
 
 class SCStatus(IntEnum):
@@ -84,126 +69,330 @@ class SCButtons(IntEnum):
     RT        = 0b00000000000000000000000100000000
 
 
+def config_message(gyro=False):
+    """
+    Controller configuration control message
+
+    @param bool gyro        enable the gyroscope (rates and quaternion)
+
+    @return bytes
+    """
+    return struct.pack('>' + 'I' * 6,
+                       0x87153284,
+                       0x03180000,
+                       0x31020008,
+                       0x07000707,
+                       0x00301400 if gyro else 0x00300000,
+                       0x2f010000)
+
+
 class SteamController(object):
 
-    def __init__(self, callback, callback_args=None):
+    def __init__(self, callback, callback_args=None, tuple_input=False,
+                 queue_depth=TRANSFER_QUEUE_DEPTH, transport=None):
         """
         Constructor
 
         callback: function called on usb message must take at lead a
-        SteamControllerInput as first argument
+        SteamControllerState as first argument, the same state object is
+        updated in place for every report
 
         callback_args: Optional arguments passed to the callback afer the
-        SteamControllerInput argument
+        SteamControllerState argument
+
+        tuple_input: Give a SteamControllerInput namedtuple to the callback
+        instead of the shared SteamControllerState (compatibility mode)
+
+        queue_depth: Number of interrupt transfers kept submitted at the same
+        time, so reports keep being received while the callback runs
+
+        transport: Reports source (see steamcontroller.transport), the first
+        steam controller found with libusb if not specified
         """
-        self._handle = None
+        self._transport = None
         self._cb = callback
         self._cb_args = callback_args
-        self._cmsg = []
-        self._ctx = usb1.USBContext()
-        self._handle = self._ctx.openByVendorIDAndProductID(
-            VENDOR_ID, PRODUCT_ID,
-            skip_on_error=True,
-        )
-
-        if self._handle is None:
-            raise ValueError('SteamControler Device not found')
-
-        dev = self._handle.getDevice()
-        cfg = dev[0]
-
-        for inter in cfg:
-            for setting in inter:
-                number = setting.getNumber()
-                if self._handle.kernelDriverActive(number):
-                    self._handle.detachKernelDriver(number)
-                if (setting.getClass() == 3 and
-                    setting.getSubClass() == 0 and
-                    setting.getProtocol() == 0):
-                    self._handle.claimInterface(number)
-
-        self._transfer_list = []
-        transfer = self._handle.getTransfer()
-        transfer.setInterrupt(
-            usb1.ENDPOINT_IN | ENDPOINT,
-            64,
-            callback=self._processReceivedData,
-        )
-        transfer.submit()
-        self._transfer_list.append(transfer)
+        self._tuple_input = tuple_input
+        self._state = SteamControllerState()
+        self._last_seq = None
+        self._received = 0
+        self._dropped = 0
+        self._out_of_order = 0
+        self._cmsg = None
+        self._latency = None
+        self._capture = None
+        self._pump = None
+        self._poll_ready = False
+        self._wakeup_fds = None
+        self._wakeup_pending = False
+
+        if transport is None:
+            transport = LibUSBTransport(queue_depth=queue_depth)
+        self._transport = transport
+        self._cmsg = ControlQueue(self.submitControl)
+        transport.start(self._receive, self._dispatch)
 
         # Disable Haptic auto feedback
 
-        self._ctx.handleEvents()
+        transport.handleEvents()
         self._sendControl(struct.pack('>' + 'I' * 1,
                                       0x81000000))
-        self._ctx.handleEvents()
-        self._sendControl(struct.pack('>' + 'I' * 6,
-                                      0x87153284,
-                                      0x03180000,
-                                      0x31020008,
-                                      0x07000707,
-                                      0x00300000,
-                                      0x2f010000))
-        self._ctx.handleEvents()
+        transport.handleEvents()
+        self._sendControl(config_message(gyro=False))
+        transport.handleEvents()
 
 
     def __del__(self):
-        if self._handle:
-            self._handle.close()
+        self.close()
+
+    def close(self):
+        """Release the transport, the controller can not be used anymore"""
+        if self._transport:
+            if self._wakeup_fds:
+                self._transport.unregister(self._wakeup_fds[0])
+            self._transport.close()
+            self._transport = None
+        if self._wakeup_fds:
+            for fd in self._wakeup_fds:
+                os.close(fd)
+            self._wakeup_fds = None
+
+    @property
+    def transport(self):
+        """Reports source"""
+        return self._transport
 
     def _sendControl(self, data, timeout=0):
 
         zeros = b'\x00' * (64 - len(data))
 
-        self._handle.controlWrite(request_type=0x21,
-                                  request=0x09,
-                                  value=0x0300,
-                                  index=0x0001,
-                                  data=data + zeros,
-                                  timeout=timeout)
+        self._transport.sendControl(data + zeros, timeout=timeout)
+
+    def submitControl(self, data, callback, timeout=0):
+        """
+        Send a control message asynchronously, at once: it does not wait
+        behind the messages queued by addControl() and addFeedback()
+
+        @param bytes data           control message (padded to 64 bytes)
+        @param callable callback    callback(ok) called on completion from
+                                    the usb events processing
+        @param int timeout          usb timeout in ms, 0 for no timeout
+
+        @return bool                False if the message could not be submitted
+        """
+
+        zeros = b'\x00' * (64 - len(data))
+
+        return self._transport.submitControl(data + zeros, callback, timeout=timeout)
 
     def addFeedback(self, name):
+        """
+        Queue a haptic pulse on a pad, a pulse still waiting for the same
+        pad is replaced
+
+        @param str name         'rp...' for right pad 'lp...' for left pad
+        """
         if not name:
             return
         elif name[:2] == 'rp':
-            self._cmsg.insert(0, struct.pack('>' + 'I' * 2, 0x8f0700ff, 0x03000001))
+            self._cmsg.push(struct.pack('>' + 'I' * 2, 0x8f0700ff, 0x03000001), key='rpad')
         elif name[:2] == 'lp':
-            self._cmsg.insert(0, struct.pack('>' + 'I' * 2, 0x8f0701ff, 0x03000001))
+            self._cmsg.push(struct.pack('>' + 'I' * 2, 0x8f0701ff, 0x03000001), key='lpad')
+        else:
+            return
+        self._wakeup()
 
+    def addControl(self, data, priority=PRIORITY_HIGH):
+        """
+        Queue a control message, sent asynchronously from the usb loop
 
-    def _processReceivedData(self, transfer):
-        """Private USB async Rx function"""
+        @param bytes data       control message (padded to 64 bytes)
+        @param int priority     PRIORITY_HIGH or PRIORITY_NORMAL
+        """
+        self._cmsg.push(data, priority=priority)
+        self._wakeup()
 
-        if (transfer.getStatus() != usb1.TRANSFER_COMPLETED or
-            transfer.getActualLength() != 64):
-            return
+    def setGyro(self, enable=True):
+        """
+        Enable or disable the gyroscope, gpitch, groll, gyaw and q1..q4 are
+        only filled while it is enabled. Sent asynchronously like
+        addControl, can be called from a callback.
+
+        @param bool enable
+        """
+        self.addControl(config_message(gyro=enable))
+
+    def _wakeup(self):
+        """Interrupt a poll() waiting in another thread"""
+        if self._wakeup_fds and not self._wakeup_pending:
+            self._wakeup_pending = True
+            os.write(self._wakeup_fds[1], b'\0')
+
+    def _initPoller(self):
+        """Register the wakeup pipe in the transport poller"""
+        self._wakeup_fds = os.pipe()
+        for fd in self._wakeup_fds:
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        self._transport.register(self._wakeup_fds[0])
+        self._poll_ready = True
+
+    def _receive(self, buf):
+        """Decode a report, buf is only valid during this call"""
+
+        latency = self._latency
+        if latency is not None:
+            latency.arrival()
+
+        if self._capture is not None:
+            self._capture.write(buf)
+
+        if self._pump is not None:
+            self._pump.process(buf)
+
+        self._state.update(buf)
+
+    def _dispatch(self):
+        """Run callback on the last decoded report"""
+
+        state = self._state
+        self._received += 1
+        if state.status == SCStatus.Input:
+            self._checkSeq(state.seq)
+
+        if self._tuple_input:
+            state = state.asInput()
 
-        data = transfer.getBuffer()
-        tup = SteamControllerInput._make(struct.unpack('<' + ''.join(_FORMATS), data))
+        latency = self._latency
+        if latency is not None:
+            latency.enter()
 
         if isinstance(self._cb_args, (list, tuple)):
-            self._cb(self, tup, *self._cb_args)
+            self._cb(self, state, *self._cb_args)
         else:
-            self._cb(self, tup)
+            self._cb(self, state)
 
-        transfer.submit()
+        if latency is not None:
+            latency.leave()
+
+    def setLatencyRecorder(self, recorder):
+        """
+        Timestamp reports arrival and callback entry/exit
+
+        @param LatencyRecorder recorder     recorder, None to disable
+        """
+        self._latency = recorder
+
+    def setCapture(self, writer):
+        """
+        Write every raw report to a capture file
+
+        @param CaptureWriter writer     capture writer, None to stop
+        """
+        self._capture = writer
+
+    def setPump(self, pump):
+        """
+        Map every raw report with an event pump before the callback runs,
+        the callback only has to handle what the mapping table does not
+
+        @param EventPump pump           PyEventPump or NativeEventPump,
+                                        None to disable
+        """
+        self._pump = pump
+
+    def _checkSeq(self, seq):
+        """Count dropped and out of order input reports from seq field"""
+        last = self._last_seq
+        if last is not None:
+            delta = (seq - last) & 0xffff
+            if delta == 0 or 0x10000 - delta <= SEQ_REORDER_WINDOW:
+                self._out_of_order += 1
+                return
+            elif delta < 0x8000:
+                self._dropped += delta - 1
+        self._last_seq = seq
+
+    def stats(self):
+        """
+        Reception statistics
+
+        @return dict    received reports, dropped and out of order input
+                        reports detected with the seq field, control
+                        message queue statistics (cmsg_*)
+        """
+        stats = {
+            'received': self._received,
+            'dropped': self._dropped,
+            'out_of_order': self._out_of_order,
+        }
+        if self._cmsg is not None:
+            for key, val in self._cmsg.stats().items():
+                stats['cmsg_' + key] = val
+        return stats
 
     def run(self):
         """Fucntion to run in order to process usb events"""
-        if self._handle:
-            try:
-                while any(x.isSubmitted() for x in self._transfer_list):
-                    self._ctx.handleEvents()
-                    if len(self._cmsg) > 0:
-                        cmsg = self._cmsg.pop()
-                        self._sendControl(cmsg)
+        if self._transport:
+            while self._transport.active():
+                self.poll()
+
+    def poll(self, timeout=None):
+        """
+        Sleep until usb events or a control message are pending, then
+        process them. Nothing is done while the controller is idle.
 
-            except usb1.USBErrorInterrupted:
+        @param float timeout    maximum time to wait in seconds, None to
+                                wait forever
+        """
+        if not self._transport:
+            return
+
+        delay = self.prepare()
+        if delay is not None and (timeout is None or delay < timeout):
+            timeout = delay
+
+        self.ready(self._transport.poll(timeout))
+
+    def prepare(self):
+        """
+        First half of poll() for loops driving several controllers sharing
+        a bus: send due control messages before waiting
+
+        @return float           maximum wait in seconds, None if no limit
+        """
+        if not self._poll_ready:
+            self._initPoller()
+        return self.pumpControls()
+
+    def pumpControls(self):
+        """
+        Send the next queued control message if it is due, never blocks.
+        For event loops watching the transport file descriptors themselves
+        (see steamcontroller.aio), after processing usb events.
+
+        @return float           seconds before the next message can be
+                                sent, None if nothing is waiting
+        """
+        return self._cmsg.pump()
+
+    def ready(self, fds):
+        """
+        Second half of poll(), after the wait
+
+        @param list fds         ready file descriptors returned by the wait
+        """
+        if self._wakeup_fds and self._wakeup_fds[0] in fds:
+            self._wakeup_pending = False
+            try:
+                os.read(self._wakeup_fds[0], 64)
+            except OSError:
                 pass
 
+        self._cmsg.pump()
+
 
     def handleEvents(self):
         """Fucntion to run in order to process usb events"""
-        if self._handle and self._ctx:
-            self._ctx.handleEvents()
+        if self._transport:
+            self._transport.handleEvents()
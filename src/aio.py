@@ -0,0 +1,221 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""asyncio front-end for SteamController (python 3.7+)
+
+Usage, from a coroutine:
+
+    controller = AsyncSteamController()
+    async for state in controller.reports():
+        ...
+    await controller.sendControl(data)
+"""
+
+import asyncio
+import select
+from collections import deque
+
+from steamcontroller import SteamController
+
+
+class _Subscription(object):
+    """Reports waiting to be consumed by one reports() iterator"""
+
+    def __init__(self, maxlen):
+        self.queue = deque(maxlen=maxlen)
+        self.event = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, state):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(state)
+        self.event.set()
+
+
+class AsyncSteamController(object):
+    """
+    SteamController driven by an asyncio event loop.
+
+    Transport file descriptors (libusb ones for a real controller) are
+    watched by the loop, usb events are only processed when they are
+    ready, so any number of other tasks can share the loop without a
+    thread calling handleEvents.
+    """
+
+    def __init__(self, coalesce=True, maxsize=64, loop=None, **kwargs):
+        """
+        Constructor
+
+        coalesce: default backpressure policy of reports(), True to keep only
+        the latest report when the consumer is late, False for a bounded
+        queue of maxsize reports (oldest are dropped when full)
+
+        maxsize: default bounded queue size
+
+        loop: asyncio event loop, the running one if not specified (the
+        constructor must then be called from a coroutine)
+
+        kwargs: other arguments passed to SteamController
+        """
+        self._loop = loop or asyncio.get_running_loop()
+        self._coalesce = coalesce
+        self._maxsize = maxsize
+        self._subs = []
+        # dropped by the reports() iterators that have ended
+        self._dropped = 0
+        self._fds = {}
+        self._timer = None
+        self._closed = False
+
+        self._sc = SteamController(callback=self._onReport, **kwargs)
+        self._transport = self._sc.transport
+
+        self._transport.setPollFDNotifiers(self._addFD, self._removeFD)
+        for fd, events in self._transport.pollFDs():
+            self._addFD(fd, events, None)
+        self._scheduleTimeout()
+
+    @property
+    def controller(self):
+        """Underlying SteamController"""
+        return self._sc
+
+    def _addFD(self, fd, events, _):
+        self._removeFD(fd, None)
+        if events & select.POLLIN:
+            self._loop.add_reader(fd, self._handleEvents)
+        if events & select.POLLOUT:
+            self._loop.add_writer(fd, self._handleEvents)
+        self._fds[fd] = events
+
+    def _removeFD(self, fd, _):
+        events = self._fds.pop(fd, 0)
+        if events & select.POLLIN:
+            self._loop.remove_reader(fd)
+        if events & select.POLLOUT:
+            self._loop.remove_writer(fd)
+
+    def _scheduleTimeout(self, delay=None):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        timeout = self._transport.nextTimeout()
+        if delay is not None and (timeout is None or delay < timeout):
+            timeout = delay
+        if timeout is not None:
+            self._timer = self._loop.call_later(timeout, self._handleEvents)
+
+    def _handleEvents(self):
+        if self._closed:
+            return
+        self._transport.processEvents()
+        if self._closed:
+            # closed by a report callback
+            return
+        # Queued haptic and control messages
+        self._scheduleTimeout(self._sc.pumpControls())
+        if not self._transport.active():
+            self.close()
+
+    def _onReport(self, _, state):
+        if not self._subs:
+            return
+        snapshot = state.copy()
+        for sub in self._subs:
+            sub.push(snapshot)
+
+    async def reports(self, coalesce=None, maxsize=None):
+        """
+        Iterate over received reports, each report is an independent
+        SteamControllerState snapshot. Iteration ends when the controller
+        is closed or disconnected.
+
+        @param bool coalesce    override constructor coalesce policy
+        @param int maxsize      override constructor queue size
+        """
+        if coalesce is None:
+            coalesce = self._coalesce
+        sub = _Subscription(1 if coalesce else (maxsize or self._maxsize))
+        self._subs.append(sub)
+        try:
+            while True:
+                while not sub.queue:
+                    if self._closed:
+                        return
+                    sub.event.clear()
+                    await sub.event.wait()
+                yield sub.queue.popleft()
+        finally:
+            self._subs.remove(sub)
+            self._dropped += sub.dropped
+
+    def sendControl(self, data, timeout=0):
+        """
+        Send a control message without blocking the loop
+
+        @param bytes data       control message (padded to 64 bytes)
+        @param int timeout      usb timeout in ms, 0 for no timeout
+
+        @return asyncio.Future  resolved when the transfer completes
+        """
+        future = self._loop.create_future()
+
+        def _done(ok):
+            if future.done():
+                return
+            if ok:
+                future.set_result(True)
+            else:
+                future.set_exception(IOError('Control transfer failed'))
+
+        if not self._sc.submitControl(data, _done, timeout=timeout):
+            _done(False)
+        return future
+
+    def stats(self):
+        """
+        @return dict    SteamController stats plus reports dropped by
+                        reports() iterators because of backpressure
+        """
+        stats = self._sc.stats()
+        stats['backpressure_dropped'] = self._dropped + sum(sub.dropped for sub in self._subs)
+        return stats
+
+    def close(self):
+        """
+        Stop watching usb file descriptors, close the controller and end
+        reports() iterators
+        """
+        if self._closed:
+            return
+        self._closed = True
+        # no reader can be added back by the transport once it is closed
+        self._transport.setPollFDNotifiers(None, None)
+        for fd in list(self._fds):
+            self._removeFD(fd, None)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._sc.close()
+        for sub in self._subs:
+            sub.event.set()
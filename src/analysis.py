@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Offline analysis of captured reports (requires NumPy)
+
+Every function takes the structured array of a capture (see
+steamcontroller.capture.load_array, usually a memory map) and works on
+whole columns, there is no loop over reports: hours of reports are
+analyzed in a few seconds.
+
+Results are plain dicts of numbers, see analyze() and
+steamcontroller.profiles.summary() to print them.
+"""
+
+import numpy
+
+from steamcontroller import SCStatus, SCButtons, SEQ_REORDER_WINDOW
+from steamcontroller.capture import load_array
+from steamcontroller.gyro import BIAS_THRESHOLD
+
+AXES = ('ltrig', 'rtrig', 'lpad_x', 'lpad_y', 'rpad_x', 'rpad_y',
+        'gpitch', 'groll', 'gyaw', 'q1', 'q2', 'q3', 'q4')
+
+GYRO_AXES = ('gpitch', 'groll', 'gyaw')
+
+TOUCHES = (('lpad', SCButtons.LPadTouch), ('rpad', SCButtons.RPadTouch))
+
+
+def inputs(arr):
+    """
+    Input reports of a capture (idle and other status reports removed)
+
+    @param ndarray arr      capture records
+
+    @return ndarray         input records (a copy, arr is not modified)
+    """
+    return arr[arr['status'] == int(SCStatus.Input)]
+
+
+def axis_noise(arr, fields=AXES):
+    """
+    Per axis statistics. The noise is estimated from successive
+    differences, slow moves and offsets do not count.
+
+    @param ndarray arr      input records
+    @param tuple fields     axes
+
+    @return dict            {axis: {mean, std, noise, min, max}}
+    """
+    out = {}
+    for name in fields:
+        col = numpy.asarray(arr[name], dtype=numpy.float64)
+        if len(col) < 2:
+            continue
+        out[name] = {
+            'mean': float(col.mean()),
+            'std': float(col.std()),
+            'noise': float(numpy.diff(col).std() / numpy.sqrt(2.0)),
+            'min': float(col.min()),
+            'max': float(col.max()),
+        }
+    return out
+
+
+def drift(arr, fields=AXES):
+    """
+    Linear trend of each axis (least squares against the timestamps)
+
+    @param ndarray arr      input records
+    @param tuple fields     axes
+
+    @return dict            {axis: units per hour}
+    """
+    t = numpy.asarray(arr['timestamp'], dtype=numpy.float64)
+    out = {}
+    if len(t) < 2:
+        return out
+    t = t - t.mean()
+    var = numpy.dot(t, t)
+    if var == 0:
+        return out
+    for name in fields:
+        col = numpy.asarray(arr[name], dtype=numpy.float64)
+        out[name] = float(numpy.dot(t, col - col.mean()) / var * 3600)
+    return out
+
+
+def gyro_bias(arr, threshold=BIAS_THRESHOLD):
+    """
+    Gyro rates at rest: mean and spread over the reports where all rates
+    are below threshold
+
+    @param ndarray arr      input records
+    @param int threshold    rest threshold in rate units (see
+                            steamcontroller.gyro)
+
+    @return dict            still (fraction of reports at rest), and per
+                            axis bias and noise
+    """
+    still = numpy.ones(len(arr), dtype=bool)
+    for name in GYRO_AXES:
+        still &= numpy.abs(numpy.asarray(arr[name], dtype=numpy.int32)) < threshold
+    out = {'still': float(still.mean()) if len(arr) else 0.0}
+    for name in GYRO_AXES:
+        col = numpy.asarray(arr[name], dtype=numpy.float64)[still]
+        out[name + '_bias'] = float(col.mean()) if len(col) else 0.0
+        out[name + '_noise'] = float(col.std()) if len(col) else 0.0
+    return out
+
+
+def intervals(arr):
+    """
+    Time between reports
+
+    @param ndarray arr      records
+
+    @return dict            mean, std (jitter), p50, p99 and max in us
+    """
+    dt = numpy.diff(numpy.asarray(arr['timestamp'], dtype=numpy.float64)) * 1e6
+    if len(dt) == 0:
+        return {}
+    p50, p99 = numpy.percentile(dt, (50, 99))
+    return {
+        'mean': float(dt.mean()),
+        'std': float(dt.std()),
+        'p50': float(p50),
+        'p99': float(p99),
+        'max': float(dt.max()),
+    }
+
+
+def seq_gaps(arr):
+    """
+    Dropped and out of order reports from the seq field, counted like
+    SteamController.stats(): a report far behind the previous one is out of
+    order and ignored, a jump of more than half the seq range is a resync
+
+    @param ndarray arr      input records
+
+    @return dict            reports, dropped, out_of_order, gaps (number of
+                            holes), max_gap and loss (dropped fraction)
+    """
+    seq = numpy.asarray(arr['seq'], dtype=numpy.int64)
+    out_of_order = 0
+    while len(seq) > 1:
+        delta = numpy.diff(seq) & 0xffff
+        late = (delta == 0) | (0x10000 - delta <= SEQ_REORDER_WINDOW)
+        count = int(late.sum())
+        if not count:
+            break
+        out_of_order += count
+        # ignored reports: the next one compares with the previous kept
+        seq = seq[numpy.concatenate(([True], ~late))]
+    delta = numpy.diff(seq) & 0xffff if len(seq) > 1 else numpy.zeros(0, dtype=numpy.int64)
+    holes = delta[(delta > 1) & (delta < 0x8000)] - 1
+    dropped = int(holes.sum())
+    total = len(seq) + dropped
+    return {
+        'reports': len(arr),
+        'dropped': dropped,
+        'out_of_order': out_of_order,
+        'gaps': len(holes),
+        'max_gap': int(holes.max()) if len(holes) else 0,
+        'loss': float(dropped) / total if total else 0.0,
+    }
+
+
+def touch_durations(arr, bit):
+    """
+    Durations of the presses of a button bit (pad touches), presses cut by
+    the capture start or end are not counted
+
+    @param ndarray arr      input records
+    @param int bit          button bit
+
+    @return ndarray         durations in seconds
+    """
+    down = (numpy.asarray(arr['buttons']) & int(bit)) != 0
+    edges = numpy.diff(down.astype(numpy.int8))
+    starts = numpy.flatnonzero(edges == 1) + 1
+    ends = numpy.flatnonzero(edges == -1) + 1
+    if len(ends) and (len(starts) == 0 or ends[0] < starts[0]):
+        ends = ends[1:]
+    starts = starts[:len(ends)]
+    t = numpy.asarray(arr['timestamp'], dtype=numpy.float64)
+    return t[ends] - t[starts]
+
+
+def touches(arr):
+    """
+    @param ndarray arr      input records
+
+    @return dict            count, mean, p50 and max duration (s) of pad
+                            touches, per pad
+    """
+    out = {}
+    for name, bit in TOUCHES:
+        dur = touch_durations(arr, bit)
+        out[name] = {
+            'count': len(dur),
+            'mean': float(dur.mean()) if len(dur) else 0.0,
+            'p50': float(numpy.median(dur)) if len(dur) else 0.0,
+            'max': float(dur.max()) if len(dur) else 0.0,
+        }
+    return out
+
+
+def analyze(arr):
+    """
+    All the statistics of a capture
+
+    @param ndarray arr      capture records, or a capture file path
+
+    @return dict            intervals, seq, noise, drift, gyro and touches
+                            sections
+    """
+    if not isinstance(arr, numpy.ndarray):
+        arr = load_array(arr)
+    inp = inputs(arr)
+    return {
+        'intervals': intervals(inp),
+        'seq': seq_gaps(inp),
+        'noise': axis_noise(inp),
+        'drift': drift(inp),
+        'gyro': gyro_bias(inp),
+        'touches': touches(inp),
+    }
+
+
+def flatten(result, prefix=''):
+    """
+    Nested analyze() dict to a flat {'section.axis.stat': value} dict
+
+    @param dict result
+    @param str prefix
+
+    @return dict
+    """
+    out = {}
+    for key, val in result.items():
+        if isinstance(val, dict):
+            out.update(flatten(val, prefix + key + '.'))
+        else:
+            out[prefix + key] = val
+    return out
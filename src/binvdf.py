@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Steam binary VDF (shortcuts.vdf, appinfo key values) reader and writer
+
+Each entry is a type byte, a nul terminated key and a value, a map ends
+with a TYPE_END byte. BinaryVDFDict reads directly from a buffer (bytes or
+mmap), only the direct children of an accessed map are indexed and nested
+maps are skipped without creating any object until they are accessed.
+"""
+
+import io
+import os
+import re
+import mmap
+import struct
+
+from steamcontroller.vdf import VDFDict, VDFError
+
+TYPE_MAP = 0x00
+TYPE_STRING = 0x01
+TYPE_INT32 = 0x02
+TYPE_FLOAT32 = 0x03
+TYPE_POINTER = 0x04
+TYPE_WSTRING = 0x05
+TYPE_COLOR = 0x06
+TYPE_UINT64 = 0x07
+TYPE_END = 0x08
+TYPE_INT64 = 0x0a
+TYPE_END_ALT = 0x0b
+
+
+class Pointer(int):
+    """TYPE_POINTER value"""
+
+class Color(int):
+    """TYPE_COLOR value"""
+
+class UInt64(int):
+    """TYPE_UINT64 value"""
+
+class Int64(int):
+    """TYPE_INT64 value"""
+
+class WString(str):
+    """TYPE_WSTRING value (utf-16 in the file)"""
+
+
+_STRUCTS = {
+    TYPE_INT32: struct.Struct('<i'),
+    TYPE_FLOAT32: struct.Struct('<f'),
+    TYPE_POINTER: struct.Struct('<i'),
+    TYPE_COLOR: struct.Struct('<i'),
+    TYPE_UINT64: struct.Struct('<Q'),
+    TYPE_INT64: struct.Struct('<q'),
+}
+_SIZES = dict((t, s.size) for t, s in _STRUCTS.items())
+_CLASSES = {TYPE_POINTER: Pointer, TYPE_COLOR: Color,
+            TYPE_UINT64: UInt64, TYPE_INT64: Int64}
+
+_ENCODING = 'utf-8'
+_ERRORS = 'surrogateescape'
+
+
+def _cstring_end(buf, pos):
+    end = buf.find(b'\x00', pos)
+    if end < 0:
+        raise VDFError('Unterminated string at offset {}'.format(pos))
+    return end
+
+def _wstring_end(buf, pos):
+    end = pos
+    while True:
+        end = buf.find(b'\x00\x00', end)
+        if end < 0:
+            raise VDFError('Unterminated wide string at offset {}'.format(pos))
+        if (end - pos) % 2 == 0:
+            return end
+        end += 1
+
+def _key(buf, pos):
+    end = _cstring_end(buf, pos)
+    return buf[pos:end].decode(_ENCODING, _ERRORS), end + 1
+
+def _value(buf, t, pos):
+    """Decode a non map value, return (value, next offset)"""
+    if t == TYPE_STRING:
+        end = _cstring_end(buf, pos)
+        return buf[pos:end].decode(_ENCODING, _ERRORS), end + 1
+    elif t == TYPE_WSTRING:
+        end = _wstring_end(buf, pos)
+        return WString(buf[pos:end].decode('utf-16-le')), end + 2
+    try:
+        st = _STRUCTS[t]
+    except KeyError:
+        raise VDFError('Unknown type 0x{:02x} at offset {}'.format(t, pos - 1))
+    val = st.unpack_from(buf, pos)[0]
+    cls = _CLASSES.get(t)
+    return (cls(val) if cls else val), pos + st.size
+
+# run of scalar entries (everything but maps, ends and wide strings), a
+# whole run is skipped by a single regex match
+_SCALARS = re.compile(b'(?:\x01[^\x00]*\x00[^\x00]*\x00'
+                      b'|[\x02\x03\x04\x06][^\x00]*\x00.{4}'
+                      b'|[\x07\x0a][^\x00]*\x00.{8})*', re.S)
+
+def _skip_map(buf, pos):
+    """Offset following the map starting at pos, nothing is decoded"""
+    skip = _SCALARS.match
+    find = buf.find
+    depth = 1
+    try:
+        while depth:
+            pos = skip(buf, pos).end()
+            t = buf[pos]
+            pos += 1
+            if t == TYPE_END or t == TYPE_END_ALT:
+                depth -= 1
+                continue
+            if t == TYPE_STRING or t in _SIZES:
+                # scalar the regex could not match
+                raise VDFError('Truncated entry at offset {}'.format(pos - 1))
+            if t != TYPE_MAP and t != TYPE_WSTRING:
+                raise VDFError('Unknown type 0x{:02x} at offset {}'.format(t, pos - 1))
+            end = find(b'\x00', pos)
+            if end < 0:
+                raise VDFError('Unterminated key at offset {}'.format(pos))
+            pos = end + 1
+            if t == TYPE_MAP:
+                depth += 1
+            else:
+                pos = _wstring_end(buf, pos) + 2
+    except IndexError:
+        raise VDFError('Unexpected end of data')
+    return pos
+
+def _skip_value(buf, t, pos):
+    """Offset following the value of type t starting at pos"""
+    if t == TYPE_MAP:
+        return _skip_map(buf, pos)
+    elif t == TYPE_STRING:
+        return _cstring_end(buf, pos) + 1
+    elif t == TYPE_WSTRING:
+        return _wstring_end(buf, pos) + 2
+    return pos + _SIZES[t]
+
+
+def _decode(buf, pos, root):
+    """Fully decode the map at pos, return (VDFDict, next offset)"""
+    result = VDFDict()
+    stack = [result]
+    size = len(buf)
+    try:
+        while stack:
+            if root and len(stack) == 1 and pos >= size:
+                break
+            t = buf[pos]
+            pos += 1
+            if t == TYPE_END or t == TYPE_END_ALT:
+                stack.pop()
+                continue
+            key, pos = _key(buf, pos)
+            if t == TYPE_MAP:
+                section = VDFDict()
+                stack[-1].append((key, section))
+                stack.append(section)
+            else:
+                val, pos = _value(buf, t, pos)
+                stack[-1].append((key, val))
+    except (IndexError, struct.error):
+        raise VDFError('Unexpected end of data')
+    return result, pos
+
+
+class BinaryVDFDict(object):
+    """
+    Lazily decoded map of a binary vdf buffer, same read interface as
+    vdf.VDFDict (iteration on (key, value) pairs, get, getall, keys)
+    """
+
+    def __init__(self, buf, offset=0, root=False):
+        """
+        Constructor
+
+        @param buffer buf       bytes or mmap holding the document
+        @param int offset       offset of the first entry of the map
+        @param bool root        the map can end at the end of buf
+        """
+        self._buf = buf
+        self._offset = offset
+        self._root = root
+        self._entries = []
+        self._next = offset
+        self._end = None
+
+    def _scan(self):
+        """
+        Generate (key, type, value offset) of direct children, children
+        are indexed only as far as a lookup needs
+        """
+        entries = self._entries
+        buf = self._buf
+        i = 0
+        while True:
+            # several scans can be interleaved, entries are shared
+            if i < len(entries):
+                yield entries[i]
+                i += 1
+                continue
+            if self._end is not None:
+                return
+            # the last indexed value is skipped only now, a lookup hitting
+            # it never walks over its content
+            pos = self._next
+            if entries:
+                pos = _skip_value(buf, entries[-1][1], pos)
+                self._next = pos
+            if pos >= len(buf):
+                if not self._root:
+                    raise VDFError('Unexpected end of data')
+                self._end = pos
+                return
+            t = buf[pos]
+            pos += 1
+            if t == TYPE_END or t == TYPE_END_ALT:
+                self._end = pos
+                return
+            if t != TYPE_MAP and t != TYPE_STRING and t != TYPE_WSTRING and t not in _SIZES:
+                raise VDFError('Unknown type 0x{:02x} at offset {}'.format(t, pos - 1))
+            key, pos = _key(buf, pos)
+            entries.append((key, t, pos))
+            self._next = pos
+
+    def _index(self):
+        """(key, type, value offset) of all direct children"""
+        if self._end is None:
+            for _ in self._scan():
+                pass
+        return self._entries
+
+    def _get(self, t, pos):
+        if t == TYPE_MAP:
+            return BinaryVDFDict(self._buf, pos)
+        return _value(self._buf, t, pos)[0]
+
+    def __iter__(self):
+        for key, t, pos in self._index():
+            yield key, self._get(t, pos)
+
+    def __len__(self):
+        return len(self._index())
+
+    def items(self):
+        """
+        @return list            (key, value) pairs, nested maps stay lazy
+        """
+        return list(self)
+
+    def keys(self):
+        """
+        @return list of str     keys in order, with duplicates
+        """
+        return [key for key, _, _ in self._index()]
+
+    def get(self, key, default=None):
+        """
+        @param str key          key to look for
+        @param default          returned when key is missing
+
+        @return                 value of the first entry with this key
+        """
+        for k, t, pos in self._scan():
+            if k == key:
+                return self._get(t, pos)
+        return default
+
+    def getall(self, key):
+        """
+        @param str key          key to look for
+
+        @return list            values of all entries with this key
+        """
+        return [self._get(t, pos) for k, t, pos in self._index() if k == key]
+
+    def find(self, *path):
+        """
+        Follow a path of keys
+
+        @param str path         keys from this map
+
+        @return                 value or None if a key is missing
+        """
+        node = self
+        for key in path:
+            if not isinstance(node, BinaryVDFDict):
+                return None
+            node = node.get(key)
+            if node is None:
+                return None
+        return node
+
+    def decode(self):
+        """
+        @return VDFDict         whole sub tree decoded
+        """
+        return _decode(self._buf, self._offset, self._root)[0]
+
+
+def loads(data):
+    """
+    Decode a whole binary vdf document
+
+    @param bytes data       document
+
+    @return VDFDict
+    """
+    return _decode(data, 0, True)[0]
+
+
+def load(stream):
+    """
+    Decode a whole binary vdf file
+
+    @param file stream      file object opened in binary mode
+
+    @return VDFDict
+    """
+    return loads(stream.read())
+
+
+class MappedVDFDict(BinaryVDFDict):
+    """
+    Root map of a memory mapped file (see open_mmap), the map and all its
+    sub maps can not be used anymore once closed
+    """
+
+    def close(self):
+        """Unmap the file"""
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_mmap(path):
+    """
+    Memory map a binary vdf file, maps are decoded when accessed
+
+    @param str path         file path
+
+    @return MappedVDFDict   root map, to close when done
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty files can not be mapped, nothing to decode anyway
+            buf = b''
+        else:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return MappedVDFDict(buf, 0, root=True)
+
+
+def _pairs(obj):
+    return obj.items() if hasattr(obj, 'items') else obj
+
+def _encode(value):
+    """Type byte and encoded value"""
+    if isinstance(value, WString):
+        return TYPE_WSTRING, value.encode('utf-16-le') + b'\x00\x00'
+    elif isinstance(value, str):
+        return TYPE_STRING, value.encode(_ENCODING, _ERRORS) + b'\x00'
+    elif isinstance(value, float):
+        t = TYPE_FLOAT32
+    elif isinstance(value, Pointer):
+        t = TYPE_POINTER
+    elif isinstance(value, Color):
+        t = TYPE_COLOR
+    elif isinstance(value, UInt64):
+        t = TYPE_UINT64
+    elif isinstance(value, Int64):
+        t = TYPE_INT64
+    elif isinstance(value, int):
+        t = TYPE_INT32
+    else:
+        raise VDFError('Unsupported value type {}'.format(type(value).__name__))
+    try:
+        return t, _STRUCTS[t].pack(value)
+    except struct.error as e:
+        raise VDFError(str(e))
+
+
+def dump(obj, stream):
+    """
+    Write a binary vdf document
+
+    @param VDFDict obj      pairs (or dict, BinaryVDFDict), values are str,
+                            WString, int (int32), Pointer, Color, UInt64,
+                            Int64, float (float32) or nested maps
+    @param file stream      file object opened in binary mode
+    """
+    write = stream.write
+    stack = [iter(_pairs(obj))]
+    while stack:
+        for key, value in stack[-1]:
+            key = key.encode(_ENCODING, _ERRORS) + b'\x00'
+            if isinstance(value, (list, dict, BinaryVDFDict)):
+                write(struct.pack('B', TYPE_MAP) + key)
+                stack.append(iter(_pairs(value)))
+                break
+            t, data = _encode(value)
+            write(struct.pack('B', t) + key + data)
+        else:
+            stack.pop()
+            write(struct.pack('B', TYPE_END))
+
+
+def dumps(obj):
+    """
+    @param VDFDict obj      pairs (or dict, BinaryVDFDict)
+
+    @return bytes           binary vdf document
+    """
+    out = io.BytesIO()
+    dump(obj, out)
+    return out.getvalue()
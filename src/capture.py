@@ -0,0 +1,332 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Steam Controller raw report capture files
+
+A capture is a fixed size header followed by fixed size records:
+
+ - header: magic, format version, usb vendor and product ids, clock source
+   and record size
+ - record: timestamp in seconds (float64) followed by the raw 64 bytes report
+
+All values are little endian. Records are written by batches, load_array()
+maps a capture as a NumPy structured array without reading it.
+
+CaptureRing keeps the last records in memory with the same layout, for
+live views of the reports.
+"""
+
+import os
+import time
+import struct
+
+from steamcontroller.decoder import REPORT_SIZE, FIELD_OFFSETS
+
+CAPTURE_MAGIC = b'SCCAPTUR'
+CAPTURE_VERSION = 1
+
+HEADER_STRUCT = struct.Struct('<8sHHHHH14x')
+RECORD_STRUCT = struct.Struct('<d{}s'.format(REPORT_SIZE))
+HEADER_SIZE = HEADER_STRUCT.size
+RECORD_SIZE = RECORD_STRUCT.size
+
+_TIMESTAMP_STRUCT = struct.Struct('<d')
+_TIMESTAMP_SIZE = _TIMESTAMP_STRUCT.size
+
+# Records buffered by CaptureWriter before a write
+CAPTURE_BATCH = 256
+
+# Clock sources
+CLOCK_REALTIME  = 0
+CLOCK_MONOTONIC = 1
+
+if hasattr(time, 'monotonic'):
+    DEFAULT_CLOCK = CLOCK_MONOTONIC
+    _CLOCKS = {CLOCK_REALTIME: time.time, CLOCK_MONOTONIC: time.monotonic}
+else:
+    DEFAULT_CLOCK = CLOCK_REALTIME
+    _CLOCKS = {CLOCK_REALTIME: time.time}
+
+
+class CaptureError(ValueError):
+    """Invalid or unsupported capture file"""
+
+
+class CaptureWriter(object):
+    """
+    Write reports to a capture file.
+
+    Records are packed in a preallocated batch buffer, written with a
+    single write when the batch is full, on flush() and on close().
+    """
+
+    def __init__(self, fileobj, vendor=0, product=0, clock=DEFAULT_CLOCK, batch=CAPTURE_BATCH):
+        """
+        Constructor
+
+        @param file fileobj     binary file opened for writing
+        @param int vendor       usb vendor id of the captured device
+        @param int product      usb product id of the captured device
+        @param int clock        CLOCK_REALTIME or CLOCK_MONOTONIC
+        @param int batch        number of records buffered before a write
+        """
+        self._file = fileobj
+        self._clock = _CLOCKS[clock]
+        self._batch = bytearray(RECORD_SIZE * max(1, batch))
+        self._view = memoryview(self._batch)
+        self._pos = 0
+        self.count = 0
+        self._file.write(HEADER_STRUCT.pack(CAPTURE_MAGIC, CAPTURE_VERSION,
+                                            vendor, product, clock, RECORD_SIZE))
+
+    def write(self, buf, timestamp=None):
+        """
+        Append a report
+
+        @param buffer buf       64 bytes raw report
+        @param float timestamp  report time, now if not specified
+        """
+        if timestamp is None:
+            timestamp = self._clock()
+        pos = self._pos
+        _TIMESTAMP_STRUCT.pack_into(self._batch, pos, timestamp)
+        pos += _TIMESTAMP_SIZE
+        self._batch[pos:pos + REPORT_SIZE] = buf
+        self._pos = pos + REPORT_SIZE
+        self.count += 1
+        if self._pos == len(self._batch):
+            self._writeBatch()
+
+    def _writeBatch(self):
+        if self._pos:
+            self._file.write(self._view[:self._pos])
+            self._pos = 0
+
+    def flush(self):
+        """Write buffered records and flush the underlying file"""
+        self._writeBatch()
+        self._file.flush()
+
+    def close(self):
+        """Write buffered records and close the underlying file"""
+        if not self._file.closed:
+            self._writeBatch()
+            self._file.close()
+
+
+class CaptureReader(object):
+    """
+    Read a capture file record by record.
+    """
+
+    def __init__(self, fileobj):
+        """
+        Constructor
+
+        @param file fileobj     binary file opened for reading
+        """
+        self._file = fileobj
+        header = fileobj.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            raise CaptureError('Truncated capture header')
+        magic, version, vendor, product, clock, record_size = HEADER_STRUCT.unpack(header)
+        if magic != CAPTURE_MAGIC:
+            raise CaptureError('Not a steam controller capture')
+        if version != CAPTURE_VERSION or record_size != RECORD_SIZE:
+            raise CaptureError('Unsupported capture version {}'.format(version))
+        self.version = version
+        self.vendor = vendor
+        self.product = product
+        self.clock = clock
+        self._record = bytearray(RECORD_SIZE)
+
+    def readinto(self, buf):
+        """
+        Read next report into buf without allocating
+
+        @param bytearray buf    64 bytes buffer
+
+        @return float           report timestamp, None at end of file
+        """
+        record = self._record
+        if self._file.readinto(record) != RECORD_SIZE:
+            return None
+        buf[:] = memoryview(record)[_TIMESTAMP_SIZE:]
+        return _TIMESTAMP_STRUCT.unpack_from(record)[0]
+
+    def __iter__(self):
+        while True:
+            record = self._file.read(RECORD_SIZE)
+            if len(record) != RECORD_SIZE:
+                return
+            yield RECORD_STRUCT.unpack(record)
+
+    def rewind(self):
+        """Go back to the first record"""
+        self._file.seek(HEADER_SIZE)
+
+    def close(self):
+        """Close the underlying file"""
+        self._file.close()
+
+
+def record_dtype():
+    """
+    NumPy structured dtype of a capture record: timestamp, raw report
+    bytes and every decoded report field
+
+    @return numpy.dtype
+    """
+    import numpy
+
+    kinds = {'B': 'u1', 'b': 'i1', 'H': 'u2', 'h': 'i2', 'I': 'u4', 'i': 'i4'}
+    names = ['timestamp', 'raw']
+    formats = ['<f8', ('u1', REPORT_SIZE)]
+    offsets = [0, _TIMESTAMP_SIZE]
+    for name, (offset, fmt) in FIELD_OFFSETS.items():
+        names.append(name)
+        formats.append('<' + kinds[fmt])
+        offsets.append(_TIMESTAMP_SIZE + offset)
+    return numpy.dtype({'names': names, 'formats': formats,
+                        'offsets': offsets, 'itemsize': RECORD_SIZE})
+
+
+def load_array(path):
+    """
+    Memory map a capture file as a NumPy structured array, nothing is read
+    until fields are accessed (ex: arr['lpad_x'], arr['timestamp'])
+
+    @param str path         capture file path
+
+    @return numpy.memmap    read only record array, see record_dtype()
+    """
+    import numpy
+
+    with open(path, 'rb') as f:
+        CaptureReader(f)
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+    if count == 0:
+        return numpy.zeros(0, dtype=record_dtype())
+    return numpy.memmap(path, dtype=record_dtype(), mode='r',
+                        offset=HEADER_SIZE, shape=(count,))
+
+
+class CaptureRing(object):
+    """
+    In memory capture of the last reports, same interface as CaptureWriter
+    (SteamController.setCapture) and same records as load_array().
+
+    Each record is written twice, at its slot and at its slot plus the
+    capacity: the last records are always contiguous in the buffer and
+    read as a NumPy view without copy, a write costs the same whatever
+    the capacity.
+    """
+
+    def __init__(self, capacity, clock=DEFAULT_CLOCK):
+        """
+        Constructor
+
+        @param int capacity     number of records kept
+        @param int clock        CLOCK_REALTIME or CLOCK_MONOTONIC
+        """
+        import numpy
+
+        self.capacity = capacity
+        self._clock = _CLOCKS[clock]
+        self._buf = bytearray(2 * capacity * RECORD_SIZE)
+        self._array = numpy.frombuffer(self._buf, dtype=record_dtype())
+        self._second = capacity * RECORD_SIZE
+        self._pos = 0
+        self.count = 0
+
+    def write(self, buf, timestamp=None):
+        """
+        Append a report, the oldest one is overwritten when full
+
+        @param buffer buf       64 bytes raw report
+        @param float timestamp  report time, now if not specified
+        """
+        if timestamp is None:
+            timestamp = self._clock()
+        data = self._buf
+        for pos in (self._pos, self._pos + self._second):
+            _TIMESTAMP_STRUCT.pack_into(data, pos, timestamp)
+            pos += _TIMESTAMP_SIZE
+            data[pos:pos + REPORT_SIZE] = buf
+        self._pos += RECORD_SIZE
+        if self._pos == self._second:
+            self._pos = 0
+        self.count += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def array(self, count=None):
+        """
+        Last records, oldest first. The view is overwritten by later
+        writes, copy it to keep it.
+
+        @param int count        number of records, all kept ones if None
+
+        @return numpy.ndarray   record array view, see record_dtype()
+        """
+        end = self._pos // RECORD_SIZE + self.capacity
+        kept = min(self.count, self.capacity)
+        if count is None or count > kept:
+            count = kept
+        return self._array[end - count:end]
+
+    def window(self, seconds):
+        """
+        Records of the last seconds, relative to the last record timestamp
+
+        @param float seconds    window length
+
+        @return numpy.ndarray   record array view, oldest first
+        """
+        arr = self.array()
+        if len(arr) == 0:
+            return arr
+        stamps = arr['timestamp']
+        start = stamps.searchsorted(stamps[-1] - seconds)
+        return arr[start:]
+
+
+def open_capture(path, mode='r', **kwargs):
+    """
+    Open a capture file
+
+    @param str path         file path
+    @param str mode         'r' to read, 'w' to write
+    @param kwargs           CaptureWriter arguments in write mode
+
+    @return CaptureReader or CaptureWriter
+    """
+    if mode == 'r':
+        return CaptureReader(open(path, 'rb'))
+    elif mode == 'w':
+        return CaptureWriter(open(path, 'wb'), **kwargs)
+    raise ValueError('Invalid mode {}'.format(mode))
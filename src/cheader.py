@@ -24,10 +24,16 @@
 
 import ast
 import os
+import re
+import json
 import shlex
+import hashlib
+import tempfile
 from collections import OrderedDict
 import operator as op
 
+CACHE_VERSION = 2
+
 OPERATORS = {
     ast.Add    : op.add,
     ast.Sub    : op.sub,
@@ -73,9 +79,122 @@ def eval_expr(expr):
     return _eval(ast.parse(expr, mode='eval').body)
 
 
-def defines(base, include):
+_EVAL_CACHE = {}
+
+def cached_eval_expr(expr):
+
+    """ eval_expr with results (and failures) cached by expression """
+
+    try:
+        val = _EVAL_CACHE[expr]
+    except KeyError:
+        try:
+            val = eval_expr(expr)
+        except (SyntaxError, TypeError, KeyError, ZeroDivisionError,
+                ValueError, OverflowError) as e:
+            val = e
+        _EVAL_CACHE[expr] = val
+    if isinstance(val, Exception):
+        raise TypeError(val)
+    return val
+
+
+# Strings are matched to skip comment markers inside them
+_COMMENTS_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|/\*.*?\*/|//[^\n]*', re.S)
+_DIRECTIVE_RE = re.compile(r'^[ \t]*#[ \t]*(define|include)[ \t]+(.*)$', re.M)
+_DEFINE_RE = re.compile(r'([A-Za-z_]\w*)(\(?)[ \t]*(.*)$')
+_INCLUDE_RE = re.compile(r'[<"]([^>"]+)[>"]')
+_IDENT_RE = re.compile(r'[A-Za-z_]\w*')
+_SPACES_RE = re.compile(r'\s+')
+
+
+def _strip_comments(text):
+    return _COMMENTS_RE.sub(lambda m: m.group(0) if m.group(0)[0] == '"' else ' ', text)
 
-    """ Extract #define from base/include following #includes """
+
+def defines_lines(base, include, deps=None):
+
+    """ Extract #define from base/include following #includes.
+
+    Line oriented version of defines(): comments and line continuations are
+    removed from the whole file at once, then only #define and #include
+    lines are looked at. Macro references are resolved from the defines
+    already found, expressions are evaluated with cached_eval_expr.
+    """
+
+    parsed = set()
+    out = OrderedDict()
+
+    def _resolve(match):
+        name = match.group(0)
+        if name in out:
+            return str(out[name])
+        return name
+
+    def _parse(fname):
+        parsed.add(fname)
+        with open(fname) as f:
+            text = f.read()
+        text = _strip_comments(text.replace('\\\n', ' '))
+
+        for directive, rest in _DIRECTIVE_RE.findall(text):
+            if directive == 'define':
+                match = _DEFINE_RE.match(rest)
+                if match is None or match.group(2):
+                    # function like macro
+                    continue
+                name, _, expr = match.groups()
+                expr = _SPACES_RE.sub('', _IDENT_RE.sub(_resolve, expr))
+                try:
+                    out[name] = cached_eval_expr(expr)
+                except TypeError:
+                    pass
+            else:
+                match = _INCLUDE_RE.match(rest)
+                if match is None:
+                    continue
+                # "file" is first searched next to the including file
+                dirs = [base]
+                if rest[0] == '"':
+                    dirs.insert(0, os.path.dirname(fname))
+                for inc_dir in dirs:
+                    inc = os.path.normpath(os.path.abspath(os.path.join(inc_dir, match.group(1))))
+                    if os.path.isfile(inc):
+                        if inc not in parsed:
+                            _parse(inc)
+                        break
+
+    _parse(os.path.normpath(os.path.abspath(os.path.join(base, include))))
+
+    if deps is not None:
+        deps.extend(sorted(parsed))
+
+    return out
+
+
+def defines(base, include, deps=None, parser='lines'):
+
+    """ Extract #define from base/include following #includes
+
+    deps: optional list filled with the path of every parsed file
+
+    parser: 'lines' for the line oriented parser, 'shlex' for the
+    original token based parser
+    """
+
+    if parser == 'lines':
+        return defines_lines(base, include, deps)
+    elif parser == 'shlex':
+        return defines_shlex(base, include, deps)
+    raise ValueError('Unknown parser {}'.format(parser))
+
+
+def defines_shlex(base, include, deps=None):
+
+    """ Extract #define from base/include following #includes (token based)
+
+    deps: optional list filled with the path of every parsed file
+    """
 
     parsed = set()
     fname = os.path.normpath(os.path.abspath(os.path.join(base, include)))
@@ -160,7 +279,8 @@ def defines(base, include):
             try:
                 val = eval_expr(expr)
                 out[name] = val
-            except (SyntaxError, TypeError):
+            except (SyntaxError, TypeError, KeyError, ZeroDivisionError,
+                    ValueError, OverflowError):
                 pass
         elif tok == 'include':
 
@@ -182,11 +302,86 @@ def defines(base, include):
             lexer.push_token(tok)
 
 
+    if deps is not None:
+        deps.extend(sorted(parsed))
+
+    return out
+
+
+def cache_dir():
+
+    """ Default defines cache directory ($XDG_CACHE_HOME/steamcontroller) """
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'steamcontroller')
+
+
+def _stat(fname):
+    st = os.stat(fname)
+    return [fname, st.st_mtime, st.st_size]
+
+
+def cached_defines(base, include, cache=None):
+
+    """ Same as defines() but the result is stored in a json file of the cache
+    directory, reused as long as the mtime and size of every parsed header are
+    unchanged. Cache errors are ignored, headers are then parsed every time.
+    """
+
+    if cache is None:
+        cache = cache_dir()
+    fname = os.path.normpath(os.path.abspath(os.path.join(base, include)))
+    key = hashlib.sha1(fname.encode('utf-8')).hexdigest()
+    path = os.path.join(cache, 'defines-{}.json'.format(key))
+
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if (data['version'] == CACHE_VERSION and
+                all(_stat(dep[0]) == dep for dep in data['deps'])):
+            return OrderedDict((name, val) for name, val in data['defines'])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+
+    deps = []
+    out = defines(base, include, deps)
+
+    try:
+        if not os.path.isdir(cache):
+            os.makedirs(cache)
+        data = {
+            'version': CACHE_VERSION,
+            'deps': [_stat(dep) for dep in deps],
+            'defines': list(out.items()),
+        }
+        fd, tmp = tempfile.mkstemp(dir=cache)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
     return out
 
 
+def write_module(definesDict, stream, source=''):
+
+    """ Write defines as a python module defining a DEFINES OrderedDict """
+
+    stream.write('# Generated by steamcontroller.cheader from {}, do not edit\n\n'.format(source))
+    stream.write('from collections import OrderedDict\n\n')
+    stream.write('DEFINES = OrderedDict([\n')
+    for k, v in definesDict.items():
+        stream.write('    ({!r}, {!r}),\n'.format(k, v))
+    stream.write('])\n')
+
+
 if __name__ == '__main__':
     import sys
+    if len(sys.argv) > 3 and sys.argv[3] == '--module':
+        write_module(defines(sys.argv[1], sys.argv[2]), sys.stdout,
+                     os.path.join(sys.argv[1], sys.argv[2]))
+        sys.exit(0)
     definesDict = defines(sys.argv[1], sys.argv[2])
     for k, v in definesDict.items():
         print("{}:\t{}".format(k, v))
@@ -0,0 +1,166 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam Controller control message scheduler"""
+
+import time
+from collections import deque
+
+PRIORITY_HIGH   = 0
+PRIORITY_NORMAL = 1
+
+CONTROL_QUEUE_SIZE   = 16
+CONTROL_MIN_INTERVAL = 0.004
+CONTROL_TIMEOUT      = 100
+
+
+class ControlQueue(object):
+    """
+    Prioritized control message queue.
+
+    Messages are sent with asynchronous control transfers, one at a time
+    and no faster than min_interval. High priority messages (configuration)
+    are always sent before normal ones (haptic feedback). A message pushed
+    with the key of a message still waiting replaces it instead of being
+    queued, it keeps its place unless pushed with a higher priority, and
+    the oldest normal message is dropped when the queue is full.
+    """
+
+    def __init__(self, submit,
+                 maxlen=CONTROL_QUEUE_SIZE,
+                 min_interval=CONTROL_MIN_INTERVAL,
+                 timeout=CONTROL_TIMEOUT,
+                 clock=time.time):
+        """
+        Constructor
+
+        @param callable submit      submit(data, callback, timeout) starting an
+                                    asynchronous control transfer, returns
+                                    False on failure, callback(ok) is called
+                                    on completion
+        @param int maxlen           maximum number of normal priority messages
+        @param float min_interval   minimum time between two sends in seconds
+        @param int timeout          control transfer timeout in ms
+        @param callable clock       time source
+        """
+        self._submit = submit
+        self._maxlen = maxlen
+        self._min_interval = min_interval
+        self._timeout = timeout
+        self._clock = clock
+        self._queues = (deque(), deque())
+        self._keys = {}
+        self._inflight = False
+        self._last = None
+        self._sent = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._failed = 0
+
+    def __len__(self):
+        return len(self._queues[PRIORITY_HIGH]) + len(self._queues[PRIORITY_NORMAL])
+
+    def push(self, data, key=None, priority=PRIORITY_NORMAL):
+        """
+        Queue a control message
+
+        @param bytes data       control message
+        @param key              coalescing key (ex: 'lpad'), None to never coalesce
+        @param int priority     PRIORITY_HIGH or PRIORITY_NORMAL
+        """
+        if key is not None and key in self._keys:
+            entry = self._keys[key]
+            entry[1] = data
+            self._coalesced += 1
+            if priority < entry[2]:
+                # a high priority message must not wait behind normal ones
+                self._queues[entry[2]].remove(entry)
+                entry[2] = priority
+                self._queues[priority].append(entry)
+            return
+
+        queue = self._queues[priority]
+        if priority == PRIORITY_NORMAL and len(queue) >= self._maxlen:
+            old_key, _, _ = queue.popleft()
+            self._keys.pop(old_key, None)
+            self._dropped += 1
+
+        entry = [key, data, priority]
+        queue.append(entry)
+        if key is not None:
+            self._keys[key] = entry
+
+    def _pop(self):
+        for queue in self._queues:
+            if queue:
+                key, data, _ = queue.popleft()
+                if key is not None:
+                    del self._keys[key]
+                return data
+        return None
+
+    def _onDone(self, ok):
+        self._inflight = False
+        if not ok:
+            self._failed += 1
+
+    def pump(self):
+        """
+        Send the next message if the previous one completed and the rate
+        limit permits it. Never blocks.
+
+        @return float           seconds before the next message can be sent,
+                                None if nothing is waiting
+        """
+        if not len(self):
+            return None
+        if self._inflight:
+            # Completion will be seen at the next usb event
+            return None
+
+        now = self._clock()
+        if self._last is not None:
+            delay = self._last + self._min_interval - now
+            if delay > 0:
+                return delay
+
+        data = self._pop()
+        self._last = now
+        self._inflight = True
+        if self._submit(data, self._onDone, self._timeout):
+            self._sent += 1
+        else:
+            self._inflight = False
+            self._failed += 1
+        return self._min_interval if len(self) else None
+
+    def stats(self):
+        """
+        @return dict    queue depth and sent/coalesced/dropped/failed counts
+        """
+        return {
+            'depth': len(self),
+            'sent': self._sent,
+            'coalesced': self._coalesced,
+            'dropped': self._dropped,
+            'failed': self._failed,
+        }
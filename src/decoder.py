@@ -0,0 +1,228 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam Controller USB report decoder"""
+
+import struct
+from collections import namedtuple, OrderedDict
+
+REPORT_SIZE = 64
+
+STEAM_CONTROLER_FORMAT = [
+    ('x',   'ukn_00'),
+    ('x',   'ukn_01'),
+    ('H',   'status'),
+    ('H',   'seq'),
+    ('x',   'ukn_02'),
+    ('I',   'buttons'),
+    ('B',   'ltrig'),
+    ('B',   'rtrig'),
+    ('x',   'ukn_03'),
+    ('x',   'ukn_04'),
+    ('x',   'ukn_05'),
+    ('h',   'lpad_x'),
+    ('h',   'lpad_y'),
+    ('h',   'rpad_x'),
+    ('h',   'rpad_y'),
+    ('10x', 'ukn_06'),
+    ('h',   'gpitch'),
+    ('h',   'groll'),
+    ('h',   'gyaw'),
+    ('h',   'q1'),
+    ('h',   'q2'),
+    ('h',   'q3'),
+    ('h',   'q4'),
+    ('16x', 'ukn_07'),
+]
+
+_FORMATS, _NAMES = zip(*STEAM_CONTROLER_FORMAT)
+
+SteamControllerInput = namedtuple('SteamController', ' '.join([x for x in _NAMES if not x.startswith('ukn_')]))
+
+# Compiled once, the format string is never parsed again per report
+REPORT_STRUCT = struct.Struct('<' + ''.join(_FORMATS))
+
+assert REPORT_STRUCT.size == REPORT_SIZE
+
+# Byte offset and struct format character of each named field in a report
+FIELD_OFFSETS = OrderedDict()
+_offset = 0
+for _fmt, _name in STEAM_CONTROLER_FORMAT:
+    if not _name.startswith('ukn_'):
+        FIELD_OFFSETS[_name] = (_offset, _fmt)
+    _offset += struct.calcsize('<' + _fmt)
+del _offset, _fmt, _name
+
+_unpack_from = REPORT_STRUCT.unpack_from
+_make = SteamControllerInput._make
+
+
+def unpack(buf, offset=0):
+    """
+    Decode one report into a plain tuple of values (same order as
+    SteamControllerInput fields).
+
+    @param buffer buf       bytes, bytearray, memoryview or ctypes buffer
+    @param int offset       offset of the report in buf
+
+    @return tuple
+    """
+    return _unpack_from(buf, offset)
+
+
+def decode(buf, offset=0):
+    """
+    Decode one report directly from buf, no copy of the buffer is made.
+
+    @param buffer buf       bytes, bytearray, memoryview or ctypes buffer
+    @param int offset       offset of the report in buf
+
+    @return SteamControllerInput
+    """
+    return _make(_unpack_from(buf, offset))
+
+
+def decode_batch(buf, count=None, offset=0):
+    """
+    Decode count consecutive reports stored in one contiguous buffer.
+
+    @param buffer buf       buffer containing the reports
+    @param int count        number of reports, None to decode the whole buffer
+    @param int offset       offset of the first report in buf
+
+    @return list of SteamControllerInput
+    """
+    if count is None:
+        count = (len(buf) - offset) // REPORT_SIZE
+    end = offset + count * REPORT_SIZE
+    if end > len(buf):
+        raise ValueError('Buffer too small for {} reports'.format(count))
+    return [_make(_unpack_from(buf, off)) for off in range(offset, end, REPORT_SIZE)]
+
+
+_FIELDS = SteamControllerInput._fields
+
+# Field index by name and by position, so both lookups cost one dict access
+_INDEX = dict((name, i) for i, name in enumerate(_FIELDS))
+_INDEX.update((i, i) for i in range(len(_FIELDS)))
+
+
+class SteamControllerState(object):
+    """
+    Fixed layout controller state, updated in place from each report.
+
+    The same instance is reused for every report, fields are readable as
+    attributes (state.buttons), by name (state['buttons']) or by index
+    (state[2]). The values of the previous report are kept to permit cheap
+    diffs. Use copy() or asInput() to keep a snapshot.
+    """
+
+    __slots__ = ('_values', '_prev')
+
+    def __init__(self, values=None):
+        if values is None:
+            values = (0,) * len(_FIELDS)
+        self._values = tuple(values)
+        self._prev = self._values
+
+    def update(self, buf, offset=0):
+        """
+        Decode a new report from buf, current values become the previous ones
+
+        @param buffer buf       buffer containing the report
+        @param int offset       offset of the report in buf
+        """
+        self._prev = self._values
+        self._values = _unpack_from(buf, offset)
+
+    def __getitem__(self, key):
+        return self._values[_INDEX[key]]
+
+    def values(self):
+        """
+        @return tuple           current values (same order as SteamControllerInput)
+        """
+        return self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(_FIELDS)
+
+    def __eq__(self, other):
+        if not isinstance(other, (SteamControllerState, tuple, list)):
+            return NotImplemented
+        return self._values == tuple(other)
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'SteamControllerState(' + ', '.join(
+            '{}={!r}'.format(name, val) for name, val in zip(_FIELDS, self._values)) + ')'
+
+    def prev(self, key):
+        """
+        Value of a field in the previous report
+
+        @param str|int key      field name or index
+        """
+        return self._prev[_INDEX[key]]
+
+    def changed(self):
+        """
+        @return bool            True if any field changed since previous report
+        """
+        return self._values != self._prev
+
+    def diff(self):
+        """
+        @return list of str     names of the fields changed since previous report
+        """
+        prev = self._prev
+        return [_FIELDS[i] for i, val in enumerate(self._values) if val != prev[i]]
+
+    def copy(self):
+        """
+        @return SteamControllerState    independent snapshot of this state
+        """
+        state = SteamControllerState(self._values)
+        state._prev = self._prev
+        return state
+
+    def asInput(self):
+        """
+        @return SteamControllerInput    namedtuple compatibility view
+        """
+        return _make(self._values)
+
+
+def _field(idx):
+    return property(lambda self: self._values[idx])
+
+for _i, _name in enumerate(_FIELDS):
+    setattr(SteamControllerState, _name, _field(_i))
+del _i, _name
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Gyroscope pipeline
+
+Reports carry gyroscope rates (gpitch, groll, gyaw) and the orientation
+quaternion computed by the controller (q1..q4, w x y z) once the gyro is
+enabled (SteamController.setGyro). GyroFilter turns each report into an
+orientation delta, GyroMouse and GyroStick turn the deltas into relative
+mouse moves or a joystick deflection.
+
+Everything runs per report: the filter works with a fixed time step (the
+report period) instead of reading a clock, keeps its state in plain float
+attributes and allocates nothing per report.
+"""
+
+from math import radians
+
+from steamcontroller import SCStatus
+from steamcontroller.decoder import SteamControllerInput
+from steamcontroller import uinput
+
+# Seconds between two input reports
+REPORT_PERIOD = 0.004
+
+# rad/s per gyro rate unit (+-2000 deg/s full scale)
+GYRO_RATE_SCALE = radians(2000.0) / 32768
+
+# Quaternion unit
+QUATERNION_SCALE = 32767.0
+
+# Default part of the delta coming from the rates, the rest comes from the
+# quaternion (drift corrected by the controller)
+FUSION = 0.5
+
+# Default smoothing, 0 to disable, close to 1 for heavy smoothing
+SMOOTHING = 0.5
+
+# Rates below this (all axes, rate units) are considered as noise around
+# the bias, which is then slowly learned
+BIAS_THRESHOLD = 40
+BIAS_RATE = 0.002
+
+# Mouse counts per radian at sensitivity 1.0
+MOUSE_SCALE = 1200.0
+
+# Angular speed (rad/s) giving a full joystick deflection at sensitivity 1.0
+STICK_SPEED = radians(360.0)
+
+_FIELDS = SteamControllerInput._fields
+_STATUS = _FIELDS.index('status')
+_GPITCH = _FIELDS.index('gpitch')
+_GROLL = _FIELDS.index('groll')
+_GYAW = _FIELDS.index('gyaw')
+_Q1 = _FIELDS.index('q1')
+_Q2 = _FIELDS.index('q2')
+_Q3 = _FIELDS.index('q3')
+_Q4 = _FIELDS.index('q4')
+_INPUT = int(SCStatus.Input)
+
+
+class GyroFilter(object):
+    """
+    Fixed step orientation filter
+
+    The rate delta (bias corrected rates times the report period) and the
+    quaternion delta (rotation between the previous and current
+    quaternions, in the controller frame) are blended, then smoothed by a
+    first order low pass filter. The low pass delays motion but keeps its
+    sum, a rotation moves the output by the same total amount whatever the
+    smoothing.
+    """
+
+    def __init__(self, period=REPORT_PERIOD, smoothing=SMOOTHING, fusion=FUSION):
+        """
+        Constructor
+
+        @param float period     seconds between two reports
+        @param float smoothing  low pass factor in [0, 1)
+        @param float fusion     weight of the rates against the quaternion,
+                                1.0 for rates only
+        """
+        self.period = period
+        self._step = period * GYRO_RATE_SCALE
+        self._k = 1.0 - smoothing
+        self._fusion = fusion
+        self._qscale = 2.0 / (QUATERNION_SCALE * QUATERNION_SCALE)
+        self.bias_pitch = self.bias_roll = self.bias_yaw = 0.0
+        self.reset()
+
+    def reset(self):
+        """Forget motion history (gyro gated off), keep the learned bias"""
+        # last orientation deltas in radians
+        self.pitch = self.roll = self.yaw = 0.0
+        self._qw = self._qx = self._qy = self._qz = 0
+
+    def update(self, values):
+        """
+        Process one report
+
+        @param tuple values     report values (SteamControllerInput order),
+                                deltas are then in pitch, roll and yaw
+        """
+        gp = values[_GPITCH]
+        gr = values[_GROLL]
+        gy = values[_GYAW]
+        if -BIAS_THRESHOLD < gp < BIAS_THRESHOLD and \
+           -BIAS_THRESHOLD < gr < BIAS_THRESHOLD and \
+           -BIAS_THRESHOLD < gy < BIAS_THRESHOLD:
+            self.bias_pitch += (gp - self.bias_pitch) * BIAS_RATE
+            self.bias_roll += (gr - self.bias_roll) * BIAS_RATE
+            self.bias_yaw += (gy - self.bias_yaw) * BIAS_RATE
+        step = self._step
+        dp = (gp - self.bias_pitch) * step
+        dr = (gr - self.bias_roll) * step
+        dy = (gy - self.bias_yaw) * step
+
+        w2 = values[_Q1]
+        x2 = values[_Q2]
+        y2 = values[_Q3]
+        z2 = values[_Q4]
+        w1 = self._qw
+        x1 = self._qx
+        y1 = self._qy
+        z1 = self._qz
+        self._qw = w2
+        self._qx = x2
+        self._qy = y2
+        self._qz = z2
+        if (w1 or x1 or y1 or z1) and (w2 or x2 or y2 or z2):
+            # vector part of conj(q1) * q2, 2 * v is the small rotation
+            qs = self._qscale
+            if w1 * w2 + x1 * x2 + y1 * y2 + z1 * z2 < 0:
+                qs = -qs
+            f = self._fusion
+            g = 1.0 - f
+            dp = f * dp + g * qs * (w1 * x2 - x1 * w2 - y1 * z2 + z1 * y2)
+            dr = f * dr + g * qs * (w1 * y2 + x1 * z2 - y1 * w2 - z1 * x2)
+            dy = f * dy + g * qs * (w1 * z2 - x1 * y2 + y1 * x2 - z1 * w2)
+
+        k = self._k
+        self.pitch += (dp - self.pitch) * k
+        self.roll += (dr - self.roll) * k
+        self.yaw += (dy - self.yaw) * k
+
+
+class GyroMouse(object):
+    """
+    Gyro to relative mouse moves: yaw moves x, pitch moves y. Sub count
+    motion is accumulated, not lost.
+    """
+
+    def __init__(self, device, codes=None, sensitivity=1.0, filt=None):
+        """
+        Constructor
+
+        @param UInput device    output device, usually a uinput.Mouse
+        @param tuple codes      (x, y) relative axes codes, REL_X REL_Y if None
+        @param float sensitivity    multiplier of MOUSE_SCALE
+        @param GyroFilter filt  filter, a default one if None
+        """
+        if codes is None:
+            codes = uinput.codes('REL_X', 'REL_Y')
+        self._dev = device
+        self._cx, self._cy = codes
+        self._scale = -MOUSE_SCALE * sensitivity
+        self.filter = filt if filt is not None else GyroFilter()
+        self._ax = self._ay = 0.0
+
+    def reset(self):
+        """Gyro gated off: stop motion without output"""
+        self.filter.reset()
+        self._ax = self._ay = 0.0
+
+    def release(self):
+        """
+        Nothing is held by relative moves
+
+        @return bool            True if events were queued
+        """
+        self.reset()
+        return False
+
+    def update(self, values):
+        """
+        Queue the move of a report
+
+        @return bool            True if events were queued
+        """
+        filt = self.filter
+        filt.update(values)
+        ax = self._ax + filt.yaw * self._scale
+        ay = self._ay + filt.pitch * self._scale
+        dx = int(ax)
+        dy = int(ay)
+        self._ax = ax - dx
+        self._ay = ay - dy
+        if dx or dy:
+            dev = self._dev
+            dev.queueRel(self._cx, dx)
+            dev.queueRel(self._cy, dy)
+            return True
+        return False
+
+    def callback(self, sc, sci):
+        """
+        SteamController callback
+
+        @param SteamController sc
+        @param SteamControllerState sci     or SteamControllerInput
+        """
+        values = sci if isinstance(sci, tuple) else sci.values()
+        if values[_STATUS] == _INPUT and self.update(values):
+            self._dev.flush()
+
+
+class GyroStick(GyroMouse):
+    """
+    Gyro to joystick deflection: the angular speed (yaw on x, pitch on y)
+    is mapped to the axes, STICK_SPEED gives a full deflection
+    """
+
+    def __init__(self, device, codes=None, sensitivity=1.0, filt=None):
+        """
+        Constructor
+
+        @param UInput device    output device, usually a uinput.Xbox360
+        @param tuple codes      (x, y) absolute axes codes, ABS_RX ABS_RY if
+                                None
+        @param float sensitivity    multiplier of the deflection
+        @param GyroFilter filt  filter, a default one if None
+        """
+        if codes is None:
+            codes = uinput.codes('ABS_RX', 'ABS_RY')
+        super(GyroStick, self).__init__(device, codes, sensitivity, filt)
+        self._scale = -32767 * sensitivity / (STICK_SPEED * self.filter.period)
+        self._x = self._y = 0
+
+    def release(self):
+        """
+        Center the stick
+
+        @return bool            True if events were queued
+        """
+        self.filter.reset()
+        queued = False
+        if self._x:
+            self._x = 0
+            self._dev.queueAxis(self._cx, 0)
+            queued = True
+        if self._y:
+            self._y = 0
+            self._dev.queueAxis(self._cy, 0)
+            queued = True
+        return queued
+
+    def update(self, values):
+        filt = self.filter
+        filt.update(values)
+        scale = self._scale
+        x = int(filt.yaw * scale)
+        y = int(filt.pitch * scale)
+        if x > 32767:
+            x = 32767
+        elif x < -32767:
+            x = -32767
+        if y > 32767:
+            y = 32767
+        elif y < -32767:
+            y = -32767
+        queued = False
+        if x != self._x:
+            self._x = x
+            self._dev.queueAxis(self._cx, x)
+            queued = True
+        if y != self._y:
+            self._y = y
+            self._dev.queueAxis(self._cy, y)
+            queued = True
+        return queued
+
@@ -0,0 +1,271 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Latency measurement from usb report arrival to uinput write"""
+
+import sys
+import time
+import signal
+from array import array
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Histogram precision: 2**(SUB_BITS-1) buckets per power of two (~6% error)
+SUB_BITS = 5
+_SUB_COUNT = 1 << SUB_BITS
+_SUB_HALF = _SUB_COUNT >> 1
+
+# Values are in us, anything above 2**MAX_BITS us (~17 min) is clamped
+MAX_BITS = 30
+
+STAGES = ('dispatch', 'mapper', 'output', 'total')
+
+
+def _bucket(val):
+    if val < _SUB_COUNT:
+        return val
+    shift = val.bit_length() - SUB_BITS
+    return _SUB_COUNT + (shift - 1) * _SUB_HALF + (val >> shift) - _SUB_HALF
+
+
+def _bucketValue(idx):
+    if idx < _SUB_COUNT:
+        return idx
+    shift, sub = divmod(idx - _SUB_COUNT, _SUB_HALF)
+    return (sub + _SUB_HALF) << (shift + 1)
+
+
+class Histogram(object):
+    """
+    Log-linear (HDR style) histogram of integer values in a preallocated
+    array, recording is O(1) and never allocates.
+    """
+
+    # number of buckets
+    SIZE = _bucket((1 << MAX_BITS) - 1) + 1
+
+    def __init__(self, counts=None):
+        """
+        Constructor
+
+        @param buffer counts    SIZE unsigned longs holding the buckets (ex:
+                                memoryview of shared memory), a new array if
+                                None. Given counts are kept as is.
+        """
+        if counts is None:
+            counts = array('L', [0] * self.SIZE)
+            self._counts = counts
+            self.reset()
+        else:
+            self._counts = counts
+            self.load()
+        self._last = len(self._counts) - 1
+
+    def load(self):
+        """
+        Recompute count, total, min and max from the buckets, for counts
+        filled by another process. Values are then bucket lower bounds.
+        """
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        for idx, cnt in enumerate(self._counts):
+            if cnt:
+                val = _bucketValue(idx)
+                self.count += cnt
+                self.total += cnt * val
+                if self.min is None:
+                    self.min = val
+                self.max = val
+
+    def reset(self):
+        """Clear all recorded values"""
+        for i in range(len(self._counts)):
+            self._counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, val):
+        """
+        Record a value
+
+        @param int val          value, negative values are recorded as 0
+        """
+        if val < 0:
+            val = 0
+        idx = _bucket(val)
+        if idx > self._last:
+            idx = self._last
+        self._counts[idx] += 1
+        self.count += 1
+        self.total += val
+        if self.min is None or val < self.min:
+            self.min = val
+        if self.max is None or val > self.max:
+            self.max = val
+
+    def mean(self):
+        """@return float         mean of recorded values"""
+        return float(self.total) / self.count if self.count else 0.0
+
+    def percentile(self, pct):
+        """
+        @param float pct        percentile (0-100)
+
+        @return int             lower bound of the bucket holding the percentile
+        """
+        if not self.count:
+            return 0
+        target = max(1, int(round(self.count * pct / 100.0)))
+        seen = 0
+        for idx, cnt in enumerate(self._counts):
+            seen += cnt
+            if seen >= target:
+                return min(max(_bucketValue(idx), self.min), self.max)
+        return self.max
+
+
+class LatencyRecorder(object):
+    """
+    Per stage latency of each report:
+
+     - dispatch: usb transfer completion to mapper callback entry
+     - mapper: mapper callback entry to exit, or to the start of the first
+       uinput flush when the mapper flushes itself
+     - output: mapper exit to the end of the first uinput flush
+     - total: usb transfer completion to the end of the first uinput flush
+
+    The recorder is given to SteamController and UInput with their
+    setLatencyRecorder() method, nothing is measured when no recorder is
+    set. Times are recorded in us, the last reports total latencies are
+    also kept in a fixed size ring.
+    """
+
+    def __init__(self, ring_size=1024, clock=_clock):
+        """
+        Constructor
+
+        @param int ring_size    number of last total latencies kept
+        @param callable clock   time source in seconds
+        """
+        self._clock = clock
+        self.histograms = dict((name, Histogram()) for name in STAGES)
+        self._ring = array('d', [0.0] * ring_size)
+        self._ring_pos = 0
+        self._arrival = None
+        self._enter = None
+        self._leave = None
+        self._flushing = None
+
+    def arrival(self):
+        """Report received from the usb transfer"""
+        self._arrival = self._clock()
+        self._enter = None
+        self._leave = None
+        self._flushing = None
+
+    def enter(self):
+        """Mapper callback entry"""
+        self._enter = self._clock()
+
+    def leave(self):
+        """Mapper callback exit"""
+        self._leave = self._clock()
+
+    def flushing(self):
+        """uinput write starting"""
+        if self._arrival is not None and self._flushing is None:
+            self._flushing = self._clock()
+
+    def flushed(self):
+        """uinput events written, only the first flush after arrival counts"""
+        arrival = self._arrival
+        if arrival is None:
+            return
+        now = self._clock()
+        self._arrival = None
+        hists = self.histograms
+        total = now - arrival
+        hists['total'].record(int(total * 1e6))
+        if self._enter is not None:
+            hists['dispatch'].record(int((self._enter - arrival) * 1e6))
+            leave = self._leave if self._leave is not None else self._flushing
+            if leave is not None:
+                hists['mapper'].record(int((leave - self._enter) * 1e6))
+                hists['output'].record(int((now - leave) * 1e6))
+        self._ring[self._ring_pos] = total
+        self._ring_pos = (self._ring_pos + 1) % len(self._ring)
+
+    def recent(self):
+        """
+        @return list of float   last total latencies in seconds, oldest first
+        """
+        ring = self._ring.tolist()
+        pos = self._ring_pos
+        return [x for x in ring[pos:] + ring[:pos] if x]
+
+    def reset(self):
+        """Clear all histograms and the ring"""
+        for hist in self.histograms.values():
+            hist.reset()
+        for i in range(len(self._ring)):
+            self._ring[i] = 0.0
+        self._ring_pos = 0
+
+    def summary(self):
+        """
+        @return str             one line per stage with count, mean and percentiles in us
+        """
+        lines = ['{:9s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s}'.format(
+            'stage', 'count', 'mean', 'p50', 'p90', 'p99', 'max')]
+        for name in STAGES:
+            hist = self.histograms[name]
+            lines.append('{:9s} {:8d} {:8.1f} {:8d} {:8d} {:8d} {:8d}'.format(
+                name, hist.count, hist.mean(),
+                hist.percentile(50), hist.percentile(90), hist.percentile(99),
+                hist.max or 0))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path=None):
+        """
+        Write summary to a file (appended) or stderr
+
+        @param str path         output file, None for stderr
+        """
+        if path is None:
+            sys.stderr.write(self.summary())
+            sys.stderr.flush()
+        else:
+            with open(path, 'a') as f:
+                f.write(self.summary())
+
+    def installSignalHandler(self, signum=signal.SIGUSR1, path=None):
+        """
+        Dump summary when signal is received (ex: kill -USR1 <pid>)
+
+        @param int signum       signal number
+        @param str path         output file, None for stderr
+        """
+        signal.signal(signum, lambda *args: self.dump(path))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Several controllers served by one process
+
+ControllerManager opens every controller of a bus (see
+steamcontroller.transport, LibUSBBus or ReplayBus) and drives them all
+from a single poll loop. Each controller has its own outputs (callback
+and uinput devices) created by a factory, they are kept when the
+controller goes away and reused if it comes back under the same name.
+Outputs can also live in a worker process per controller.
+"""
+
+import time
+
+from steamcontroller import SteamController
+from steamcontroller.latency import LatencyRecorder
+from steamcontroller.workers import Worker
+
+# Seconds between two bus scans for new controllers
+RESCAN_INTERVAL = 2.0
+
+# Seconds between two worker processes liveness checks
+SUPERVISE_INTERVAL = 0.5
+
+
+def _ignore(sc, state):
+    """Callback of controllers mapped in a worker process"""
+    pass
+
+
+class _Controller(object):
+    """Bookkeeping of one opened controller"""
+
+    def __init__(self, name, sc, outputs, latency, start):
+        self.name = name
+        self.sc = sc
+        self.outputs = outputs
+        self.latency = latency
+        self.start = start
+
+
+class ControllerManager(object):
+    """
+    Drive all controllers of a bus
+    """
+
+    def __init__(self, bus, factory, latency=False, rescan=RESCAN_INTERVAL, clock=time.time,
+                 workers=False, cpus=None, on_open=None):
+        """
+        Constructor
+
+        @param Bus bus          controllers source
+        @param callable factory factory(name) returns (callback,
+                                callback_args, release, devices) for a new
+                                controller, release() is called when the
+                                controller is lost (None if not needed) and
+                                devices are its UInput devices
+        @param bool latency     give each controller its own LatencyRecorder,
+                                with workers the latency measured by the
+                                worker ring is reported instead
+        @param float rescan     seconds between bus scans, None to scan only
+                                on start
+        @param callable clock   time source
+        @param bool workers     map each controller in its own process (see
+                                steamcontroller.workers), factory is then
+                                called in the worker and callbacks get None
+                                instead of the SteamController
+        @param list cpus        with workers, pin the worker of the n-th
+                                controller to cpus[n % len(cpus)]
+        @param callable on_open on_open(name, sc) called with each new
+                                SteamController before its reports are
+                                processed (capture, gyro...), at every
+                                connection
+        """
+        self._bus = bus
+        self._factory = factory
+        self._latency = latency
+        self._rescan = rescan
+        self._clock = clock
+        self._workers = workers
+        self._cpus = cpus
+        self._on_open = on_open
+        self._controllers = []
+        self._outputs = {}
+        self._lost = {}
+        self._next_scan = None
+        self._next_check = None
+        self._running = False
+
+    def _newOutputs(self, name):
+        if not self._workers:
+            return self._factory(name)
+        cpu = None
+        if self._cpus:
+            cpu = self._cpus[len(self._outputs) % len(self._cpus)]
+        worker = Worker(name, self._factory, cpu)
+        worker.start()
+        if self._next_check is None:
+            self._next_check = self._clock() + SUPERVISE_INTERVAL
+        return (_ignore, None, worker.release, [], worker)
+
+    def scan(self):
+        """
+        Open new controllers of the bus
+
+        @return int             number of controllers added
+        """
+        added = 0
+        for transport in self._bus.find():
+            name = transport.name
+            outputs = self._outputs.get(name)
+            if outputs is None:
+                outputs = self._newOutputs(name)
+                self._outputs[name] = outputs
+            callback, callback_args, _, devices = outputs[:4]
+            try:
+                sc = SteamController(callback=callback, callback_args=callback_args,
+                                     transport=transport)
+            except Exception:
+                transport.close()
+                continue
+            if len(outputs) > 4:
+                # raw reports go to the worker
+                sc.setPump(outputs[4])
+            recorder = None
+            if self._latency and not self._workers:
+                recorder = LatencyRecorder()
+                sc.setLatencyRecorder(recorder)
+                for dev in devices:
+                    dev.setLatencyRecorder(recorder)
+            if self._on_open is not None:
+                self._on_open(name, sc)
+            self._controllers.append(_Controller(name, sc, outputs, recorder, self._clock()))
+            added += 1
+        if self._rescan is not None:
+            self._next_scan = self._clock() + self._rescan
+        return added
+
+    def _remove(self, ctrl):
+        self._controllers.remove(ctrl)
+        stats = ctrl.sc.stats()
+        stats['duration'] = self._clock() - ctrl.start
+        self._lost[ctrl.name] = stats
+        ctrl.sc.close()
+        release = ctrl.outputs[2]
+        if release is not None:
+            release()
+
+    def poll(self, timeout=None):
+        """
+        Wait for reports of any controller and process them
+
+        @param float timeout    maximum wait in seconds, None for no limit
+        """
+        if self._next_scan is not None:
+            now = self._clock()
+            if now >= self._next_scan:
+                self.scan()
+            wait = max(0.0, self._next_scan - now)
+            if timeout is None or wait < timeout:
+                timeout = wait
+
+        if self._next_check is not None:
+            now = self._clock()
+            if now >= self._next_check:
+                self._next_check = now + SUPERVISE_INTERVAL
+                for outputs in self._outputs.values():
+                    outputs[4].check()
+            wait = max(0.0, self._next_check - now)
+            if timeout is None or wait < timeout:
+                timeout = wait
+
+        controllers = self._controllers
+        for ctrl in controllers:
+            delay = ctrl.sc.prepare()
+            if delay is not None and (timeout is None or delay < timeout):
+                timeout = delay
+
+        fds = self._bus.poll(timeout)
+
+        for ctrl in list(controllers):
+            if ctrl.sc.transport.active():
+                ctrl.sc.ready(fds)
+            else:
+                self._remove(ctrl)
+
+    def run(self):
+        """
+        Serve controllers until stop() is called, or until none is left
+        when rescan is None
+        """
+        self._running = True
+        self.scan()
+        while self._running and (self._controllers or self._rescan is not None):
+            self.poll()
+
+    def stop(self):
+        """Stop run() after the current poll"""
+        self._running = False
+
+    def close(self):
+        """Close all controllers, worker processes and the bus"""
+        for ctrl in list(self._controllers):
+            self._remove(ctrl)
+        if self._workers:
+            for outputs in self._outputs.values():
+                outputs[4].stop()
+        self._bus.close()
+
+    def controllers(self):
+        """
+        @return list of str     names of the connected controllers
+        """
+        return [ctrl.name for ctrl in self._controllers]
+
+    def stats(self):
+        """
+        Per controller statistics, connected ones and the last session of
+        lost ones
+
+        @return dict            {name: stats}, SteamController.stats() plus
+                                connected, duration (s), rate (reports/s) and
+                                latency total p50 / p99 (us) when measured
+        """
+        out = {}
+        for name, stats in self._lost.items():
+            stats = dict(stats)
+            stats['connected'] = False
+            out[name] = stats
+        now = self._clock()
+        for ctrl in self._controllers:
+            stats = ctrl.sc.stats()
+            stats['connected'] = True
+            stats['duration'] = now - ctrl.start
+            out[ctrl.name] = stats
+            if ctrl.latency is not None:
+                hist = ctrl.latency.histograms['total']
+                stats['latency_p50'] = hist.percentile(50)
+                stats['latency_p99'] = hist.percentile(99)
+        if self._workers:
+            for name, outputs in self._outputs.items():
+                if name in out:
+                    worker = outputs[4].stats()
+                    out[name].update(worker)
+                    if self._latency:
+                        # arrival here to the end of the callback in the
+                        # worker, uinput flush included
+                        out[name]['latency_p50'] = worker['worker_p50']
+                        out[name]['latency_p99'] = worker['worker_p99']
+        for stats in out.values():
+            duration = stats['duration']
+            stats['rate'] = stats['received'] / duration if duration > 0 else 0.0
+        return out
@@ -0,0 +1,117 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam Controller event mapping helpers"""
+
+
+class ButtonMapper(object):
+    """
+    Table driven button to key mapper.
+
+    Only the bits that changed since the previous report are walked, each
+    through a precomputed bit -> keys lookup table. An unchanged buttons
+    field costs a single xor.
+    """
+
+    def __init__(self, button_map, exclusions=None):
+        """
+        Constructor
+
+        @param dict button_map  {button bit: key code}, several bits can be
+                                mapped to the same key, the key is pressed
+                                while any of them is pressed. A sequence of
+                                (button bit, key code[, mask]) also works and
+                                permits several keys per bit
+        @param dict exclusions  {button bit: mask}, the button is seen as
+                                released while any bit of mask is set
+        """
+        if exclusions is None:
+            exclusions = {}
+        if hasattr(button_map, 'items'):
+            button_map = button_map.items()
+
+        codes = []
+        sources = {}
+        for entry in button_map:
+            btn, code = entry[:2]
+            excl = entry[2] if len(entry) > 2 else exclusions.get(btn, 0)
+            if code not in sources:
+                codes.append(code)
+                sources[code] = []
+            sources[code].append((int(btn), int(excl)))
+
+        self._codes = tuple(codes)
+        self._sources = tuple(tuple(sources[code]) for code in codes)
+        self._state = [0] * len(codes)
+        self._prev = 0
+
+        lut = {}
+        for idx, srcs in enumerate(self._sources):
+            for btn, excl in srcs:
+                mask = btn | excl
+                while mask:
+                    bit = mask & -mask
+                    mask ^= bit
+                    if idx not in lut.setdefault(bit, []):
+                        lut[bit].append(idx)
+        self._lut = dict((bit, tuple(idx)) for bit, idx in lut.items())
+
+    def update(self, buttons):
+        """
+        Compute key events for a new buttons field
+
+        @param int buttons      buttons field of the report
+
+        @return list            (key code, value) for keys that changed
+        """
+        changed = self._prev ^ buttons
+        if not changed:
+            return []
+        self._prev = buttons
+
+        events = []
+        lut = self._lut
+        state = self._state
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            for idx in lut.get(bit, ()):
+                val = 0
+                for btn, excl in self._sources[idx]:
+                    if buttons & btn and not buttons & excl:
+                        val = 1
+                        break
+                if val != state[idx]:
+                    state[idx] = val
+                    events.append((self._codes[idx], val))
+        return events
+
+    def reset(self):
+        """
+        Forget previous state, return release events for pressed keys
+
+        @return list            (key code, 0) for each pressed key
+        """
+        events = [(self._codes[idx], 0) for idx, val in enumerate(self._state) if val]
+        self._state = [0] * len(self._codes)
+        self._prev = 0
+        return events
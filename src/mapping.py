@@ -0,0 +1,827 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Mapping engine driven by Steam controller configuration files (vdf)
+
+compile_config() turns a "controller_mappings" tree into a MappingTable
+once: plain tuples per input kind (buttons, sticks, triggers, dpads, mouse
+like sources) holding report field indexes and event codes. MappingEngine
+runs this table for each report without any per report lookup by name.
+"""
+
+import time
+import threading
+from collections import namedtuple
+from operator import itemgetter
+
+from steamcontroller import SCStatus, SCButtons
+from steamcontroller.decoder import SteamControllerInput
+from steamcontroller.mapper import ButtonMapper
+from steamcontroller.latency import Histogram
+from steamcontroller.gyro import GyroFilter, GyroMouse, GyroStick, SMOOTHING as GYRO_SMOOTHING
+from steamcontroller import uinput
+from steamcontroller import vdf
+
+# Output devices
+GAMEPAD = 0
+KEYBOARD = 1
+MOUSE = 2
+SLOTS = ('gamepad', 'keyboard', 'mouse')
+
+# Trackpad as dpad threshold (same as sc-xbox lpad hat)
+DPAD_THRESHOLD = 20000
+
+# Mouse units per pad unit (absolute_mouse on a trackpad), multiplied by
+# sensitivity / 100. Gyro scales are in steamcontroller.gyro
+PAD_MOUSE_SCALE = 0.02
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Same mapping as the sc-xbox.py default one
+XBOX360_CONFIG = """
+"controller_mappings"
+{
+    "version"   "2"
+    "group"
+    {
+        "id"    "0"
+        "mode"  "four_buttons"
+        "inputs"
+        {
+            "button_a" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button A" } } } }
+            "button_b" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button B" } } } }
+            "button_x" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button X" } } } }
+            "button_y" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button Y" } } } }
+        }
+    }
+    "group"
+    {
+        "id"    "1"
+        "mode"  "switches"
+        "inputs"
+        {
+            "button_escape"     { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button START" } } } }
+            "button_menu"       { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button SELECT" } } } }
+            "left_bumper"       { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button SHOULDER_LEFT" } } } }
+            "right_bumper"      { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button SHOULDER_RIGHT" } } } }
+            "button_back_left"  { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button A" } } } }
+            "button_back_right" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button B" } } } }
+        }
+    }
+    "group"
+    {
+        "id"    "2"
+        "mode"  "joystick_move"
+        "inputs"
+        {
+            "click" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button JOYSTICK_LEFT" } } } }
+        }
+    }
+    "group"
+    {
+        "id"    "3"
+        "mode"  "dpad"
+        "inputs"
+        {
+            "dpad_north" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_UP" } } } }
+            "dpad_south" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_DOWN" } } } }
+            "dpad_east"  { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_RIGHT" } } } }
+            "dpad_west"  { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_LEFT" } } } }
+        }
+    }
+    "group"
+    {
+        "id"    "4"
+        "mode"  "joystick_camera"
+        "inputs"
+        {
+            "click" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button JOYSTICK_RIGHT" } } } }
+        }
+    }
+    "group" { "id" "5" "mode" "trigger" }
+    "group" { "id" "6" "mode" "trigger" }
+    "preset"
+    {
+        "id"    "0"
+        "name"  "Default"
+        "group_source_bindings"
+        {
+            "0" "button_diamond active"
+            "1" "switch active"
+            "2" "joystick active"
+            "3" "left_trackpad active"
+            "4" "right_trackpad active"
+            "5" "left_trigger active"
+            "6" "right_trigger active"
+        }
+    }
+}
+"""
+
+
+_FIELDS = SteamControllerInput._fields
+_STATUS = _FIELDS.index('status')
+_BUTTONS = _FIELDS.index('buttons')
+_INPUT = int(SCStatus.Input)
+
+# source: ((x field, y field), (gate mask, gate value), (click bit, exclusion))
+_SOURCES = {
+    'joystick':       (('lpad_x', 'lpad_y'), (SCButtons.LPadTouch, 0),
+                       (SCButtons.LPad, SCButtons.LPadTouch)),
+    'left_trackpad':  (('lpad_x', 'lpad_y'), (SCButtons.LPadTouch, SCButtons.LPadTouch),
+                       (SCButtons.LPad, 0)),
+    'right_trackpad': (('rpad_x', 'rpad_y'), (SCButtons.RPadTouch, SCButtons.RPadTouch),
+                       (SCButtons.RPad, 0)),
+    'left_trigger':   (('ltrig',), (0, 0), (SCButtons.LT, 0)),
+    'right_trigger':  (('rtrig',), (0, 0), (SCButtons.RT, 0)),
+    'gyro':           (('gyaw', 'gpitch'), (0, 0), None),
+    'button_diamond': ((), (0, 0), None),
+    'switch':         ((), (0, 0), None),
+}
+
+_BUTTON_INPUTS = {
+    'button_a':          SCButtons.A,
+    'button_b':          SCButtons.B,
+    'button_x':          SCButtons.X,
+    'button_y':          SCButtons.Y,
+    'button_escape':     SCButtons.Start,
+    'button_menu':       SCButtons.Back,
+    'left_bumper':       SCButtons.LB,
+    'right_bumper':      SCButtons.RB,
+    'button_back_left':  SCButtons.LGrip,
+    'button_back_right': SCButtons.RGrip,
+}
+
+_DPAD_INPUTS = ('dpad_north', 'dpad_south', 'dpad_east', 'dpad_west')
+
+# Outputs: (slot, event type, code name, value when pressed)
+_XINPUT = {
+    'A':              (GAMEPAD, uinput.EV_KEY, 'BTN_A', 1),
+    'B':              (GAMEPAD, uinput.EV_KEY, 'BTN_B', 1),
+    'X':              (GAMEPAD, uinput.EV_KEY, 'BTN_X', 1),
+    'Y':              (GAMEPAD, uinput.EV_KEY, 'BTN_Y', 1),
+    'SHOULDER_LEFT':  (GAMEPAD, uinput.EV_KEY, 'BTN_TL', 1),
+    'SHOULDER_RIGHT': (GAMEPAD, uinput.EV_KEY, 'BTN_TR', 1),
+    'START':          (GAMEPAD, uinput.EV_KEY, 'BTN_START', 1),
+    'SELECT':         (GAMEPAD, uinput.EV_KEY, 'BTN_SELECT', 1),
+    'BACK':           (GAMEPAD, uinput.EV_KEY, 'BTN_SELECT', 1),
+    'GUIDE':          (GAMEPAD, uinput.EV_KEY, 'BTN_MODE', 1),
+    'JOYSTICK_LEFT':  (GAMEPAD, uinput.EV_KEY, 'BTN_THUMBL', 1),
+    'JOYSTICK_RIGHT': (GAMEPAD, uinput.EV_KEY, 'BTN_THUMBR', 1),
+    'DPAD_UP':        (GAMEPAD, uinput.EV_ABS, 'ABS_HAT0Y', -1),
+    'DPAD_DOWN':      (GAMEPAD, uinput.EV_ABS, 'ABS_HAT0Y', 1),
+    'DPAD_LEFT':      (GAMEPAD, uinput.EV_ABS, 'ABS_HAT0X', -1),
+    'DPAD_RIGHT':     (GAMEPAD, uinput.EV_ABS, 'ABS_HAT0X', 1),
+    'TRIGGER_LEFT':   (GAMEPAD, uinput.EV_ABS, 'ABS_Z', 255),
+    'TRIGGER_RIGHT':  (GAMEPAD, uinput.EV_ABS, 'ABS_RZ', 255),
+}
+
+_MOUSE_BUTTONS = {
+    'LEFT':    (MOUSE, uinput.EV_KEY, 'BTN_LEFT', 1),
+    'RIGHT':   (MOUSE, uinput.EV_KEY, 'BTN_RIGHT', 1),
+    'MIDDLE':  (MOUSE, uinput.EV_KEY, 'BTN_MIDDLE', 1),
+    'BACK':    (MOUSE, uinput.EV_KEY, 'BTN_SIDE', 1),
+    'FORWARD': (MOUSE, uinput.EV_KEY, 'BTN_EXTRA', 1),
+}
+
+_MOUSE_WHEEL = {
+    'SCROLL_UP':   (MOUSE, uinput.EV_REL, 'REL_WHEEL', 1),
+    'SCROLL_DOWN': (MOUSE, uinput.EV_REL, 'REL_WHEEL', -1),
+}
+
+# Steam key names that are not the linux name without KEY_
+_KEY_NAMES = {
+    'ESCAPE':        'KEY_ESC',
+    'RETURN':        'KEY_ENTER',
+    'LEFT_CONTROL':  'KEY_LEFTCTRL',
+    'RIGHT_CONTROL': 'KEY_RIGHTCTRL',
+    'LEFT_SHIFT':    'KEY_LEFTSHIFT',
+    'RIGHT_SHIFT':   'KEY_RIGHTSHIFT',
+    'LEFT_ALT':      'KEY_LEFTALT',
+    'RIGHT_ALT':     'KEY_RIGHTALT',
+    'UP_ARROW':      'KEY_UP',
+    'DOWN_ARROW':    'KEY_DOWN',
+    'LEFT_ARROW':    'KEY_LEFT',
+    'RIGHT_ARROW':   'KEY_RIGHT',
+    'PAGE_UP':       'KEY_PAGEUP',
+    'PAGE_DOWN':     'KEY_PAGEDOWN',
+    'DASH':          'KEY_MINUS',
+    'EQUALS':        'KEY_EQUAL',
+    'PERIOD':        'KEY_DOT',
+    'FORWARD_SLASH': 'KEY_SLASH',
+    'BACK_SLASH':    'KEY_BACKSLASH',
+    'SINGLE_QUOTE':  'KEY_APOSTROPHE',
+    'BACKTICK':      'KEY_GRAVE',
+    'LEFT_BRACKET':  'KEY_LEFTBRACE',
+    'RIGHT_BRACKET': 'KEY_RIGHTBRACE',
+}
+
+
+MappingTable = namedtuple('MappingTable', [
+    'outputs',      # (slot, event type, code, value) referenced by index
+    'buttons',      # (button bit, output index, exclusion mask)
+    'sticks',       # (x idx, y idx, gate mask, gate value, release, slot,
+                    #  x code, y code, deadzone, y sign)
+    'triggers',     # (field idx, slot, code)
+    'dpads',        # (x idx, y idx, gate mask, gate value, threshold,
+                    #  (north, south, east, west) output index or -1)
+    'rels',         # (x idx, y idx, gate mask, gate value, delta, slot,
+                    #  x code, y code, x scale, y scale)
+    'gyros',        # (gate mask, gate value, slot, stick, x code, y code,
+                    #  sensitivity, smoothing)
+    'fields',       # report field indexes read by sticks, triggers, ...
+    'slots',        # output slots used
+    'unsupported',  # (source, mode or binding) ignored at compile time
+])
+
+
+def _parse_binding(binding):
+    """(slot, event type, code name, value) for a binding, None if unsupported"""
+    # "xinput_button A, Jump": the part after the comma is a label
+    parts = binding.split(',')[0].split()
+    if len(parts) < 2:
+        return None
+    kind, arg = parts[0], parts[1].upper()
+    if kind == 'xinput_button':
+        return _XINPUT.get(arg)
+    elif kind == 'key_press':
+        return (KEYBOARD, uinput.EV_KEY, _KEY_NAMES.get(arg, 'KEY_' + arg), 1)
+    elif kind == 'mouse_button':
+        return _MOUSE_BUTTONS.get(arg)
+    elif kind == 'mouse_wheel':
+        return _MOUSE_WHEEL.get(arg)
+    return None
+
+
+def _bindings(inp):
+    """All Full_Press binding strings of an input section"""
+    if not isinstance(inp, vdf.VDFDict):
+        return []
+    activators = inp.get('activators')
+    if isinstance(activators, vdf.VDFDict):
+        out = []
+        for name, act in activators:
+            if name == 'Full_Press' and isinstance(act, vdf.VDFDict):
+                bindings = act.get('bindings')
+                if isinstance(bindings, vdf.VDFDict):
+                    out.extend(bindings.getall('binding'))
+    else:
+        # version 1 configs
+        bindings = inp.get('bindings')
+        if not isinstance(bindings, vdf.VDFDict):
+            bindings = inp
+        out = bindings.getall('binding')
+    for binding in out:
+        if not isinstance(binding, str):
+            raise ValueError('Invalid binding node')
+    return out
+
+
+def _setting(group, name, default):
+    settings = group.get('settings')
+    if isinstance(settings, vdf.VDFDict):
+        val = settings.get(name)
+        if val is not None:
+            try:
+                return int(val)
+            except (ValueError, TypeError):
+                pass
+    return default
+
+
+class _Compiler(object):
+    """Accumulate table entries group after group"""
+
+    def __init__(self):
+        self.outputs = []
+        self.output_idx = {}
+        self.buttons = []
+        self.sticks = []
+        self.triggers = []
+        self.dpads = []
+        self.rels = []
+        self.gyros = []
+        self.fields = set()
+        self.unsupported = []
+
+    def output(self, source, binding):
+        out = _parse_binding(binding)
+        if out is None:
+            self.unsupported.append((source, binding))
+            return -1
+        slot, evtype, name, value = out
+        try:
+            out = (slot, evtype, uinput.code(name), value)
+        except KeyError:
+            self.unsupported.append((source, binding))
+            return -1
+        if out not in self.output_idx:
+            self.output_idx[out] = len(self.outputs)
+            self.outputs.append(out)
+        return self.output_idx[out]
+
+    def button(self, source, bit, excl, inp):
+        for binding in _bindings(inp):
+            idx = self.output(source, binding)
+            if idx >= 0:
+                self.buttons.append((int(bit), idx, int(excl)))
+
+    def field(self, name):
+        idx = _FIELDS.index(name)
+        self.fields.add(idx)
+        return idx
+
+    def group(self, source, group):
+        fields, (gmask, gval), click = _SOURCES[source]
+        gmask, gval = int(gmask), int(gval)
+        mode = group.get('mode', '')
+        if not isinstance(mode, str):
+            raise ValueError('Invalid mode node in group {}'.format(group.get('id')))
+        inputs = group.get('inputs')
+        if inputs is None:
+            inputs = vdf.VDFDict()
+        elif not isinstance(inputs, vdf.VDFDict):
+            raise ValueError('Invalid inputs node in group {}'.format(group.get('id')))
+
+        for name, inp in inputs:
+            if name in _BUTTON_INPUTS:
+                self.button(source, _BUTTON_INPUTS[name], 0, inp)
+            elif name == 'click' and click is not None:
+                self.button(source, click[0], click[1], inp)
+            elif name == 'edge' and click is not None:
+                # soft pull, no dedicated bit: use the full pull one
+                self.button(source, click[0], click[1], inp)
+            elif name not in _DPAD_INPUTS:
+                self.unsupported.append((source, name))
+
+        if mode in ('four_buttons', 'switches'):
+            return
+        elif source == 'gyro':
+            self.gyro(group, mode, gmask, gval)
+        elif mode == 'dpad' and len(fields) == 2:
+            outs = []
+            for name in _DPAD_INPUTS:
+                idx = -1
+                for binding in _bindings(inputs.get(name)):
+                    idx = self.output(source, binding)
+                outs.append(idx)
+            if _setting(group, 'requires_click', 0) and click is not None:
+                gmask |= int(click[0])
+                gval |= int(click[0])
+            self.dpads.append((self.field(fields[0]), self.field(fields[1]), gmask, gval,
+                               _setting(group, 'deadzone_inner_radius', DPAD_THRESHOLD),
+                               tuple(outs)))
+        elif mode in ('joystick_move', 'joystick_camera') and len(fields) == 2:
+            right = (mode == 'joystick_camera' or
+                     _setting(group, 'output_joystick', 0) == 1)
+            codes = uinput.codes('ABS_RX', 'ABS_RY') if right else uinput.codes('ABS_X', 'ABS_Y')
+            self.sticks.append((self.field(fields[0]), self.field(fields[1]), gmask, gval,
+                                source != 'joystick', GAMEPAD, codes[0], codes[1],
+                                _setting(group, 'deadzone_inner_radius', 0),
+                                1 if _setting(group, 'invert_y', 0) else -1))
+        elif mode == 'trigger' and len(fields) == 1:
+            output = _setting(group, 'output_trigger', 1 if source == 'left_trigger' else 2)
+            self.triggers.append((self.field(fields[0]), GAMEPAD,
+                                  uinput.code('ABS_Z' if output == 1 else 'ABS_RZ')))
+        elif mode == 'absolute_mouse' and len(fields) == 2:
+            sens = _setting(group, 'sensitivity', 100) / 100.0
+            cx, cy = uinput.codes('REL_X', 'REL_Y')
+            self.rels.append((self.field(fields[0]), self.field(fields[1]), gmask, gval,
+                              True, MOUSE, cx, cy,
+                              PAD_MOUSE_SCALE * sens, -PAD_MOUSE_SCALE * sens))
+        else:
+            self.unsupported.append((source, mode))
+
+    def gyro(self, group, mode, gmask, gval):
+        sens = _setting(group, 'sensitivity', 100) / 100.0
+        smoothing = min(_setting(group, 'smoothing', int(GYRO_SMOOTHING * 100)), 95) / 100.0
+        if mode == 'absolute_mouse':
+            cx, cy = uinput.codes('REL_X', 'REL_Y')
+            self.gyros.append((gmask, gval, MOUSE, False, cx, cy, sens, smoothing))
+        elif mode in ('joystick_move', 'joystick_camera'):
+            right = (mode == 'joystick_camera' or
+                     _setting(group, 'output_joystick', 0) == 1)
+            cx, cy = uinput.codes('ABS_RX', 'ABS_RY') if right else uinput.codes('ABS_X', 'ABS_Y')
+            self.gyros.append((gmask, gval, GAMEPAD, True, cx, cy, sens, smoothing))
+        else:
+            self.unsupported.append(('gyro', mode))
+
+    def table(self):
+        slots = set(o[0] for o in self.outputs)
+        slots.update(s[5] for s in self.sticks)
+        slots.update(t[1] for t in self.triggers)
+        slots.update(r[5] for r in self.rels)
+        slots.update(g[2] for g in self.gyros)
+        return MappingTable(outputs=tuple(self.outputs),
+                            buttons=tuple(self.buttons),
+                            sticks=tuple(self.sticks),
+                            triggers=tuple(self.triggers),
+                            dpads=tuple(self.dpads),
+                            rels=tuple(self.rels),
+                            gyros=tuple(self.gyros),
+                            fields=tuple(sorted(self.fields)),
+                            slots=tuple(sorted(slots)),
+                            unsupported=tuple(self.unsupported))
+
+
+def compile_config(config, preset=None):
+    """
+    Compile a Steam controller configuration
+
+    @param VDFDict config    parsed vdf, whole document or its
+                            "controller_mappings" section
+    @param str preset       preset name, the first one if None
+
+    @return MappingTable
+    """
+    root = config.get('controller_mappings', config)
+    if not isinstance(root, vdf.VDFDict):
+        raise ValueError('Not a controller configuration')
+
+    groups = {}
+    for pos, group in enumerate(root.getall('group')):
+        if not isinstance(group, vdf.VDFDict):
+            raise ValueError('Invalid group node {}'.format(pos))
+        gid = group.get('id', str(pos))
+        if not isinstance(gid, str):
+            raise ValueError('Invalid id node in group {}'.format(pos))
+        groups[gid] = group
+
+    presets = root.getall('preset')
+    for pos, node in enumerate(presets):
+        if not isinstance(node, vdf.VDFDict):
+            raise ValueError('Invalid preset node {}'.format(pos))
+    if preset is not None:
+        presets = [p for p in presets if p.get('name') == preset]
+    if not presets:
+        raise ValueError('No preset {}'.format(preset or ''))
+
+    comp = _Compiler()
+    bindings = presets[0].get('group_source_bindings', vdf.VDFDict())
+    if not isinstance(bindings, vdf.VDFDict):
+        raise ValueError('Invalid group_source_bindings node')
+    for gid, spec in bindings:
+        if not isinstance(spec, str):
+            raise ValueError('Invalid group_source_bindings entry {}'.format(gid))
+        parts = spec.split()
+        if len(parts) < 2 or parts[1] != 'active' or 'modeshift' in parts:
+            continue
+        if parts[0] not in _SOURCES or gid not in groups:
+            comp.unsupported.append((parts[0], gid))
+            continue
+        comp.group(parts[0], groups[gid])
+    return comp.table()
+
+
+def load_config(path, preset=None):
+    """
+    Parse and compile a Steam controller configuration file
+
+    @param str path         vdf file path
+    @param str preset       preset name, the first one if None
+
+    @return MappingTable
+    """
+    with open(path) as f:
+        return compile_config(vdf.load(f), preset)
+
+
+def create_devices(table, slots=None):
+    """
+    Create the uinput devices used by a table
+
+    @param MappingTable table
+    @param list slots       only create these slots, all table ones if None
+
+    @return dict            {slot: UInput}
+    """
+    classes = {GAMEPAD: uinput.Xbox360, KEYBOARD: uinput.Keyboard, MOUSE: uinput.Mouse}
+    if slots is None:
+        slots = table.slots
+    return dict((slot, classes[slot]()) for slot in slots)
+
+
+class MappingEngine(object):
+    """
+    Execute a MappingTable on each report
+    """
+
+    def __init__(self, table, devices):
+        """
+        Constructor
+
+        @param MappingTable table   compiled mapping
+        @param dict devices         {slot: UInput} for every slot of the table
+        """
+        self._devices = [devices.get(slot) for slot in range(len(SLOTS))]
+        self._checkSlots(table)
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._gyro_sc = None
+        self._swaps = 0
+        self._swap_latency = Histogram()
+        self._swap_time = Histogram()
+        self._install(table)
+
+    def _checkSlots(self, table):
+        for slot in table.slots:
+            if self._devices[slot] is None:
+                raise ValueError('No {} device'.format(SLOTS[slot]))
+
+    def _install(self, table):
+        self._table = table
+        self._outputs = table.outputs
+        self._sticks = table.sticks
+        self._triggers = table.triggers
+        self._dpads = table.dpads
+        self._rels = table.rels
+        self._gyros = tuple(
+            (gmask, gval, 1 << slot,
+             (GyroStick if stick else GyroMouse)(self._devices[slot], (cx, cy), sens,
+                                                 GyroFilter(smoothing=smoothing)))
+            for gmask, gval, slot, stick, cx, cy, sens, smoothing in table.gyros)
+        if len(table.fields) == 0:
+            self._getter = lambda values: ()
+        else:
+            self._getter = itemgetter(*table.fields)
+        # rate sources (gyro) move even when the report does not change
+        self._continuous = bool(self._gyros) or any(not r[4] for r in table.rels)
+        self.reset()
+
+    def reset(self):
+        """Forget previous state"""
+        self._mapper = ButtonMapper(self._table.buttons)
+        self._prev_buttons = None
+        self._prev_fields = None
+        self._stick_prev = [[None, None] for _ in self._sticks]
+        self._trigger_prev = [None] * len(self._triggers)
+        self._dpad_state = [0] * len(self._dpads)
+        self._rel_last = [None] * len(self._rels)
+        self._rel_acc = [[0.0, 0.0] for _ in self._rels]
+        for _, _, _, out in self._gyros:
+            out.reset()
+
+    def table(self):
+        """
+        @return MappingTable    table in use
+        """
+        return self._table
+
+    def setTable(self, table, devices=None):
+        """
+        Replace the table, can be called from another thread. The swap
+        happens before the next report is mapped: outputs held by the
+        previous table are released and the new one starts from the
+        current report, no report is skipped.
+
+        @param MappingTable table   new compiled mapping
+        @param dict devices         {slot: UInput} for slots the engine does
+                                    not have yet, created if None
+        """
+        missing = [slot for slot in table.slots if self._devices[slot] is None]
+        if missing:
+            if devices is None:
+                devices = create_devices(table, missing)
+            for slot in missing:
+                if slot not in devices:
+                    raise ValueError('No {} device'.format(SLOTS[slot]))
+                self._devices[slot] = devices[slot]
+        # picked up by process(), a table stored while a swap takes the
+        # previous one is kept for the next report
+        with self._pending_lock:
+            self._pending = (table, _clock())
+
+    def _release(self):
+        """Release everything the current table holds, return dirty slot mask"""
+        devices = self._devices
+        dirty = 0
+        for idx, _ in self._mapper.reset():
+            dirty |= self._emit(idx, 0)
+        for i, (_, _, _, _, _, slot, cx, cy, _, _) in enumerate(self._sticks):
+            for code, prev in zip((cx, cy), self._stick_prev[i]):
+                if prev:
+                    devices[slot].queueAxis(code, 0)
+                    dirty |= 1 << slot
+        for i, (_, slot, code) in enumerate(self._triggers):
+            if self._trigger_prev[i]:
+                devices[slot].queueAxis(code, 0)
+                dirty |= 1 << slot
+        for i, (_, _, _, _, _, outs) in enumerate(self._dpads):
+            for b in range(4):
+                if self._dpad_state[i] & (1 << b) and outs[b] >= 0:
+                    dirty |= self._emit(outs[b], 0)
+        for _, _, bit, out in self._gyros:
+            if out.release():
+                dirty |= bit
+        return dirty
+
+    def release(self):
+        """
+        Release keys and center axes held on the devices, then forget the
+        state (controller disconnected)
+        """
+        self._flush(self._release())
+        self.reset()
+
+    def _swap(self):
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = None
+        if pending is None:
+            return
+        start = _clock()
+        dirty = self._release()
+        self._flush(dirty)
+        self._install(pending[0])
+        now = _clock()
+        self._swaps += 1
+        self._swap_time.record(int((now - start) * 1e6))
+        self._swap_latency.record(int((now - pending[1]) * 1e6))
+
+    def stats(self):
+        """
+        @return dict            swaps done, swap duration (release and install)
+                                and latency (setTable() to swap) in us
+        """
+        return {
+            'swaps': self._swaps,
+            'swap_time_mean': self._swap_time.mean(),
+            'swap_time_max': self._swap_time.max or 0,
+            'swap_latency_mean': self._swap_latency.mean(),
+            'swap_latency_max': self._swap_latency.max or 0,
+        }
+
+    def _flush(self, dirty):
+        devices = self._devices
+        slot = 0
+        while dirty:
+            if dirty & 1:
+                devices[slot].flush()
+            dirty >>= 1
+            slot += 1
+
+    def _emit(self, idx, val):
+        """Queue output idx, return dirty slot mask"""
+        slot, evtype, code, value = self._outputs[idx]
+        dev = self._devices[slot]
+        if evtype == uinput.EV_KEY:
+            dev.queueKey(code, val)
+        elif evtype == uinput.EV_ABS:
+            dev.queueAxis(code, value if val else 0)
+        elif val:
+            dev.queueRel(code, value)
+        else:
+            return 0
+        return 1 << slot
+
+    def process(self, values):
+        """
+        Map one decoded report
+
+        @param tuple values     report values (SteamControllerInput order)
+        """
+        if self._pending is not None:
+            self._swap()
+        if values[_STATUS] != _INPUT:
+            return
+        buttons = values[_BUTTONS]
+        fields = self._getter(values)
+        if (buttons == self._prev_buttons and fields == self._prev_fields and
+                not self._continuous):
+            return
+        self._prev_buttons = buttons
+        self._prev_fields = fields
+
+        devices = self._devices
+        dirty = 0
+
+        for idx, val in self._mapper.update(buttons):
+            dirty |= self._emit(idx, val)
+
+        for i, (ix, iy, gmask, gval, release, slot, cx, cy, dz, sy) in enumerate(self._sticks):
+            if buttons & gmask != gval:
+                if not release:
+                    continue
+                x = y = 0
+            else:
+                x = values[ix]
+                y = sy * values[iy]
+                if dz and x * x + y * y <= dz * dz:
+                    x = y = 0
+            prev = self._stick_prev[i]
+            if x != prev[0]:
+                prev[0] = x
+                devices[slot].queueAxis(cx, x)
+                dirty |= 1 << slot
+            if y != prev[1]:
+                prev[1] = y
+                devices[slot].queueAxis(cy, y)
+                dirty |= 1 << slot
+
+        for i, (ix, slot, code) in enumerate(self._triggers):
+            v = values[ix]
+            if v != self._trigger_prev[i]:
+                self._trigger_prev[i] = v
+                devices[slot].queueAxis(code, v)
+                dirty |= 1 << slot
+
+        for i, (ix, iy, gmask, gval, thr, outs) in enumerate(self._dpads):
+            mask = 0
+            if buttons & gmask == gval:
+                x = values[ix]
+                y = values[iy]
+                if y > thr:
+                    mask = 1
+                elif y < -thr:
+                    mask = 2
+                if x > thr:
+                    mask |= 4
+                elif x < -thr:
+                    mask |= 8
+            changed = mask ^ self._dpad_state[i]
+            if changed:
+                self._dpad_state[i] = mask
+                # releases first: north / south (and east / west) share a
+                # hat axis, a release after a press would center it
+                for b in range(4):
+                    if changed & ~mask & (1 << b) and outs[b] >= 0:
+                        dirty |= self._emit(outs[b], 0)
+                for b in range(4):
+                    if changed & mask & (1 << b) and outs[b] >= 0:
+                        dirty |= self._emit(outs[b], 1)
+
+        for i, (ix, iy, gmask, gval, delta, slot, cx, cy, sx, sy) in enumerate(self._rels):
+            if buttons & gmask != gval:
+                self._rel_last[i] = None
+                continue
+            x = values[ix]
+            y = values[iy]
+            if delta:
+                last = self._rel_last[i]
+                self._rel_last[i] = (x, y)
+                if last is None:
+                    continue
+                x -= last[0]
+                y -= last[1]
+            acc = self._rel_acc[i]
+            acc[0] += x * sx
+            acc[1] += y * sy
+            dx = int(acc[0])
+            dy = int(acc[1])
+            if dx or dy:
+                acc[0] -= dx
+                acc[1] -= dy
+                dev = devices[slot]
+                dev.queueRel(cx, dx)
+                dev.queueRel(cy, dy)
+                dirty |= 1 << slot
+
+        for gmask, gval, bit, out in self._gyros:
+            if buttons & gmask != gval:
+                if out.release():
+                    dirty |= bit
+            elif out.update(values):
+                dirty |= bit
+
+        self._flush(dirty)
+
+    def devices(self):
+        """
+        @return list of UInput      output devices in slot order
+        """
+        return [dev for dev in self._devices if dev is not None]
+
+    def callback(self, sc, sci):
+        """
+        SteamController callback
+
+        @param SteamController sc
+        @param SteamControllerState sci     or SteamControllerInput
+        """
+        if self._gyros and sc is not None and sc is not self._gyro_sc:
+            # the gyro is off until asked, again after each reconnection
+            self._gyro_sc = sc
+            sc.setGyro(True)
+        self.process(sci if isinstance(sci, tuple) else sci.values())
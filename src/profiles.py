@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Compiled mapping profiles cache and configuration file watcher
+
+ProfileCache keeps MappingTable objects keyed by the sha1 of the vdf file
+content and preset, in memory and as json files in the cache directory, so
+a configuration is parsed and compiled once. ProfileWatcher polls a
+configuration file and hands recompiled tables to a callback, typically
+MappingEngine.setTable().
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import hashlib
+import tempfile
+import threading
+
+from steamcontroller import vdf
+from steamcontroller.cheader import cache_dir
+from steamcontroller.mapping import MappingTable, compile_config
+
+# Bump when MappingTable layout or compile_config output changes
+CACHE_VERSION = 2
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _tuples(obj):
+    """json lists back to the tuples of a MappingTable"""
+    if isinstance(obj, list):
+        return tuple(_tuples(x) for x in obj)
+    return obj
+
+
+class ProfileCache(object):
+    """
+    MappingTable cache keyed by configuration content hash
+    """
+
+    def __init__(self, directory=None, persistent=True):
+        """
+        Constructor
+
+        @param str directory    json cache directory, cheader.cache_dir()
+                                if None
+        @param bool persistent  store compiled tables on disk
+        """
+        self._dir = directory if directory is not None else cache_dir()
+        self._persistent = persistent
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.compile_time = 0.0
+
+    @staticmethod
+    def key(data, preset=None):
+        """
+        @param bytes data       configuration file content
+        @param str preset       preset name
+
+        @return str             cache key
+        """
+        digest = hashlib.sha1(data)
+        digest.update(b'\0' + (preset or '').encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._dir, 'profile-{}.json'.format(key))
+
+    def _read(self, key):
+        try:
+            with open(self._path(key)) as f:
+                data = json.load(f)
+            if data['version'] == CACHE_VERSION:
+                return MappingTable(*_tuples(data['table']))
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _write(self, key, table):
+        try:
+            if not os.path.isdir(self._dir):
+                os.makedirs(self._dir)
+            fd, tmp = tempfile.mkstemp(dir=self._dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'table': list(table)}, f)
+            os.rename(tmp, self._path(key))
+        except (IOError, OSError):
+            pass
+
+    def lookup(self, data, preset=None):
+        """
+        Compiled table of a configuration content
+
+        @param bytes data       configuration file content
+        @param str preset       preset name, the first one if None
+
+        @return (str, MappingTable)     cache key and table
+        """
+        key = self.key(data, preset)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self.hits += 1
+                return key, table
+        table = self._read(key) if self._persistent else None
+        if table is not None:
+            self.disk_hits += 1
+        else:
+            t0 = _clock()
+            table = compile_config(vdf.loads(data.decode('utf-8', 'replace')), preset)
+            self.compile_time = _clock() - t0
+            self.misses += 1
+            if self._persistent:
+                self._write(key, table)
+        with self._lock:
+            self._tables[key] = table
+        return key, table
+
+    def get(self, path, preset=None):
+        """
+        Compiled table of a configuration file
+
+        @param str path         vdf file path
+        @param str preset       preset name, the first one if None
+
+        @return MappingTable
+        """
+        with open(path, 'rb') as f:
+            return self.lookup(f.read(), preset)[1]
+
+    def clear(self):
+        """Forget in memory tables (the disk cache is kept)"""
+        with self._lock:
+            self._tables.clear()
+
+    def stats(self):
+        """
+        @return dict            memory hits, disk hits, misses (compiled),
+                                hit rate and last compile time in ms
+        """
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits + self.disk_hits) / total if total else 0.0,
+            'compile_ms': self.compile_time * 1e3,
+        }
+
+
+class ProfileWatcher(object):
+    """
+    Poll a configuration file and recompile it when it changes. The file
+    is stat()ed every interval, it is only read and hashed when its mtime,
+    size or inode changed, and the callback is only called when the
+    content hash changed.
+    """
+
+    def __init__(self, path, preset=None, cache=None, interval=1.0):
+        """
+        Constructor, the file is compiled (or loaded from cache) at once
+
+        @param str path         vdf file path
+        @param str preset       preset name, the first one if None
+        @param ProfileCache cache   shared cache, a new one if None
+        @param float interval   polling period in seconds
+        """
+        self._path = path
+        self._preset = preset
+        self._cache = cache if cache is not None else ProfileCache()
+        self._interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self.checks = 0
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self.reload_time = 0.0
+        self._stat = self._statFile()
+        with open(path, 'rb') as f:
+            self._key, self._table = self._cache.lookup(f.read(), preset)
+
+    def _statFile(self):
+        st = os.stat(self._path)
+        return (st.st_mtime, st.st_size, st.st_ino)
+
+    def table(self):
+        """
+        @return MappingTable    last successfully compiled table, no file
+                                access (reconnections use this)
+        """
+        return self._table
+
+    def check(self):
+        """
+        Check the file once
+
+        @return MappingTable    new table if the content changed, else None.
+                                A file that fails to compile is counted in
+                                errors and the previous table is kept.
+        """
+        self.checks += 1
+        try:
+            st = self._statFile()
+            if st == self._stat:
+                return None
+            t0 = _clock()
+            with open(self._path, 'rb') as f:
+                data = f.read()
+            # stat taken before reading: a write racing the read is seen
+            # again on the next check
+            self._stat = st
+            key, table = self._cache.lookup(data, self._preset)
+        except Exception as err:
+            # whatever a bad file raises, the polling thread must go on
+            self.errors += 1
+            self.last_error = err
+            return None
+        if key == self._key:
+            return None
+        self._key = key
+        self._table = table
+        self.reloads += 1
+        self.reload_time = _clock() - t0
+        return table
+
+    def _run(self, callback):
+        while not self._stop.wait(self._interval):
+            table = self.check()
+            if table is not None:
+                callback(table)
+
+    def start(self, callback):
+        """
+        Poll in a daemon thread
+
+        @param callable callback    called with each new MappingTable from
+                                    the polling thread
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the polling thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def stats(self):
+        """
+        @return dict            checks, reloads, errors, last reload time
+                                (read, hash and compile) in ms and cache
+                                statistics (cache_*)
+        """
+        stats = {
+            'checks': self.checks,
+            'reloads': self.reloads,
+            'errors': self.errors,
+            'reload_ms': self.reload_time * 1e3,
+        }
+        for key, val in self._cache.stats().items():
+            stats['cache_' + key] = val
+        return stats
+
+
+def summary(*stats):
+    """
+    @param dict stats       stats() dicts (ProfileWatcher, MappingEngine)
+
+    @return str             one "name value" line per metric
+    """
+    lines = []
+    for st in stats:
+        for key in sorted(st):
+            val = st[key]
+            if isinstance(val, float):
+                lines.append('{:20s} {:.3f}'.format(key, val))
+            else:
+                lines.append('{:20s} {}'.format(key, val))
+    return '\n'.join(lines) + '\n'
+
+
+def install_signal_handler(stats, signum=signal.SIGUSR2, path=None):
+    """
+    Write summary of the stats() callables when signal is received
+
+    @param list stats       callables returning a stats dict
+    @param int signum       signal number
+    @param str path         output file (appended), None for stderr
+    """
+    def _dump(*args):
+        text = summary(*[func() for func in stats])
+        if path is None:
+            sys.stderr.write(text)
+            sys.stderr.flush()
+        else:
+            with open(path, 'a') as f:
+                f.write(text)
+    signal.signal(signum, _dump)
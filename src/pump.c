@@ -0,0 +1,206 @@
+/*
+ * The MIT License (MIT)
+ *
+ * Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ */
+
+/*
+ * Event pump: decode, diff and uinput write of a raw 64 bytes report in a
+ * single call. The mapping table is compiled by steamcontroller.pump, which
+ * also holds the pure python reference implementation (PyEventPump). Both
+ * must generate exactly the same events in the same order.
+ */
+
+#include <linux/input.h>
+#include <stdint.h>
+#include <string.h>
+#include <unistd.h>
+
+/* Keep in sync with steamcontroller/pump.py */
+#define SC_PUMP_MAX_KEYS  32
+#define SC_PUMP_MAX_SRCS  64
+#define SC_PUMP_MAX_LUT   256
+#define SC_PUMP_MAX_AXES  16
+#define SC_PUMP_MAX_EVENTS (SC_PUMP_MAX_KEYS + SC_PUMP_MAX_AXES)
+
+#define SC_AXIS_U8  1
+#define SC_AXIS_S16 2
+
+#define SC_STATUS_INPUT 0x3c01
+
+#define SC_PUMP_PASS        -1
+#define SC_PUMP_WRITE_ERROR -2
+
+struct sc_pump {
+    /* keys: sources of key k are src_start[k] .. src_start[k+1] - 1 */
+    int32_t  nkeys;
+    uint16_t key_code[SC_PUMP_MAX_KEYS];
+    uint16_t src_start[SC_PUMP_MAX_KEYS + 1];
+    uint32_t src_btn[SC_PUMP_MAX_SRCS];
+    uint32_t src_excl[SC_PUMP_MAX_SRCS];
+
+    /* button bit b -> keys lut_key[lut_start[b]] .. lut_key[lut_start[b+1] - 1] */
+    uint16_t lut_start[33];
+    uint8_t  lut_key[SC_PUMP_MAX_LUT];
+
+    /* axes: report field at axis_offset -> abs axis_code */
+    int32_t  naxes;
+    uint16_t axis_code[SC_PUMP_MAX_AXES];
+    uint8_t  axis_offset[SC_PUMP_MAX_AXES];
+    uint8_t  axis_type[SC_PUMP_MAX_AXES];
+    uint8_t  axis_invert[SC_PUMP_MAX_AXES];
+    int32_t  axis_deadzone[SC_PUMP_MAX_AXES];
+
+    /* state */
+    uint32_t prev_buttons;
+    uint8_t  key_state[SC_PUMP_MAX_KEYS];
+    int32_t  axis_prev[SC_PUMP_MAX_AXES];
+    int32_t  axis_valid;
+
+    /* counters */
+    uint64_t reports;
+    uint64_t events;
+    uint64_t writes;
+};
+
+static inline uint32_t rd_u32(const uint8_t * p)
+{
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) |
+        ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+static inline uint16_t rd_u16(const uint8_t * p)
+{
+    return (uint16_t)p[0] | ((uint16_t)p[1] << 8);
+}
+
+static inline int32_t rd_s16(const uint8_t * p)
+{
+    return (int16_t)((uint16_t)p[0] | ((uint16_t)p[1] << 8));
+}
+
+/*
+ * Process one report, return the number of events written (without the
+ * SYN_REPORT), SC_PUMP_PASS if the report is not an input report or
+ * SC_PUMP_WRITE_ERROR.
+ */
+int sc_pump_process(struct sc_pump * p, const uint8_t * buf, int fd)
+{
+    struct input_event ev[SC_PUMP_MAX_EVENTS + 1];
+    uint32_t buttons, changed, bit;
+    int32_t v;
+    int n = 0;
+    int b, i, j, k;
+
+    if (rd_u16(buf + 2) != SC_STATUS_INPUT)
+        return SC_PUMP_PASS;
+
+    p->reports++;
+
+    /* buttons: only walk changed bits */
+    buttons = rd_u32(buf + 7);
+    changed = p->prev_buttons ^ buttons;
+    p->prev_buttons = buttons;
+    while (changed) {
+        bit = changed & -changed;
+        changed ^= bit;
+        b = __builtin_ctz(bit);
+        for (i = p->lut_start[b]; i < p->lut_start[b + 1]; i++) {
+            uint8_t val = 0;
+            k = p->lut_key[i];
+            for (j = p->src_start[k]; j < p->src_start[k + 1]; j++) {
+                if ((buttons & p->src_btn[j]) && !(buttons & p->src_excl[j])) {
+                    val = 1;
+                    break;
+                }
+            }
+            if (val != p->key_state[k]) {
+                p->key_state[k] = val;
+                memset(&ev[n], 0, sizeof(ev[n]));
+                ev[n].type = EV_KEY;
+                ev[n].code = p->key_code[k];
+                ev[n].value = val;
+                n++;
+            }
+        }
+    }
+
+    /* axes: emit on change */
+    for (i = 0; i < p->naxes; i++) {
+        if (p->axis_type[i] == SC_AXIS_U8)
+            v = buf[p->axis_offset[i]];
+        else
+            v = rd_s16(buf + p->axis_offset[i]);
+        if (v >= -p->axis_deadzone[i] && v <= p->axis_deadzone[i])
+            v = 0;
+        if (p->axis_invert[i])
+            v = -v;
+        if (p->axis_valid && v == p->axis_prev[i])
+            continue;
+        p->axis_prev[i] = v;
+        memset(&ev[n], 0, sizeof(ev[n]));
+        ev[n].type = EV_ABS;
+        ev[n].code = p->axis_code[i];
+        ev[n].value = v;
+        n++;
+    }
+    p->axis_valid = 1;
+
+    if (n == 0)
+        return 0;
+
+    memset(&ev[n], 0, sizeof(ev[n]));
+    ev[n].type = EV_SYN;
+    ev[n].code = SYN_REPORT;
+
+    /* whole frame with a single syscall */
+    if (write(fd, ev, sizeof(struct input_event) * (n + 1)) < 0)
+        return SC_PUMP_WRITE_ERROR;
+
+    p->events += n;
+    p->writes++;
+    return n;
+}
+
+/* Process count consecutive reports, return the total number of events
+ * written or SC_PUMP_WRITE_ERROR */
+int sc_pump_process_batch(struct sc_pump * p, const uint8_t * buf, int count, int fd)
+{
+    int total = 0;
+    int i, ret;
+
+    for (i = 0; i < count; i++) {
+        ret = sc_pump_process(p, buf + i * 64, fd);
+        if (ret == SC_PUMP_WRITE_ERROR)
+            return ret;
+        if (ret > 0)
+            total += ret;
+    }
+    return total;
+}
+
+/* Forget previous state, axes are emitted again on the next report */
+void sc_pump_reset(struct sc_pump * p)
+{
+    p->prev_buttons = 0;
+    memset(p->key_state, 0, sizeof(p->key_state));
+    p->axis_valid = 0;
+}
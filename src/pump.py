@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Event pump: raw report to uinput events in a single call
+
+A PumpTable maps button bits to key codes and report fields to abs codes.
+It is executed either by the optional native library (libscpump, built
+from pump.c) or by PyEventPump, the pure python reference implementation.
+Both generate the same events in the same order. Anything not expressible
+in the table (feedback, mouse, ...) stays in the python callback.
+"""
+
+import os
+import ctypes
+
+from steamcontroller.decoder import unpack, FIELD_OFFSETS, SteamControllerInput, REPORT_SIZE
+from steamcontroller.mapper import ButtonMapper
+
+# Keep in sync with pump.c
+PUMP_MAX_KEYS = 32
+PUMP_MAX_SRCS = 64
+PUMP_MAX_LUT = 256
+PUMP_MAX_AXES = 16
+
+AXIS_U8 = 1
+AXIS_S16 = 2
+
+# process() return values besides the number of events written
+PUMP_PASS = -1
+PUMP_WRITE_ERROR = -2
+
+_AXIS_TYPES = {'B': AXIS_U8, 'h': AXIS_S16}
+
+_STATUS = SteamControllerInput._fields.index('status')
+_BUTTONS = SteamControllerInput._fields.index('buttons')
+
+# SCStatus.Input
+_STATUS_INPUT = 0x3c01
+
+
+class PumpTable(object):
+    """
+    Compiled mapping table, immutable once built
+    """
+
+    def __init__(self, button_map, exclusions=None, axes=None):
+        """
+        Constructor
+
+        @param dict button_map  {button bit: key code} as for ButtonMapper
+        @param dict exclusions  {button bit: mask} as for ButtonMapper
+        @param list axes        (field, abs code, invert, deadzone) for each
+                                mapped report field (ltrig, rtrig, lpad_x, ...)
+        """
+        self.button_map = dict((int(k), int(v)) for k, v in button_map.items())
+        self.exclusions = dict((int(k), int(v)) for k, v in (exclusions or {}).items())
+
+        self.axes = []
+        for field, code, invert, deadzone in axes or []:
+            if field not in FIELD_OFFSETS or FIELD_OFFSETS[field][1] not in _AXIS_TYPES:
+                raise ValueError('Unsupported axis field {}'.format(field))
+            self.axes.append((field, int(code), bool(invert), int(deadzone)))
+        self.axes = tuple(self.axes)
+
+        mapper = self.buttonMapper()
+        self._keys = mapper._codes
+        self._sources = mapper._sources
+        self._lut = mapper._lut
+
+        if (len(self._keys) > PUMP_MAX_KEYS or
+                sum(len(s) for s in self._sources) > PUMP_MAX_SRCS or
+                sum(len(k) for k in self._lut.values()) > PUMP_MAX_LUT or
+                len(self.axes) > PUMP_MAX_AXES):
+            raise ValueError('Mapping table too large')
+
+    def buttonMapper(self):
+        """
+        @return ButtonMapper    new mapper for the buttons part of the table
+        """
+        return ButtonMapper(self.button_map, self.exclusions)
+
+    def fill(self, cpump):
+        """
+        Fill a _CPump structure (native pump configuration)
+
+        @param _CPump cpump     structure to fill
+        """
+        cpump.nkeys = len(self._keys)
+        pos = 0
+        for idx, code in enumerate(self._keys):
+            cpump.key_code[idx] = code
+            cpump.src_start[idx] = pos
+            for btn, excl in self._sources[idx]:
+                cpump.src_btn[pos] = btn
+                cpump.src_excl[pos] = excl
+                pos += 1
+        cpump.src_start[len(self._keys)] = pos
+
+        pos = 0
+        for b in range(32):
+            cpump.lut_start[b] = pos
+            for idx in self._lut.get(1 << b, ()):
+                cpump.lut_key[pos] = idx
+                pos += 1
+        cpump.lut_start[32] = pos
+
+        cpump.naxes = len(self.axes)
+        for i, (field, code, invert, deadzone) in enumerate(self.axes):
+            offset, fmt = FIELD_OFFSETS[field]
+            cpump.axis_code[i] = code
+            cpump.axis_offset[i] = offset
+            cpump.axis_type[i] = _AXIS_TYPES[fmt]
+            cpump.axis_invert[i] = invert
+            cpump.axis_deadzone[i] = deadzone
+
+
+class PyEventPump(object):
+    """
+    Pure python event pump, reference implementation of pump.c
+    """
+
+    def __init__(self, table, uinput):
+        """
+        Constructor
+
+        @param PumpTable table  compiled mapping table
+        @param UInput uinput    output device
+        """
+        self._table = table
+        self._uinput = uinput
+        self._mapper = table.buttonMapper()
+        fields = SteamControllerInput._fields
+        self._axes = tuple((fields.index(field), code, invert, deadzone)
+                           for field, code, invert, deadzone in table.axes)
+        self.reset()
+        self._reports = 0
+        self._events = 0
+        self._writes = 0
+
+    def process(self, buf):
+        """
+        Map one raw report and write resulting events with a single write
+
+        @param buffer buf       raw 64 bytes report
+
+        @return int             events written (without SYN_REPORT),
+                                PUMP_PASS for non input reports or
+                                PUMP_WRITE_ERROR
+        """
+        values = unpack(buf)
+        if values[_STATUS] != _STATUS_INPUT:
+            return PUMP_PASS
+        self._reports += 1
+
+        uinput = self._uinput
+        n = 0
+        for code, val in self._mapper.update(values[_BUTTONS]):
+            uinput.queueKey(code, val)
+            n += 1
+
+        prev = self._axis_prev
+        for i, (idx, code, invert, deadzone) in enumerate(self._axes):
+            v = values[idx]
+            if -deadzone <= v <= deadzone:
+                v = 0
+            if invert:
+                v = -v
+            if v != prev[i]:
+                prev[i] = v
+                uinput.queueAxis(code, v)
+                n += 1
+
+        if n == 0:
+            return 0
+        if uinput.flush() < 0:
+            return PUMP_WRITE_ERROR
+        self._events += n
+        self._writes += 1
+        return n
+
+    def reset(self):
+        """Forget previous state, axes are emitted again on the next report"""
+        self._mapper.reset()
+        self._axis_prev = [None] * len(self._axes)
+
+    def stats(self):
+        """
+        @return dict            reports, events and writes counters
+        """
+        return {'reports': self._reports,
+                'events': self._events,
+                'writes': self._writes}
+
+
+class _CPump(ctypes.Structure):
+    """struct sc_pump from pump.c"""
+    _fields_ = [('nkeys', ctypes.c_int32),
+                ('key_code', ctypes.c_uint16 * PUMP_MAX_KEYS),
+                ('src_start', ctypes.c_uint16 * (PUMP_MAX_KEYS + 1)),
+                ('src_btn', ctypes.c_uint32 * PUMP_MAX_SRCS),
+                ('src_excl', ctypes.c_uint32 * PUMP_MAX_SRCS),
+                ('lut_start', ctypes.c_uint16 * 33),
+                ('lut_key', ctypes.c_uint8 * PUMP_MAX_LUT),
+                ('naxes', ctypes.c_int32),
+                ('axis_code', ctypes.c_uint16 * PUMP_MAX_AXES),
+                ('axis_offset', ctypes.c_uint8 * PUMP_MAX_AXES),
+                ('axis_type', ctypes.c_uint8 * PUMP_MAX_AXES),
+                ('axis_invert', ctypes.c_uint8 * PUMP_MAX_AXES),
+                ('axis_deadzone', ctypes.c_int32 * PUMP_MAX_AXES),
+                ('prev_buttons', ctypes.c_uint32),
+                ('key_state', ctypes.c_uint8 * PUMP_MAX_KEYS),
+                ('axis_prev', ctypes.c_int32 * PUMP_MAX_AXES),
+                ('axis_valid', ctypes.c_int32),
+                ('reports', ctypes.c_uint64),
+                ('events', ctypes.c_uint64),
+                ('writes', ctypes.c_uint64)]
+
+
+_LIB = None
+
+def loadPumpLib():
+    """
+    Load libscpump shared library (only once)
+
+    @return ctypes.CDLL     None when the native pump is not built
+    """
+    global _LIB
+    if _LIB is None:
+        from sysconfig import get_config_var
+        lib = os.path.abspath(
+            os.path.normpath(
+                os.path.join(
+                    os.path.dirname(__file__),
+                    '..',
+                    'libscpump' + (get_config_var('EXT_SUFFIX') or get_config_var('SO')))))
+        try:
+            _LIB = ctypes.CDLL(lib)
+        except OSError:
+            _LIB = False
+            return None
+        _LIB.sc_pump_process.argtypes = [ctypes.POINTER(_CPump), ctypes.c_void_p, ctypes.c_int]
+        _LIB.sc_pump_process_batch.argtypes = [ctypes.POINTER(_CPump), ctypes.c_void_p,
+                                               ctypes.c_int, ctypes.c_int]
+        _LIB.sc_pump_reset.argtypes = [ctypes.POINTER(_CPump)]
+        _LIB.sc_pump_reset.restype = None
+    return _LIB or None
+
+def available():
+    """
+    @return bool            True if the native pump is built
+    """
+    return loadPumpLib() is not None
+
+
+def _address(buf):
+    """Pointer to a report buffer without copy when possible"""
+    if isinstance(buf, bytes):
+        return buf
+    try:
+        return ctypes.addressof(ctypes.c_char.from_buffer(buf))
+    except TypeError:
+        # read only buffer
+        return bytes(buf)
+
+
+class NativeEventPump(object):
+    """
+    Event pump running in libscpump, same interface as PyEventPump
+    """
+
+    def __init__(self, table, uinput):
+        """
+        Constructor
+
+        @param PumpTable table  compiled mapping table
+        @param UInput uinput    output device, its file descriptor is used
+                                directly
+        """
+        lib = loadPumpLib()
+        if lib is None:
+            raise ImportError('libscpump is not available')
+        self._table = table
+        self._uinput = uinput
+        self._cpump = _CPump()
+        self._ref = ctypes.byref(self._cpump)
+        table.fill(self._cpump)
+        self._process = lib.sc_pump_process
+        self._process_batch = lib.sc_pump_process_batch
+        self._reset = lib.sc_pump_reset
+
+    def process(self, buf):
+        """
+        Map one raw report and write resulting events with a single write
+
+        @param buffer buf       raw 64 bytes report (bytes or writable buffer)
+
+        @return int             events written (without SYN_REPORT),
+                                PUMP_PASS for non input reports or
+                                PUMP_WRITE_ERROR
+        """
+        if len(buf) < REPORT_SIZE:
+            raise ValueError('Buffer too small for a report')
+        return self._process(self._ref, _address(buf), self._uinput._fd)
+
+    def processBatch(self, buf, count):
+        """
+        Map count consecutive raw reports
+
+        @param buffer buf       count * 64 bytes
+        @param int count        number of reports
+
+        @return int             total events written or PUMP_WRITE_ERROR
+        """
+        # the C side reads count reports from the buffer address blindly
+        if count < 0 or count * REPORT_SIZE > len(buf):
+            raise ValueError('Buffer too small for {} reports'.format(count))
+        return self._process_batch(self._ref, _address(buf), count, self._uinput._fd)
+
+    def reset(self):
+        """Forget previous state, axes are emitted again on the next report"""
+        self._reset(self._ref)
+
+    def stats(self):
+        """
+        @return dict            reports, events and writes counters
+        """
+        return {'reports': self._cpump.reports,
+                'events': self._cpump.events,
+                'writes': self._cpump.writes}
+
+
+def create_pump(table, uinput, native=None):
+    """
+    Create the fastest available event pump
+
+    @param PumpTable table  compiled mapping table
+    @param UInput uinput    output device
+    @param bool native      True to require the native pump, False to force
+                            the python one, None for native when available
+
+    @return PyEventPump or NativeEventPump
+    """
+    if native is None:
+        native = available()
+    if native:
+        return NativeEventPump(table, uinput)
+    return PyEventPump(table, uinput)
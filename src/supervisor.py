@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Controller connection supervision
+
+Supervisor keeps a SteamController connected: only the controller (usb
+handle, transfers) is recreated after a disconnection, the mapping callback
+and its uinput devices are created once by the caller and stay, so games
+never see the virtual devices vanish.
+"""
+
+import time
+
+from steamcontroller.latency import Histogram
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Reconnection attempts delay, doubled after each failure
+BACKOFF_MIN = 0.05
+BACKOFF_MAX = 2.0
+
+
+class Supervisor(object):
+    """
+    Connect, run until disconnection, wait and connect again
+    """
+
+    def __init__(self, connect, release=None, monitor=None,
+                 backoff_min=BACKOFF_MIN, backoff_max=BACKOFF_MAX, sleep=time.sleep):
+        """
+        Constructor
+
+        @param callable connect     returns a new SteamController, raises
+                                    when no controller can be opened
+        @param callable release     called after a disconnection to release
+                                    keys and center axes held on the uinput
+                                    devices
+        @param HotplugMonitor monitor   wakes up the wait as soon as a
+                                    controller is plugged, pure backoff
+                                    polling if None
+        @param float backoff_min    first retry delay in seconds
+        @param float backoff_max    maximum retry delay in seconds
+        @param callable sleep       wait function used without monitor
+        """
+        self._connect = connect
+        self._release = release
+        self._monitor = monitor
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self._sleep = sleep
+        self._backoff = backoff_min
+        self._running = False
+        self.controller = None
+        self.connects = 0
+        self.disconnects = 0
+        self.failures = 0
+        self.last_error = None
+        self.connect_time = Histogram()
+        self.reconnect_time = Histogram()
+
+    def _wait(self):
+        delay = self._backoff
+        self._backoff = min(self._backoff * 2, self._backoff_max)
+        if self._monitor is not None:
+            if self._monitor.wait(delay):
+                # just plugged, retry at once next time too
+                self._backoff = self._backoff_min
+        else:
+            self._sleep(delay)
+
+    def step(self, lost=None):
+        """
+        One connection attempt and session
+
+        @param float lost       clock value when the previous controller
+                                was lost, None on first connection
+
+        @return float           clock value when this session ended
+        """
+        t0 = _clock()
+        try:
+            sc = self._connect()
+        except Exception as err:
+            self.failures += 1
+            self.last_error = err
+            self._wait()
+            return lost
+        now = _clock()
+        self.connects += 1
+        self.connect_time.record(int((now - t0) * 1e6))
+        if lost is not None:
+            self.reconnect_time.record(int((now - lost) * 1e6))
+
+        self.controller = sc
+        try:
+            sc.run()
+        except Exception as err:
+            self.last_error = err
+        finally:
+            self.controller = None
+            received = sc.stats()['received']
+            sc.close()
+        lost = _clock()
+        self.disconnects += 1
+        if self._release is not None:
+            self._release()
+        if received:
+            self._backoff = self._backoff_min
+        else:
+            # opened but nothing received, do not spin on a broken device
+            self._wait()
+        return lost
+
+    def run(self):
+        """Supervise until stop() is called (or KeyboardInterrupt)"""
+        self._running = True
+        lost = None
+        while self._running:
+            lost = self.step(lost)
+
+    def stop(self):
+        """Stop run() after the current session"""
+        self._running = False
+
+    def stats(self):
+        """
+        @return dict            connections, disconnections, failed attempts,
+                                connection time (open and setup) and
+                                reconnection time (lost to connected) in ms
+        """
+        return {
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'failures': self.failures,
+            'connect_ms_mean': self.connect_time.mean() / 1e3,
+            'connect_ms_max': (self.connect_time.max or 0) / 1e3,
+            'reconnect_ms_mean': self.reconnect_time.mean() / 1e3,
+            'reconnect_ms_max': (self.reconnect_time.max or 0) / 1e3,
+        }
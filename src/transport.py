@@ -0,0 +1,722 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""Steam Controller report transports
+
+A transport delivers raw 64 bytes reports and sends control messages:
+
+ - LibUSBTransport talks to the real device with libusb
+ - ReplayTransport replays a capture file (see steamcontroller.capture) in
+   real time, accelerated or as fast as possible, without any hardware
+
+A bus opens several controllers driven by one event loop: LibUSBBus finds
+every wired controller and wireless receiver slot in one libusb context,
+ReplayBus replays several captures.
+"""
+
+import select
+import time
+
+try:
+    import usb1
+except ImportError:
+    usb1 = None
+
+from steamcontroller.decoder import REPORT_SIZE
+from steamcontroller.capture import CaptureReader
+
+VENDOR_ID  = 0x28de
+PRODUCT_ID = 0x1142
+ENDPOINT   = 2
+
+PRODUCT_ID_WIRED = 0x1102
+PRODUCT_ID_WIRELESS = 0x1142
+PRODUCT_IDS = (PRODUCT_ID_WIRED, PRODUCT_ID_WIRELESS)
+
+# (interrupt endpoint, control interface) of each controller of a device,
+# a wireless receiver serves up to 4 controllers
+CONTROLLER_SLOTS = {
+    PRODUCT_ID_WIRED: ((3, 2),),
+    PRODUCT_ID_WIRELESS: ((2, 1), (3, 2), (4, 3), (5, 4)),
+}
+
+TRANSFER_QUEUE_DEPTH = 4
+
+# Maximum number of reports delivered per processEvents() at max speed
+REPLAY_BATCH = 64
+
+
+class Transport(object):
+    """
+    Transport interface.
+
+    Reports are delivered from poll(), handleEvents() or processEvents():
+    receive(buf) is called with the raw report buffer, which is only valid
+    during the call, then dispatch() is called once the buffer has been
+    given back to the transport.
+    """
+
+    def start(self, receive, dispatch):
+        """
+        Start reports reception
+
+        @param callable receive     receive(buf) decodes a report
+        @param callable dispatch    dispatch() runs the report callbacks
+        """
+        raise NotImplementedError
+
+    def active(self):
+        """@return bool          True while reports can still be received"""
+        raise NotImplementedError
+
+    def register(self, fd):
+        """
+        Add a file descriptor to watch in poll()
+
+        @param int fd           readable file descriptor
+        """
+        raise NotImplementedError
+
+    def unregister(self, fd):
+        """
+        Stop watching a file descriptor added with register()
+
+        @param int fd           file descriptor
+        """
+        pass
+
+    def poll(self, timeout=None):
+        """
+        Wait until reports or registered file descriptors are ready and
+        process reports
+
+        @param float timeout    maximum wait in seconds, None for no limit
+
+        @return list            ready registered file descriptors
+        """
+        raise NotImplementedError
+
+    def handleEvents(self):
+        """Wait and process pending events"""
+        self.poll()
+
+    def pollFDs(self):
+        """@return list          (fd, poll events) to watch from an external loop"""
+        return []
+
+    def setPollFDNotifiers(self, added, removed):
+        """
+        Track poll file descriptors changes
+
+        @param callable added       added(fd, events, user_data)
+        @param callable removed     removed(fd, user_data)
+        """
+        pass
+
+    def nextTimeout(self):
+        """@return float         seconds before processEvents() is needed, None if not needed"""
+        return None
+
+    def processEvents(self):
+        """Process ready events without waiting"""
+        raise NotImplementedError
+
+    def sendControl(self, data, timeout=0):
+        """
+        Send a 64 bytes control message and wait for its completion
+
+        @param bytes data       message
+        @param int timeout      timeout in ms, 0 for no timeout
+        """
+        raise NotImplementedError
+
+    def submitControl(self, data, callback, timeout=0):
+        """
+        Send a 64 bytes control message asynchronously
+
+        @param bytes data       message
+        @param callable callback    callback(ok) called on completion
+        @param int timeout      timeout in ms, 0 for no timeout
+
+        @return bool            False if the message could not be submitted
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the transport"""
+        pass
+
+
+class LibUSBTransport(Transport):
+    """
+    Steam controller connected with libusb
+    """
+
+    def __init__(self, vendor=VENDOR_ID, product=PRODUCT_ID, queue_depth=TRANSFER_QUEUE_DEPTH,
+                 bus=None, handle=None, endpoint=ENDPOINT, interface=1, name=None):
+        """
+        Constructor
+
+        @param int vendor       usb vendor id
+        @param int product      usb product id
+        @param int queue_depth  number of interrupt transfers kept submitted
+                                at the same time
+        @param LibUSBBus bus    shared context and event loop, handle must
+                                then be an already claimed device handle
+        @param USBDeviceHandle handle   device handle opened by bus
+        @param int endpoint     interrupt endpoint of the controller
+        @param int interface    control messages interface
+        @param str name         controller identifier
+        """
+        if usb1 is None:
+            raise ImportError('libusb1 python module is required')
+
+        self._handle = None
+        self._poller = None
+        self._receive = None
+        self._dispatch = None
+        self._queue_depth = max(1, queue_depth)
+        self._transfer_list = []
+        self._bus = bus
+        self._endpoint = endpoint
+        self._interface = interface
+        self.name = name
+
+        if bus is not None:
+            self._ctx = bus.context
+            self._handle = handle
+            return
+
+        self._ctx = usb1.USBContext()
+        self._handle = self._ctx.openByVendorIDAndProductID(
+            vendor, product,
+            skip_on_error=True,
+        )
+
+        if self._handle is None:
+            raise ValueError('SteamControler Device not found')
+
+        _claim(self._handle)
+
+    def start(self, receive, dispatch):
+        self._receive = receive
+        self._dispatch = dispatch
+        for _ in range(self._queue_depth):
+            transfer = self._handle.getTransfer()
+            transfer.setInterrupt(
+                usb1.ENDPOINT_IN | self._endpoint,
+                REPORT_SIZE,
+                callback=self._processReceivedData,
+            )
+            transfer.submit()
+            self._transfer_list.append(transfer)
+
+    def _processReceivedData(self, transfer):
+        """Private USB async Rx function"""
+
+        if transfer.getStatus() != usb1.TRANSFER_COMPLETED:
+            return
+
+        if transfer.getActualLength() != REPORT_SIZE:
+            transfer.submit()
+            return
+
+        self._receive(transfer.getBuffer())
+
+        # The report is decoded, give the buffer back to libusb before
+        # running the callback
+        transfer.submit()
+
+        self._dispatch()
+
+    def active(self):
+        return any(x.isSubmitted() for x in self._transfer_list)
+
+    def register(self, fd):
+        if self._bus is not None:
+            self._bus.register(fd)
+            return
+        self._initPoller()
+        self._poller.register(fd, select.EPOLLIN)
+
+    def unregister(self, fd):
+        if self._bus is not None:
+            self._bus.unregister(fd)
+        elif self._poller is not None:
+            self._poller.unregister(fd)
+
+    def _initPoller(self):
+        """Register libusb file descriptors in an epoll"""
+        if self._poller is None:
+            self._poller = usb1.USBPoller(self._ctx, select.epoll())
+
+    def poll(self, timeout=None):
+        if self._bus is not None:
+            return self._bus.poll(timeout)
+        self._initPoller()
+        try:
+            return [fd for fd, _ in self._poller.poll(timeout)]
+        except usb1.USBErrorInterrupted:
+            return []
+
+    def handleEvents(self):
+        self._ctx.handleEvents()
+
+    def pollFDs(self):
+        return self._ctx.getPollFDList()
+
+    def setPollFDNotifiers(self, added, removed):
+        self._ctx.setPollFDNotifiers(added, removed)
+
+    def nextTimeout(self):
+        return self._ctx.getNextTimeout()
+
+    def processEvents(self):
+        try:
+            self._ctx.handleEventsTimeout(tv=0)
+        except usb1.USBErrorInterrupted:
+            pass
+
+    def sendControl(self, data, timeout=0):
+        self._handle.controlWrite(request_type=0x21,
+                                  request=0x09,
+                                  value=0x0300,
+                                  index=self._interface,
+                                  data=data,
+                                  timeout=timeout)
+
+    def submitControl(self, data, callback, timeout=0):
+        def _done(transfer):
+            callback(transfer.getStatus() == usb1.TRANSFER_COMPLETED)
+
+        transfer = self._handle.getTransfer()
+        transfer.setControl(request_type=0x21,
+                            request=0x09,
+                            value=0x0300,
+                            index=self._interface,
+                            buffer_or_len=data,
+                            callback=_done,
+                            timeout=timeout)
+        try:
+            transfer.submit()
+        except usb1.USBError:
+            return False
+        return True
+
+    def close(self):
+        if self._bus is not None:
+            # the handle is shared with the other controllers of the device
+            for transfer in self._transfer_list:
+                if transfer.isSubmitted():
+                    try:
+                        transfer.cancel()
+                    except usb1.USBError:
+                        pass
+            if self._handle:
+                self._bus.release(self._handle)
+            self._handle = None
+            return
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+
+
+def _claim(handle):
+    """Detach kernel drivers and claim the HID interfaces of a device"""
+    cfg = handle.getDevice()[0]
+    for inter in cfg:
+        for setting in inter:
+            number = setting.getNumber()
+            if handle.kernelDriverActive(number):
+                handle.detachKernelDriver(number)
+            if (setting.getClass() == 3 and
+                setting.getSubClass() == 0 and
+                setting.getProtocol() == 0):
+                handle.claimInterface(number)
+
+
+class Bus(object):
+    """
+    Source of several controllers driven by a single event loop. Transports
+    created by a bus forward register() and poll() to it, so one poll()
+    call waits for all of them.
+    """
+
+    def find(self):
+        """
+        Open controllers not opened yet
+
+        @return list            new transports
+        """
+        raise NotImplementedError
+
+    def register(self, fd):
+        """
+        Add a file descriptor to watch in poll()
+
+        @param int fd           readable file descriptor
+        """
+        raise NotImplementedError
+
+    def unregister(self, fd):
+        """
+        Stop watching a file descriptor
+
+        @param int fd           file descriptor
+        """
+        raise NotImplementedError
+
+    def poll(self, timeout=None):
+        """
+        Wait until reports of any transport or registered file descriptors
+        are ready and process reports
+
+        @param float timeout    maximum wait in seconds, None for no limit
+
+        @return list            ready registered file descriptors
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the bus"""
+        pass
+
+
+class LibUSBBus(Bus):
+    """
+    All steam controllers (wired and wireless receivers) in one libusb
+    context
+    """
+
+    def __init__(self, vendor=VENDOR_ID, products=PRODUCT_IDS, queue_depth=TRANSFER_QUEUE_DEPTH):
+        """
+        Constructor
+
+        @param int vendor       usb vendor id
+        @param tuple products   usb product ids, see CONTROLLER_SLOTS
+        @param int queue_depth  interrupt transfers per controller
+        """
+        if usb1 is None:
+            raise ImportError('libusb1 python module is required')
+        self._vendor = vendor
+        self._products = products
+        self._queue_depth = queue_depth
+        self.context = usb1.USBContext()
+        self._poller = usb1.USBPoller(self.context, select.epoll())
+        # (bus number, address): [handle, transports using it]
+        self._devices = {}
+
+    def find(self):
+        transports = []
+        for device in self.context.getDeviceIterator(skip_on_error=True):
+            product = device.getProductID()
+            if device.getVendorID() != self._vendor or product not in self._products:
+                continue
+            key = (device.getBusNumber(), device.getDeviceAddress())
+            if key in self._devices:
+                continue
+            try:
+                handle = device.open()
+                _claim(handle)
+            except usb1.USBError:
+                continue
+            slots = CONTROLLER_SLOTS[product]
+            self._devices[key] = [handle, len(slots)]
+            for idx, (endpoint, interface) in enumerate(slots):
+                transports.append(LibUSBTransport(
+                    queue_depth=self._queue_depth, bus=self, handle=handle,
+                    endpoint=endpoint, interface=interface,
+                    name='{}-{}/{}'.format(key[0], key[1], idx)))
+        return transports
+
+    def release(self, handle):
+        """
+        A transport is closed, close the handle with its last user
+
+        @param USBDeviceHandle handle
+        """
+        for key, entry in list(self._devices.items()):
+            if entry[0] is handle:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._devices[key]
+                    handle.close()
+                return
+
+    def register(self, fd):
+        self._poller.register(fd, select.EPOLLIN)
+
+    def unregister(self, fd):
+        self._poller.unregister(fd)
+
+    def poll(self, timeout=None):
+        try:
+            return [fd for fd, _ in self._poller.poll(timeout)]
+        except usb1.USBErrorInterrupted:
+            return []
+
+    def close(self):
+        for handle, _ in self._devices.values():
+            handle.close()
+        self._devices = {}
+
+
+class HotplugMonitor(object):
+    """
+    Wait for a steam controller to be plugged with libusb hotplug events
+    """
+
+    def __init__(self, vendor=VENDOR_ID, product=PRODUCT_ID):
+        """
+        Constructor, use create() that checks hotplug support
+
+        @param int vendor       usb vendor id
+        @param int product      usb product id
+        """
+        self._arrived = False
+        self._ctx = usb1.USBContext()
+        self._ctx.hotplugRegisterCallback(
+            self._onHotplug,
+            events=usb1.HOTPLUG_EVENT_DEVICE_ARRIVED,
+            vendor_id=vendor,
+            product_id=product,
+        )
+
+    @classmethod
+    def create(cls, vendor=VENDOR_ID, product=PRODUCT_ID):
+        """
+        @return HotplugMonitor  None if libusb has no hotplug support
+        """
+        if usb1 is None or not usb1.hasCapability(usb1.CAP_HAS_HOTPLUG):
+            return None
+        return cls(vendor, product)
+
+    def _onHotplug(self, context, device, event):
+        self._arrived = True
+        # keep the callback registered
+        return False
+
+    def wait(self, timeout):
+        """
+        Sleep until a controller is plugged or timeout expires
+
+        @param float timeout    maximum wait in seconds
+
+        @return bool            True if a controller was plugged
+        """
+        deadline = time.time() + timeout
+        while not self._arrived:
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            try:
+                self._ctx.handleEventsTimeout(tv=left)
+            except usb1.USBErrorInterrupted:
+                pass
+        arrived = self._arrived
+        self._arrived = False
+        return arrived
+
+
+class ReplayTransport(Transport):
+    """
+    Replay a capture file.
+
+    Reports are delivered with their captured timing divided by speed,
+    speed=None replays as fast as possible. Control messages are not sent
+    anywhere, they are kept in the controls list. vendor and product are
+    the usb ids of the captured device.
+    """
+
+    def __init__(self, source, speed=1.0, loop=False, clock=time.time, bus=None, name=None):
+        """
+        Constructor
+
+        @param str|file source  capture file path or binary file object
+        @param float speed      replay speed factor, None for max speed
+        @param bool loop        restart from the beginning at end of file
+        @param callable clock   time source used for real time replay
+        @param ReplayBus bus    bus driving this transport
+        @param str name         controller identifier
+        """
+        if isinstance(source, str):
+            source = open(source, 'rb')
+        self._reader = CaptureReader(source)
+        self._speed = speed
+        self._loop = loop
+        self._clock = clock
+        self._buf = bytearray(REPORT_SIZE)
+        self._fds = []
+        self._receive = None
+        self._dispatch = None
+        self._next = None
+        self._t0 = None
+        self._ts0 = None
+        self._bus = bus
+        self.name = name
+        self.vendor = self._reader.vendor
+        self.product = self._reader.product
+        self.controls = []
+
+    def start(self, receive, dispatch):
+        self._receive = receive
+        self._dispatch = dispatch
+        self._readNext()
+
+    def _readNext(self):
+        ts = self._reader.readinto(self._buf)
+        if ts is None and self._loop:
+            self._reader.rewind()
+            self._t0 = None
+            ts = self._reader.readinto(self._buf)
+        if ts is not None and self._t0 is None:
+            self._t0 = self._clock()
+            self._ts0 = ts
+        self._next = ts
+
+    def active(self):
+        return self._next is not None
+
+    def register(self, fd):
+        if self._bus is not None:
+            self._bus.register(fd)
+        else:
+            self._fds.append(fd)
+
+    def unregister(self, fd):
+        if self._bus is not None:
+            self._bus.unregister(fd)
+        elif fd in self._fds:
+            self._fds.remove(fd)
+
+    def nextTimeout(self):
+        if self._next is None:
+            return None
+        if not self._speed:
+            return 0
+        due = self._t0 + (self._next - self._ts0) / self._speed
+        return max(0.0, due - self._clock())
+
+    def processEvents(self):
+        count = 0
+        while self._next is not None and count < REPLAY_BATCH:
+            if self.nextTimeout() > 0:
+                break
+            self._receive(self._buf)
+            self._dispatch()
+            self._readNext()
+            count += 1
+
+    def poll(self, timeout=None):
+        if self._bus is not None:
+            return self._bus.poll(timeout)
+        return _replayPoll([self], self._fds, timeout)
+
+    def handleEvents(self):
+        # No device events to wait for, reports are only delivered from
+        # poll() and processEvents() so none is lost during setup
+        pass
+
+    def sendControl(self, data, timeout=0):
+        self.controls.append(bytes(data))
+
+    def submitControl(self, data, callback, timeout=0):
+        self.controls.append(bytes(data))
+        callback(True)
+        return True
+
+    def close(self):
+        self._next = None
+        self._reader.close()
+
+
+def _replayPoll(transports, fds, timeout):
+    """Wait for the first due report or ready fd, then process reports"""
+    wait = timeout
+    for transport in transports:
+        delay = transport.nextTimeout()
+        if delay is not None and (wait is None or delay < wait):
+            wait = delay
+    ready = []
+    if fds:
+        ready = select.select(fds, [], [], wait)[0]
+    elif wait:
+        time.sleep(wait)
+    for transport in transports:
+        transport.processEvents()
+    return ready
+
+
+class ReplayBus(Bus):
+    """
+    Several replayed controllers in one event loop, without hardware
+    """
+
+    def __init__(self, sources=(), speed=1.0, loop=False, clock=time.time):
+        """
+        Constructor
+
+        @param list sources     capture file paths or binary file objects,
+                                one controller each
+        @param float speed      replay speed factor, None for max speed
+        @param bool loop        restart each capture at end of file
+        @param callable clock   time source used for real time replay
+        """
+        self._speed = speed
+        self._loop = loop
+        self._clock = clock
+        self._pending = []
+        self._transports = []
+        self._fds = []
+        self._count = 0
+        for source in sources:
+            self.add(source)
+
+    def add(self, source):
+        """
+        Plug a controller, returned by the next find()
+
+        @param str|file source  capture file path or binary file object
+        """
+        self._pending.append(source)
+
+    def find(self):
+        transports = []
+        for source in self._pending:
+            transports.append(ReplayTransport(source, self._speed, self._loop, self._clock,
+                                              bus=self, name='replay{}'.format(self._count)))
+            self._count += 1
+        self._pending = []
+        self._transports.extend(transports)
+        return transports
+
+    def register(self, fd):
+        self._fds.append(fd)
+
+    def unregister(self, fd):
+        if fd in self._fds:
+            self._fds.remove(fd)
+
+    def poll(self, timeout=None):
+        self._transports = [t for t in self._transports if t.active()]
+        return _replayPoll(self._transports, self._fds, timeout)
@@ -30,6 +30,16 @@
 #include <string.h>
 #include <unistd.h>
 
+#define UINPUT_FRAME_MAX 64
+
+/* Compact event description used to batch events, the kernel struct
+ * input_event also contains a timestamp that is filled by the kernel */
+struct uinput_ev {
+    __u16 type;
+    __u16 code;
+    __s32 value;
+};
+
 int uinput_init(
     int     key_len,
     __u16 * key,
@@ -206,6 +216,38 @@ void uinput_syn(int fd)
     write(fd, &ev, sizeof(ev));
 }
 
+int uinput_write(int fd, const struct uinput_ev * evs, int len, int syn)
+{
+    struct input_event ev[UINPUT_FRAME_MAX + 1];
+    int i;
+    int n;
+
+    if (len < 0 || len > UINPUT_FRAME_MAX)
+        return -1;
+
+    n = len + (syn ? 1 : 0);
+    if (n == 0)
+        return 0;
+
+    memset(ev, 0, sizeof(struct input_event) * n);
+    for (i = 0; i < len; i++) {
+        ev[i].type = evs[i].type;
+        ev[i].code = evs[i].code;
+        ev[i].value = evs[i].value;
+    }
+    if (syn) {
+        ev[len].type = EV_SYN;
+        ev[len].code = SYN_REPORT;
+        ev[len].value = 0;
+    }
+
+    /* whole frame with a single syscall */
+    if (write(fd, ev, sizeof(struct input_event) * n) < 0)
+        return -2;
+
+    return n;
+}
+
 void uinput_destroy(int fd)
 {
     ioctl(fd, UI_DEV_DESTROY);
@@ -23,149 +23,272 @@
 # THE SOFTWARE.
 
 import os
+import sys
 import ctypes
 import time
 from math import pi, copysign, sqrt
 from math import pow as mpow
-from enum import IntEnum
-from steamcontroller.cheader import defines
-
-from distutils.sysconfig import get_config_var
-
-# Get All defines from linux headers
-if os.path.exists('/usr/include/linux/input-event-codes.h'):
-    _def = defines('/usr/include', 'linux/input-event-codes.h')
-else:
-    _def = defines('/usr/include', 'linux/input.h')
-
-# Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
-Keys = IntEnum('Keys', {i: _def[i] for i in _def.keys() if (i.startswith('KEY_') or
-                                                            i.startswith('BTN_'))})
-# Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
-KeysOnly = IntEnum('KeysOnly', {i: _def[i] for i in _def.keys() if i.startswith('KEY_')})
-
-# Axes enum contains all axes from linux/uinput.h (ABS_*)
-Axes = IntEnum('Axes', {i: _def[i] for i in _def.keys() if i.startswith('ABS_')})
-
-# Rels enum contains all rels from linux/uinput.h (REL_*)
-Rels = IntEnum('Rels', {i: _def[i] for i in _def.keys() if i.startswith('REL_')})
-
-
-# Scan codes for each keys (taken from a logitech keyboard)
-Scans = {
-    Keys.KEY_ESC: 0x70029,
-    Keys.KEY_F1: 0x7003a,
-    Keys.KEY_F2: 0x7003b,
-    Keys.KEY_F3: 0x7003c,
-    Keys.KEY_F4: 0x7003d,
-    Keys.KEY_F5: 0x7003e,
-    Keys.KEY_F6: 0x7003f,
-    Keys.KEY_F7: 0x70040,
-    Keys.KEY_F8: 0x70041,
-    Keys.KEY_F9: 0x70042,
-    Keys.KEY_F10: 0x70043,
-    Keys.KEY_F11: 0x70044,
-    Keys.KEY_F12: 0x70045,
-    Keys.KEY_SYSRQ: 0x70046,
-    Keys.KEY_SCROLLLOCK: 0x70047,
-    Keys.KEY_PAUSE: 0x70048,
-    Keys.KEY_GRAVE: 0x70035,
-    Keys.KEY_1: 0x7001e,
-    Keys.KEY_2: 0x7001f,
-    Keys.KEY_3: 0x70020,
-    Keys.KEY_4: 0x70021,
-    Keys.KEY_5: 0x70022,
-    Keys.KEY_6: 0x70023,
-    Keys.KEY_7: 0x70024,
-    Keys.KEY_8: 0x70025,
-    Keys.KEY_9: 0x70026,
-    Keys.KEY_0: 0x70027,
-    Keys.KEY_MINUS: 0x7002d,
-    Keys.KEY_EQUAL: 0x7002e,
-    Keys.KEY_BACKSPACE: 0x7002a,
-    Keys.KEY_TAB: 0x7002b,
-    Keys.KEY_Q: 0x70014,
-    Keys.KEY_W: 0x7001a,
-    Keys.KEY_E: 0x70008,
-    Keys.KEY_R: 0x70015,
-    Keys.KEY_T: 0x70017,
-    Keys.KEY_Y: 0x7001c,
-    Keys.KEY_U: 0x70018,
-    Keys.KEY_I: 0x7000c,
-    Keys.KEY_O: 0x70012,
-    Keys.KEY_P: 0x70013,
-    Keys.KEY_LEFTBRACE: 0x7002f,
-    Keys.KEY_RIGHTBRACE: 0x70030,
-    Keys.KEY_ENTER: 0x70028,
-    Keys.KEY_CAPSLOCK: 0x70039,
-    Keys.KEY_A: 0x70004,
-    Keys.KEY_S: 0x70016,
-    Keys.KEY_D: 0x70007,
-    Keys.KEY_F: 0x70009,
-    Keys.KEY_G: 0x7000a,
-    Keys.KEY_H: 0x7000b,
-    Keys.KEY_J: 0x7000d,
-    Keys.KEY_K: 0x7000e,
-    Keys.KEY_L: 0x7000f,
-    Keys.KEY_SEMICOLON: 0x70033,
-    Keys.KEY_APOSTROPHE: 0x70034,
-    Keys.KEY_BACKSLASH: 0x70032,
-    Keys.KEY_LEFTSHIFT: 0x700e1,
-    Keys.KEY_102ND: 0x70064,
-    Keys.KEY_Z: 0x7001d,
-    Keys.KEY_X: 0x7001b,
-    Keys.KEY_C: 0x70006,
-    Keys.KEY_V: 0x70019,
-    Keys.KEY_B: 0x70005,
-    Keys.KEY_N: 0x70011,
-    Keys.KEY_M: 0x70010,
-    Keys.KEY_COMMA: 0x70036,
-    Keys.KEY_DOT: 0x70037,
-    Keys.KEY_SLASH: 0x70038,
-    Keys.KEY_RIGHTSHIFT: 0x700e5,
-    Keys.KEY_LEFTCTRL: 0x700e0,
-    Keys.KEY_LEFTMETA: 0x700e3,
-    Keys.KEY_LEFTALT: 0x700e2,
-    Keys.KEY_SPACE: 0x7002c,
-    Keys.KEY_RIGHTALT: 0x700e6,
-    Keys.KEY_RIGHTMETA: 0x700e7,
-    Keys.KEY_COMPOSE: 0x70065,
-    Keys.KEY_RIGHTCTRL: 0x700e4,
-    Keys.KEY_INSERT: 0x70049,
-    Keys.KEY_HOME: 0x7004a,
-    Keys.KEY_PAGEUP: 0x7004b,
-    Keys.KEY_DELETE: 0x7004c,
-    Keys.KEY_END: 0x7004d,
-    Keys.KEY_PAGEDOWN: 0x7004e,
-    Keys.KEY_UP: 0x70052,
-    Keys.KEY_LEFT: 0x70050,
-    Keys.KEY_DOWN: 0x70051,
-    Keys.KEY_RIGHT: 0x7004f,
-    Keys.KEY_NUMLOCK: 0x70053,
-    Keys.KEY_KPSLASH: 0x70054,
-    Keys.KEY_KPASTERISK: 0x70055,
-    Keys.KEY_KPMINUS: 0x70056,
-    Keys.KEY_KP7: 0x7005f,
-    Keys.KEY_KP8: 0x70060,
-    Keys.KEY_KP9: 0x70061,
-    Keys.KEY_KPPLUS: 0x70057,
-    Keys.KEY_KP4: 0x7005c,
-    Keys.KEY_KP5: 0x7005d,
-    Keys.KEY_KP6: 0x7005e,
-    Keys.KEY_KP1: 0x70059,
-    Keys.KEY_KP2: 0x7005a,
-    Keys.KEY_KP3: 0x7005b,
-    Keys.KEY_KPENTER: 0x70058,
-    Keys.KEY_KP0: 0x70062,
-    Keys.KEY_KPDOT: 0x70063,
-    Keys.KEY_CONFIG: 0xc0183,
-    Keys.KEY_PLAYPAUSE: 0xc00cd,
-    Keys.KEY_MUTE: 0xc00e2,
-    Keys.KEY_VOLUMEDOWN: 0xc00ea,
-    Keys.KEY_VOLUMEUP: 0xc00e9,
-    Keys.KEY_HOMEPAGE: 0xc0223,
+
+# Event types, stable across kernel versions (linux/input-event-codes.h).
+# Kept as plain ints so the hot path never loads the header table.
+EV_KEY = 0x01
+EV_REL = 0x02
+EV_ABS = 0x03
+EV_MSC = 0x04
+MSC_SCAN = 0x04
+
+# Enums built on first access (module __getattr__): name -> define prefixes
+#  Keys contains all keys and buttons (KEY_* BTN_*)
+#  KeysOnly contains all keys (KEY_*)
+#  Axes contains all axes (ABS_*)
+#  Rels contains all rels (REL_*)
+_ENUMS = {
+    'Keys': ('KEY_', 'BTN_'),
+    'KeysOnly': ('KEY_',),
+    'Axes': ('ABS_',),
+    'Rels': ('REL_',),
 }
 
+_def = None
+
+def defines():
+    """
+    Get all defines from linux headers (cached), or from the table generated
+    at packaging time when headers are not installed. Loaded on first use.
+
+    @return dict            define name to int value
+    """
+    global _def
+    if _def is None:
+        from steamcontroller.cheader import cached_defines
+        if os.path.exists('/usr/include/linux/input-event-codes.h'):
+            _def = cached_defines('/usr/include', 'linux/input-event-codes.h')
+        elif os.path.exists('/usr/include/linux/input.h'):
+            _def = cached_defines('/usr/include', 'linux/input.h')
+        else:
+            from steamcontroller.input_codes import DEFINES as _def
+    return _def
+
+def code(name):
+    """
+    Get the plain int value of an event code
+
+    @param str name         define name (KEY_A, BTN_A, ABS_X, ...)
+
+    @return int
+    """
+    return defines()[name]
+
+def codes(*names):
+    """
+    Get the plain int values of several event codes
+
+    @param str names        define names
+
+    @return list of int
+    """
+    _d = defines()
+    return [_d[n] for n in names]
+
+def enum(name):
+    """
+    Build (only once) one of the Keys, KeysOnly, Axes or Rels IntEnum
+
+    @param str name         enum name
+
+    @return IntEnum
+    """
+    e = globals().get(name)
+    if e is None:
+        from enum import IntEnum
+        prefixes = _ENUMS[name]
+        _d = defines()
+        e = IntEnum(name, [(i, v) for i, v in _d.items() if i.startswith(prefixes)])
+        globals()[name] = e
+    return e
+
+def scans():
+    """
+    Scan codes for each keys, keyed by int key code (built only once)
+
+    @return dict
+    """
+    global _scans
+    if _scans is None:
+        _d = defines()
+        _scans = {_d[k]: v for k, v in _SCANS.items()}
+    return _scans
+
+def __getattr__(name):
+    # Lazy module attributes (python >= 3.7): enums, Scans and plain int
+    # constants (uinput.BTN_A)
+    if name in _ENUMS:
+        return enum(name)
+    if name == 'Scans':
+        return scans()
+    if name[:1].isupper():
+        try:
+            return defines()[name]
+        except KeyError:
+            pass
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+# Maximum number of events in a frame (UINPUT_FRAME_MAX in uinput.c)
+FRAME_SIZE = 64
+
+
+class _Event(ctypes.Structure):
+    """struct uinput_ev from uinput.c"""
+    _fields_ = [('type', ctypes.c_uint16),
+                ('code', ctypes.c_uint16),
+                ('value', ctypes.c_int32)]
+
+
+_LIB = None
+
+def loadLib():
+    """
+    Load libuinput shared library (only once)
+
+    @return ctypes.CDLL
+    """
+    global _LIB
+    if _LIB is None:
+        from sysconfig import get_config_var
+        lib = os.path.abspath(
+            os.path.normpath(
+                os.path.join(
+                    os.path.dirname(__file__),
+                    '..',
+                    'libuinput' + (get_config_var('EXT_SUFFIX') or get_config_var('SO')))))
+        _LIB = ctypes.CDLL(lib)
+    return _LIB
+
+
+# Scan codes for each keys by name (taken from a logitech keyboard)
+_SCANS = {
+    'KEY_ESC': 0x70029,
+    'KEY_F1': 0x7003a,
+    'KEY_F2': 0x7003b,
+    'KEY_F3': 0x7003c,
+    'KEY_F4': 0x7003d,
+    'KEY_F5': 0x7003e,
+    'KEY_F6': 0x7003f,
+    'KEY_F7': 0x70040,
+    'KEY_F8': 0x70041,
+    'KEY_F9': 0x70042,
+    'KEY_F10': 0x70043,
+    'KEY_F11': 0x70044,
+    'KEY_F12': 0x70045,
+    'KEY_SYSRQ': 0x70046,
+    'KEY_SCROLLLOCK': 0x70047,
+    'KEY_PAUSE': 0x70048,
+    'KEY_GRAVE': 0x70035,
+    'KEY_1': 0x7001e,
+    'KEY_2': 0x7001f,
+    'KEY_3': 0x70020,
+    'KEY_4': 0x70021,
+    'KEY_5': 0x70022,
+    'KEY_6': 0x70023,
+    'KEY_7': 0x70024,
+    'KEY_8': 0x70025,
+    'KEY_9': 0x70026,
+    'KEY_0': 0x70027,
+    'KEY_MINUS': 0x7002d,
+    'KEY_EQUAL': 0x7002e,
+    'KEY_BACKSPACE': 0x7002a,
+    'KEY_TAB': 0x7002b,
+    'KEY_Q': 0x70014,
+    'KEY_W': 0x7001a,
+    'KEY_E': 0x70008,
+    'KEY_R': 0x70015,
+    'KEY_T': 0x70017,
+    'KEY_Y': 0x7001c,
+    'KEY_U': 0x70018,
+    'KEY_I': 0x7000c,
+    'KEY_O': 0x70012,
+    'KEY_P': 0x70013,
+    'KEY_LEFTBRACE': 0x7002f,
+    'KEY_RIGHTBRACE': 0x70030,
+    'KEY_ENTER': 0x70028,
+    'KEY_CAPSLOCK': 0x70039,
+    'KEY_A': 0x70004,
+    'KEY_S': 0x70016,
+    'KEY_D': 0x70007,
+    'KEY_F': 0x70009,
+    'KEY_G': 0x7000a,
+    'KEY_H': 0x7000b,
+    'KEY_J': 0x7000d,
+    'KEY_K': 0x7000e,
+    'KEY_L': 0x7000f,
+    'KEY_SEMICOLON': 0x70033,
+    'KEY_APOSTROPHE': 0x70034,
+    'KEY_BACKSLASH': 0x70032,
+    'KEY_LEFTSHIFT': 0x700e1,
+    'KEY_102ND': 0x70064,
+    'KEY_Z': 0x7001d,
+    'KEY_X': 0x7001b,
+    'KEY_C': 0x70006,
+    'KEY_V': 0x70019,
+    'KEY_B': 0x70005,
+    'KEY_N': 0x70011,
+    'KEY_M': 0x70010,
+    'KEY_COMMA': 0x70036,
+    'KEY_DOT': 0x70037,
+    'KEY_SLASH': 0x70038,
+    'KEY_RIGHTSHIFT': 0x700e5,
+    'KEY_LEFTCTRL': 0x700e0,
+    'KEY_LEFTMETA': 0x700e3,
+    'KEY_LEFTALT': 0x700e2,
+    'KEY_SPACE': 0x7002c,
+    'KEY_RIGHTALT': 0x700e6,
+    'KEY_RIGHTMETA': 0x700e7,
+    'KEY_COMPOSE': 0x70065,
+    'KEY_RIGHTCTRL': 0x700e4,
+    'KEY_INSERT': 0x70049,
+    'KEY_HOME': 0x7004a,
+    'KEY_PAGEUP': 0x7004b,
+    'KEY_DELETE': 0x7004c,
+    'KEY_END': 0x7004d,
+    'KEY_PAGEDOWN': 0x7004e,
+    'KEY_UP': 0x70052,
+    'KEY_LEFT': 0x70050,
+    'KEY_DOWN': 0x70051,
+    'KEY_RIGHT': 0x7004f,
+    'KEY_NUMLOCK': 0x70053,
+    'KEY_KPSLASH': 0x70054,
+    'KEY_KPASTERISK': 0x70055,
+    'KEY_KPMINUS': 0x70056,
+    'KEY_KP7': 0x7005f,
+    'KEY_KP8': 0x70060,
+    'KEY_KP9': 0x70061,
+    'KEY_KPPLUS': 0x70057,
+    'KEY_KP4': 0x7005c,
+    'KEY_KP5': 0x7005d,
+    'KEY_KP6': 0x7005e,
+    'KEY_KP1': 0x70059,
+    'KEY_KP2': 0x7005a,
+    'KEY_KP3': 0x7005b,
+    'KEY_KPENTER': 0x70058,
+    'KEY_KP0': 0x70062,
+    'KEY_KPDOT': 0x70063,
+    'KEY_CONFIG': 0xc0183,
+    'KEY_PLAYPAUSE': 0xc00cd,
+    'KEY_MUTE': 0xc00e2,
+    'KEY_VOLUMEDOWN': 0xc00ea,
+    'KEY_VOLUMEUP': 0xc00e9,
+    'KEY_HOMEPAGE': 0xc0223,
+}
+
+_scans = None
+
+if sys.version_info < (3, 7):
+    # No module __getattr__, build everything at import
+    for _n in _ENUMS:
+        enum(_n)
+    Scans = scans()
+    globals().update((_k, _v) for _k, _v in defines().items() if _k not in globals())
+
 
 
 class UInput(object):
@@ -187,13 +310,8 @@ class UInput(object):
 
         self._r = rels
 
-        lib = os.path.abspath(
-            os.path.normpath(
-                os.path.join(
-                    os.path.dirname(__file__),
-                    '..',
-                    'libuinput' + get_config_var('SO'))))
-        self._lib = ctypes.CDLL(lib)
+        self._lib = loadLib()
+        self._initFrame()
 
         c_k        = (ctypes.c_uint16 * len(self._k))(*self._k)
         c_a        = (ctypes.c_uint16 * len(self._a))(*self._a)
@@ -223,6 +341,85 @@ class UInput(object):
                                          c_name)
 
 
+    def _initFrame(self):
+        self._frame = (_Event * FRAME_SIZE)()
+        self._frame_len = 0
+        self._latency = None
+
+    def setLatencyRecorder(self, recorder):
+        """
+        Timestamp frame flushes
+
+        @param LatencyRecorder recorder     recorder, None to disable
+        """
+        self._latency = recorder
+
+    def _queue(self, evtype, code, val):
+        if self._frame_len == FRAME_SIZE:
+            self.flush(syn=False)
+        ev = self._frame[self._frame_len]
+        ev.type = evtype
+        ev.code = code
+        ev.value = val
+        self._frame_len += 1
+
+    def queueKey(self, key, val):
+        """
+        Add a key or btn event to the current frame
+
+        @param int key          key or btn event (KEY_* or BTN_*)
+        @param int val          event value
+        """
+        self._queue(EV_KEY, key, val)
+
+    def queueAxis(self, axis, val):
+        """
+        Add a abs event to the current frame
+
+        @param int axis         abs event (ABS_*)
+        @param int val          event value
+        """
+        self._queue(EV_ABS, axis, val)
+
+    def queueRel(self, rel, val):
+        """
+        Add a rel event to the current frame
+
+        @param int rel          rel event (REL_*)
+        @param int val          event value
+        """
+        self._queue(EV_REL, rel, val)
+
+    def queueScan(self, val):
+        """
+        Add a scan event (MSC_SCAN) to the current frame
+
+        @param int val          scan event value (scancode)
+        """
+        self._queue(EV_MSC, MSC_SCAN, val)
+
+    def flush(self, syn=True):
+        """
+        Write all queued events, followed by a SYN_REPORT, with a single
+        write syscall. Nothing is written for an empty frame.
+
+        @param bool syn         append the SYN_REPORT event
+
+        @return int             number of events written
+        """
+        n = self._frame_len
+        if n == 0:
+            return 0
+        self._frame_len = 0
+        latency = self._latency
+        if latency is not None:
+            latency.flushing()
+        ret = self._lib.uinput_write(self._fd, self._frame, ctypes.c_int(n), ctypes.c_int(syn))
+        if latency is not None:
+            latency.flushed()
+        return ret
+
+
     def keyEvent(self, key, val):
         """
         Generate a key or btn event
@@ -300,25 +497,25 @@ class Xbox360(UInput):
         super(Xbox360, self).__init__(vendor=0x045e,
                                       product=0x028e,
                                       name=b"Microsoft X-Box 360 pad",
-                                      keys=[Keys.BTN_START,
-                                            Keys.BTN_MODE,
-                                            Keys.BTN_SELECT,
-                                            Keys.BTN_A,
-                                            Keys.BTN_B,
-                                            Keys.BTN_X,
-                                            Keys.BTN_Y,
-                                            Keys.BTN_TL,
-                                            Keys.BTN_TR,
-                                            Keys.BTN_THUMBL,
-                                            Keys.BTN_THUMBR],
-                                      axes=[(Axes.ABS_X, -32768, 32767, 16, 128),
-                                            (Axes.ABS_Y, -32768, 32767, 16, 128),
-                                            (Axes.ABS_RX, -32768, 32767, 16, 128),
-                                            (Axes.ABS_RY, -32768, 32767, 16, 128),
-                                            (Axes.ABS_Z, 0, 255, 0, 0),
-                                            (Axes.ABS_RZ, 0, 255, 0, 0),
-                                            (Axes.ABS_HAT0X, -1, 1, 0, 0),
-                                            (Axes.ABS_HAT0Y, -1, 1, 0, 0)],
+                                      keys=codes('BTN_START',
+                                                 'BTN_MODE',
+                                                 'BTN_SELECT',
+                                                 'BTN_A',
+                                                 'BTN_B',
+                                                 'BTN_X',
+                                                 'BTN_Y',
+                                                 'BTN_TL',
+                                                 'BTN_TR',
+                                                 'BTN_THUMBL',
+                                                 'BTN_THUMBR'),
+                                      axes=[(code('ABS_X'), -32768, 32767, 16, 128),
+                                            (code('ABS_Y'), -32768, 32767, 16, 128),
+                                            (code('ABS_RX'), -32768, 32767, 16, 128),
+                                            (code('ABS_RY'), -32768, 32767, 16, 128),
+                                            (code('ABS_Z'), 0, 255, 0, 0),
+                                            (code('ABS_RZ'), 0, 255, 0, 0),
+                                            (code('ABS_HAT0X'), -1, 1, 0, 0),
+                                            (code('ABS_HAT0Y'), -1, 1, 0, 0)],
                                       rels=[])
 
 
@@ -335,16 +532,17 @@ class Mouse(UInput):
         super(Mouse, self).__init__(vendor=0x28de,
                                     product=0x1142,
                                     name=b"Steam Controller Mouse",
-                                    keys=[Keys.BTN_LEFT,
-                                          Keys.BTN_RIGHT,
-                                          Keys.BTN_MIDDLE,
-                                          Keys.BTN_SIDE,
-                                          Keys.BTN_EXTRA],
+                                    keys=codes('BTN_LEFT',
+                                               'BTN_RIGHT',
+                                               'BTN_MIDDLE',
+                                               'BTN_SIDE',
+                                               'BTN_EXTRA'),
                                     axes=[],
-                                    rels=[Rels.REL_X,
-                                          Rels.REL_Y,
-                                          Rels.REL_WHEEL,
-                                          Rels.REL_HWHEEL])
+                                    rels=codes('REL_X',
+                                               'REL_Y',
+                                               'REL_WHEEL',
+                                               'REL_HWHEEL'))
+        self._rel_x, self._rel_y = codes('REL_X', 'REL_Y')
         self._dx = 0.0
         self._dy = 0.0
         self._xvel = 0.0
@@ -404,9 +602,9 @@ class Mouse(UInput):
             # Compute mouse mouvement from interger part of d * scale
             self._dx += dx * self._xscale
             self._dy += dy * self._yscale
-            self.relEvent(rel=Rels.REL_X, val=int(self._dx))
-            self.relEvent(rel=Rels.REL_Y, val=int(self._dy))
-            self.synEvent()
+            self.queueRel(self._rel_x, int(self._dx))
+            self.queueRel(self._rel_y, int(self._dy))
+            self.flush()
 
             # Remove
             self._dx -= int(self._dx)
@@ -437,9 +635,9 @@ class Mouse(UInput):
             self._dx += dx * self._xscale
             self._dy += dy * self._yscale
 
-            self.relEvent(rel=Rels.REL_X, val=int(self._dx))
-            self.relEvent(rel=Rels.REL_Y, val=int(self._dy))
-            self.synEvent()
+            self.queueRel(self._rel_x, int(self._dx))
+            self.queueRel(self._rel_y, int(self._dy))
+            self.flush()
 
             # Remove
             self._dx -= int(self._dx)
@@ -463,11 +661,12 @@ class Keyboard(UInput):
         super(Keyboard, self).__init__(vendor=0x28de,
                                        product=0x1142,
                                        name=b"Steam Controller Keyboard",
-                                       keys=Scans.keys(),
+                                       keys=list(scans().keys()),
                                        axes=[],
                                        rels=[],
                                        keyboard=True)
         self.setDelayPeriod(250, 33)
+        self._scans = scans()
         self._dx = 0.0
         self._pressed = set()
 
@@ -481,10 +680,10 @@ class Keyboard(UInput):
 
         new = [k for k in keys if k not in self._pressed]
         for i in new:
-            self.scanEvent(Scans[i])
-            self.keyEvent(i, 1)
+            self.queueScan(self._scans[i])
+            self.queueKey(i, 1)
         if len(new):
-            self.synEvent()
+            self.flush()
             self._pressed |= set(new)
 
     def releaseEvent(self, keys=None):
@@ -501,8 +700,8 @@ class Keyboard(UInput):
         else:
             rem = list(self._pressed)
         for i in rem:
-            self.scanEvent(Scans[i])
-            self.keyEvent(i, 0)
+            self.queueScan(self._scans[i])
+            self.queueKey(i, 0)
         if len(rem):
-            self.synEvent()
+            self.flush()
             self._pressed -= set(rem)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam text VDF (KeyValues) parser and writer"""
+
+import io
+import re
+
+
+class VDFError(ValueError):
+    """Malformed vdf data"""
+
+
+class VDFDict(list):
+    """
+    Ordered list of (key, value) pairs, keys can be repeated (several
+    "group" in a controller config). Values are str or VDFDict.
+    """
+
+    def get(self, key, default=None):
+        """
+        @param str key          key to look for
+        @param default          returned when key is missing
+
+        @return                 value of the first pair with this key
+        """
+        for k, val in self:
+            if k == key:
+                return val
+        return default
+
+    def getall(self, key):
+        """
+        @param str key          key to look for
+
+        @return list            values of all pairs with this key
+        """
+        return [val for k, val in self if k == key]
+
+    def keys(self):
+        """
+        @return list of str     keys in order, with duplicates
+        """
+        return [k for k, _ in self]
+
+
+# quoted string, braces, comment, conditional ([$WIN32]) or bare word
+_TOKEN = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|([{}])|//[^\n]*|\[[^\]\n]*\]|([^\s{}"]+))')
+_SPACE = re.compile(r'\s*')
+_ESCAPE = re.compile(r'\\(.)')
+_ESCAPES = {'n': '\n', 't': '\t'}
+_QUOTE = re.compile(r'[\\"\n\t]')
+_QUOTES = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\t': '\\t'}
+
+# iterparse() events
+START = 'start'
+VALUE = 'value'
+END = 'end'
+
+CHUNK_SIZE = 1 << 16
+
+
+def _unescape(m):
+    return _ESCAPES.get(m.group(1), m.group(1))
+
+def _quote(m):
+    return _QUOTES[m.group(0)]
+
+
+def _events(chunks):
+    """
+    Single pass tokenizer and parser, text is consumed chunk by chunk and
+    each character is scanned once.
+
+    @param iterable chunks  str chunks
+
+    @return generator       (event, key, value) see iterparse
+    """
+    buf = ''
+    pos = 0
+    offset = 0          # offset of buf in the whole document
+    eof = False
+    key = None
+    depth = 0
+    chunks = iter(chunks)
+    match = _TOKEN.match
+
+    while True:
+        m = match(buf, pos)
+        # a token touching the end of the buffer might be truncated
+        if (m is None or m.end() == len(buf)) and not eof:
+            chunk = next(chunks, None)
+            if chunk:
+                offset += pos
+                buf = buf[pos:] + chunk
+                pos = 0
+            else:
+                eof = True
+            continue
+        if m is None:
+            if _SPACE.match(buf, pos).end() == len(buf):
+                break
+            raise VDFError('Unexpected character at offset {}'.format(offset + pos))
+
+        pos = m.end()
+        string, brace, bare = m.groups()
+        if brace == '{':
+            if key is None:
+                raise VDFError('Section without key at offset {}'.format(offset + m.start(2)))
+            depth += 1
+            yield (START, key, None)
+            key = None
+        elif brace == '}':
+            if key is not None or depth == 0:
+                raise VDFError('Unexpected }} at offset {}'.format(offset + m.start(2)))
+            depth -= 1
+            yield (END, None, None)
+        else:
+            if string is not None:
+                tok = _ESCAPE.sub(_unescape, string) if '\\' in string else string
+            elif bare is not None:
+                tok = bare
+            else:
+                # comment or conditional
+                continue
+            if key is None:
+                key = tok
+            else:
+                yield (VALUE, key, tok)
+                key = None
+
+    if key is not None or depth != 0:
+        raise VDFError('Unexpected end of data')
+
+
+def iterparse(stream, chunk_size=CHUNK_SIZE):
+    """
+    Incremental (SAX like) parse of a vdf file, memory use does not depend
+    on the file size.
+
+    Events are tuples (event, key, value):
+     - (START, key, None) section opening
+     - (VALUE, key, value) key value pair
+     - (END, None, None) section closing
+
+    @param file stream      file object opened in text mode
+    @param int chunk_size   read size
+
+    @return generator
+    """
+    return _events(iter(lambda: stream.read(chunk_size), ''))
+
+
+def _build(events):
+    root = VDFDict()
+    stack = [root]
+    current = root
+    for event, key, value in events:
+        if event is VALUE:
+            current.append((key, value))
+        elif event is START:
+            section = VDFDict()
+            current.append((key, section))
+            stack.append(section)
+            current = section
+        else:
+            stack.pop()
+            current = stack[-1]
+    return root
+
+
+def loads(text):
+    """
+    Parse vdf text
+
+    @param str text         vdf document
+
+    @return VDFDict         root pairs
+    """
+    return _build(_events((text,)))
+
+
+def load(stream, chunk_size=CHUNK_SIZE):
+    """
+    Parse a vdf file without loading the whole text
+
+    @param file stream      file object opened in text mode
+    @param int chunk_size   read size
+
+    @return VDFDict         root pairs
+    """
+    return _build(iterparse(stream, chunk_size))
+
+
+class VDFWriter(object):
+    """
+    Streaming vdf writer, nothing is buffered besides the file object one
+    """
+
+    def __init__(self, stream, indent='\t'):
+        """
+        Constructor
+
+        @param file stream      file object opened in text mode
+        @param str indent       indentation of one level
+        """
+        self._write = stream.write
+        self._indent = indent
+        self._depth = 0
+
+    def start(self, key):
+        """
+        Open a section
+
+        @param str key          section key
+        """
+        prefix = self._indent * self._depth
+        if self._depth:
+            self._write('\n')
+        self._write('{0}"{1}"\n{0}{{\n'.format(prefix, _QUOTE.sub(_quote, key)))
+        self._depth += 1
+
+    def value(self, key, value):
+        """
+        Write a key value pair
+
+        @param str key
+        @param str value
+        """
+        self._write('{}"{}" "{}"\n'.format(self._indent * self._depth,
+                                            _QUOTE.sub(_quote, key),
+                                            _QUOTE.sub(_quote, str(value))))
+
+    def end(self):
+        """Close current section"""
+        if self._depth == 0:
+            raise VDFError('No section to close')
+        self._depth -= 1
+        self._write(self._indent * self._depth + '}\n')
+
+    def event(self, event, key=None, value=None):
+        """
+        Write an iterparse event, iterparse output can be piped to a writer
+
+        @param str event        START, VALUE or END
+        """
+        if event == VALUE:
+            self.value(key, value)
+        elif event == START:
+            self.start(key)
+        else:
+            self.end()
+
+
+def _pairs(obj):
+    return obj.items() if hasattr(obj, 'items') else obj
+
+
+def dump(obj, stream, indent='\t'):
+    """
+    Write pairs to a vdf file
+
+    @param VDFDict obj      pairs (or dict), values are str or nested pairs
+    @param file stream      file object opened in text mode
+    @param str indent       indentation of one level
+    """
+    writer = VDFWriter(stream, indent)
+    # explicit stack, no recursion limit on deep documents
+    stack = [iter(_pairs(obj))]
+    while stack:
+        for key, value in stack[-1]:
+            if isinstance(value, (list, dict)):
+                writer.start(key)
+                stack.append(iter(_pairs(value)))
+                break
+            writer.value(key, value)
+        else:
+            stack.pop()
+            if stack:
+                writer.end()
+
+
+def dumps(obj, indent='\t'):
+    """
+    @param VDFDict obj      pairs (or dict)
+    @param str indent       indentation of one level
+
+    @return str             vdf text
+    """
+    out = io.StringIO()
+    dump(obj, out, indent)
+    return out.getvalue()
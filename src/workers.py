@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Worker process per controller
+
+The usb loop stays in the parent process and only copies each raw report
+into a ReportRing, a single producer / single consumer ring in anonymous
+shared memory. A Worker process per controller reads its ring, decodes
+reports and runs the mapping callback, so a heavy mapping of one
+controller neither holds the GIL of the others nor delays them.
+
+Workers are forked (Linux): the factory building the mapping and its
+uinput devices runs in the worker, nothing is pickled.
+"""
+
+import os
+import mmap
+import time
+import select
+import struct
+import multiprocessing
+
+from steamcontroller.decoder import SteamControllerState, REPORT_SIZE
+from steamcontroller.latency import Histogram
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Reports held by a ring, the producer drops reports when it is full
+RING_CAPACITY = 256
+
+# Seconds given to a worker to stop before it is killed
+WORKER_TIMEOUT = 1.0
+
+# Seconds an idle worker sleeps before checking its parent is still alive
+PARENT_CHECK = 1.0
+
+# header: head (written by producer), tail (written by consumer), then
+# latency histogram buckets
+_HEAD = 0
+_TAIL = 8
+_U64 = struct.Struct('=Q')
+_HIST = 64
+_HIST_SIZE = Histogram.SIZE * struct.calcsize('L')
+# slot: arrival clock (or a request below) and raw report
+_STAMP = struct.Struct('=d')
+_SLOT = _STAMP.size + REPORT_SIZE
+
+_RELEASE = -1.0
+_STOP = -2.0
+
+
+class ReportRing(object):
+    """
+    Raw reports ring shared between the parent (producer) and a worker
+    (consumer). Indexes are free running 64 bits counters, each written
+    by one side only, the slot content is written before the head that
+    publishes it.
+
+    Every published report is followed by a byte on a pipe, written after
+    the head. A consumer that found the ring empty and waits on the pipe
+    can not miss a report: its byte is either already there or still to
+    come. A full pipe means a wakeup is already pending, the byte is then
+    not needed.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY):
+        """
+        Constructor, must be called before the worker is forked
+
+        @param int capacity     number of report slots
+        """
+        self.capacity = capacity
+        self._slots = _HIST + _HIST_SIZE
+        self._mm = mmap.mmap(-1, self._slots + capacity * _SLOT)
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._wfd, False)
+        self._head = 0
+        self.overflows = 0
+
+    def push(self, buf, stamp):
+        """
+        Producer side: queue a report
+
+        @param buffer buf       raw report
+        @param float stamp      arrival clock value
+
+        @return bool            False if the ring is full (report dropped)
+        """
+        mm = self._mm
+        head = self._head
+        if head - _U64.unpack_from(mm, _TAIL)[0] >= self.capacity:
+            self.overflows += 1
+            return False
+        off = self._slots + (head % self.capacity) * _SLOT
+        _STAMP.pack_into(mm, off, stamp)
+        mm[off + _STAMP.size:off + _SLOT] = buf
+        self._head = head + 1
+        _U64.pack_into(mm, _HEAD, head + 1)
+        try:
+            os.write(self._wfd, b'\0')
+        except BlockingIOError:
+            pass
+        return True
+
+    def depth(self):
+        """@return int          reports waiting in the ring"""
+        return self._head - _U64.unpack_from(self._mm, _TAIL)[0]
+
+    def histogram(self):
+        """
+        @return Histogram       consumer latencies (arrival to callback
+                                exit, us) read from shared memory
+        """
+        return Histogram(memoryview(self._mm)[_HIST:_HIST + _HIST_SIZE].cast('L'))
+
+    def _consumer(self):
+        """Worker side setup, the producer end of the pipe is closed"""
+        os.close(self._wfd)
+        self._wfd = None
+
+    def _wait(self, timeout):
+        """
+        Consumer side, once the ring was found empty: sleep until a report
+        is published, or timeout. Wakeup bytes of reports already consumed
+        can end it early, callers read head again.
+
+        @return bool            False if the producer is gone
+        """
+        if select.select([self._rfd], [], [], timeout)[0]:
+            # other workers forked later hold the write end too, EOF only
+            # happens when the whole family is gone
+            if not os.read(self._rfd, 4096):
+                return False
+        return True
+
+    def close(self):
+        """Release the pipe, the shared memory goes with the last user"""
+        for fd in (self._rfd, self._wfd):
+            if fd is not None:
+                os.close(fd)
+        self._rfd = self._wfd = None
+
+
+def _workerMain(ring, name, factory, cpu):
+    """Worker process body"""
+    ring._consumer()
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, [cpu])
+
+    callback, callback_args, release, _ = factory(name)
+    if callback_args is None:
+        callback_args = ()
+    state = SteamControllerState()
+    hist = ring.histogram()
+    mm = ring._mm
+    slots = ring._slots
+    capacity = ring.capacity
+    view = memoryview(mm)
+    tail = _U64.unpack_from(mm, _TAIL)[0]
+    ppid = os.getppid()
+
+    running = True
+    while running:
+        head = _U64.unpack_from(mm, _HEAD)[0]
+        if head == tail:
+            # parent gone (killed): stop too
+            running = ring._wait(PARENT_CHECK) and os.getppid() == ppid
+            continue
+        while tail != head:
+            off = slots + (tail % capacity) * _SLOT
+            stamp = _STAMP.unpack_from(mm, off)[0]
+            if stamp >= 0:
+                state.update(view[off + _STAMP.size:off + _SLOT])
+                callback(None, state, *callback_args)
+                hist.record(int((_clock() - stamp) * 1e6))
+            elif release is not None:
+                release()
+            tail += 1
+            _U64.pack_into(mm, _TAIL, tail)
+            if stamp == _STOP:
+                running = False
+                break
+
+
+class Worker(object):
+    """
+    Parent side of a controller worker process, used as the event pump of
+    the controller (SteamController.setPump) so every raw report is
+    forwarded to the worker
+    """
+
+    def __init__(self, name, factory, cpu=None, capacity=RING_CAPACITY):
+        """
+        Constructor
+
+        @param str name         controller name given to factory
+        @param callable factory factory(name) returns (callback,
+                                callback_args, release, devices), called in
+                                the worker. callback(sc, state, *args) is
+                                called with sc None (no control messages
+                                from a worker)
+        @param int cpu          pin the worker to this cpu, None to let the
+                                kernel schedule it
+        @param int capacity     ring capacity in reports
+        """
+        self.name = name
+        self._factory = factory
+        self._cpu = cpu
+        self._ring = ReportRing(capacity)
+        self._process = None
+        self.restarts = 0
+
+    def start(self):
+        """Fork the worker process"""
+        ctx = multiprocessing.get_context('fork')
+        self._process = ctx.Process(target=_workerMain,
+                                    args=(self._ring, self.name, self._factory, self._cpu),
+                                    name='sc-worker-{}'.format(self.name))
+        self._process.daemon = True
+        self._process.start()
+
+    def alive(self):
+        """@return bool          True while the worker process runs"""
+        return self._process is not None and self._process.is_alive()
+
+    def check(self):
+        """
+        Restart the worker if it died
+
+        @return bool            True if it was restarted
+        """
+        if self._process is None or self._process.is_alive():
+            return False
+        self._process.join()
+        self.restarts += 1
+        self.start()
+        return True
+
+    def process(self, buf):
+        """Event pump interface: forward a raw report"""
+        self._ring.push(buf, _clock())
+
+    def release(self):
+        """Ask the worker to release its outputs (controller lost)"""
+        self._ring.push(b'\0' * REPORT_SIZE, _RELEASE)
+
+    def stop(self, timeout=WORKER_TIMEOUT):
+        """
+        Stop the worker once it has processed the queued reports, its
+        outputs are released
+
+        @param float timeout    seconds to wait before killing it
+        """
+        deadline = time.time() + timeout
+        # a stuck worker never frees a slot for the request
+        while self.alive() and not self._ring.push(b'\0' * REPORT_SIZE, _STOP):
+            if time.time() >= deadline:
+                break
+            time.sleep(0.001)
+        if self._process is not None:
+            self._process.join(max(0.0, deadline - time.time()))
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+        self._ring.close()
+
+    def stats(self):
+        """
+        @return dict            restarts, ring overflows and depth, worker
+                                latency (arrival in the parent to callback
+                                exit in the worker) p50 / p99 in us
+        """
+        hist = self._ring.histogram()
+        return {
+            'restarts': self.restarts,
+            'overflows': self._ring.overflows,
+            'depth': self._ring.depth(),
+            'worker_p50': hist.percentile(50),
+            'worker_p99': hist.percentile(99),
+        }
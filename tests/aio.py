@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+AsyncSteamController driven by a replayed capture: a bounded and a
+coalescing reports() iterator run together with a control message, both
+iterators end with the replay and the controller is closed, the reports
+dropped by the coalescing one are still counted.
+"""
+
+import os
+import asyncio
+import tempfile
+from steamcontroller.aio import AsyncSteamController
+from steamcontroller.transport import ReplayTransport
+from common import report, write_capture
+
+N = 2000
+PERIOD = 0.0005
+
+fd, path = tempfile.mkstemp(suffix='.sccap')
+os.close(fd)
+write_capture(path, (report(i) for i in range(N)), PERIOD)
+
+async def collect(controller, **kwargs):
+    seqs = []
+    async for state in controller.reports(**kwargs):
+        seqs.append(state.seq)
+        # a slow consumer, late on the reports
+        await asyncio.sleep(0)
+    return seqs
+
+async def main():
+    transport = ReplayTransport(path, speed=1.0)
+    controller = AsyncSteamController(transport=transport)
+    bounded = asyncio.ensure_future(collect(controller, coalesce=False, maxsize=N))
+    latest = asyncio.ensure_future(collect(controller, coalesce=True))
+    control = await controller.sendControl(b'\x8f\x07\x00\xff')
+    all_seqs, latest_seqs = await asyncio.gather(bounded, latest)
+    return controller, transport, control, all_seqs, latest_seqs
+
+controller, transport, control, all_seqs, latest_seqs = asyncio.run(main())
+
+assert all_seqs == list(range(N)), (len(all_seqs), all_seqs[:10])
+assert latest_seqs == sorted(set(latest_seqs)) and latest_seqs[-1] == N - 1, latest_seqs[-5:]
+assert control is True and transport.controls[-1][:4] == b'\x8f\x07\x00\xff'
+assert controller.controller.transport is None
+# drops of the ended iterators are kept, the bounded one dropped nothing
+dropped = controller.stats()['backpressure_dropped']
+assert dropped == N - len(latest_seqs) > 0, (dropped, len(latest_seqs))
+print('{} reports, {} seen by the coalescing iterator, control sent'.format(
+    len(all_seqs), len(latest_seqs)))
+
+# without a running loop there is no loop to use
+transport = ReplayTransport(path)
+try:
+    AsyncSteamController(transport=transport)
+except RuntimeError:
+    print('no running loop refused')
+else:
+    raise AssertionError('constructed without a running loop')
+transport.close()
+
+os.remove(path)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+Capture analysis on a synthetic hour of reports (built with NumPy, written
+as a regular capture file): known noise, drift, gyro bias, interval
+jitter, dropped reports and touch durations must be found, in a few
+seconds. Seq statistics must match SteamController.stats() on a replay.
+"""
+
+import os
+import time
+import random
+import tempfile
+import numpy
+from steamcontroller import SteamController, SCStatus, SCButtons
+from steamcontroller.capture import open_capture, record_dtype, load_array
+from steamcontroller.decoder import REPORT_STRUCT
+from steamcontroller.transport import ReplayTransport
+from steamcontroller.analysis import analyze, seq_gaps, touch_durations
+
+HOURS = 1.0
+PERIOD = 0.004
+JITTER = 100e-6
+NOISE = 50.0
+DRIFT = 300.0
+BIAS = 25
+DROPPED = 1000
+TOUCH = 0.5
+
+def synthetic(path):
+    rnd = numpy.random.RandomState(1)
+    n = int(HOURS * 3600 / PERIOD)
+    arr = numpy.zeros(n, dtype=record_dtype())
+    t = numpy.arange(n) * PERIOD
+    arr['timestamp'] = t + rnd.normal(0, JITTER, n)
+    arr['status'] = int(SCStatus.Input)
+    arr['seq'] = numpy.arange(n) & 0xffff
+    arr['lpad_x'] = numpy.round(rnd.normal(0, NOISE, n) + DRIFT * t / 3600)
+    arr['gyaw'] = BIAS + numpy.round(rnd.normal(0, 5, n))
+    # a 0.5 s touch every 10 s
+    arr['buttons'] = numpy.where((t % 10.0) < TOUCH, int(SCButtons.LPadTouch), 0)
+    # some idle reports and dropped ones
+    arr['status'][rnd.choice(n, 100, replace=False)] = int(SCStatus.Idle)
+    keep = numpy.ones(n, dtype=bool)
+    keep[rnd.choice(numpy.arange(1, n - 1, 2), DROPPED, replace=False)] = False
+    arr = arr[keep]
+
+    cap = open_capture(path, 'w')
+    cap.close()
+    with open(path, 'ab') as f:
+        arr.tofile(f)
+    return arr
+
+fd, path = tempfile.mkstemp(suffix='.sccap')
+os.close(fd)
+arr = synthetic(path)
+
+t0 = time.time()
+result = analyze(path)
+elapsed = time.time() - t0
+print('{} reports ({:.1f} h) analyzed in {:.2f} s'.format(len(arr), HOURS, elapsed))
+
+noise = result['noise']['lpad_x']['noise']
+assert abs(noise - NOISE) < 0.05 * NOISE, noise
+drift = result['drift']['lpad_x']
+assert abs(drift - DRIFT) < 0.1 * DRIFT, drift
+gyro = result['gyro']
+assert abs(gyro['gyaw_bias'] - BIAS) < 0.5 and gyro['still'] > 0.99, gyro
+jitter = result['intervals']['std']
+assert result['intervals']['p50'] > PERIOD * 1e6 * 0.9, result['intervals']
+seq = result['seq']
+assert seq['dropped'] >= DROPPED - 100 and seq['out_of_order'] == 0, seq
+touches = result['touches']['lpad']
+assert touches['count'] == int(HOURS * 360) - 1, touches
+assert abs(touches['p50'] - TOUCH) < 2 * PERIOD, touches
+print('noise {:.1f} drift {:.0f}/h bias {:.2f} jitter {:.0f} us dropped {} touches {} x {:.3f} s'.format(
+    noise, drift, gyro['gyaw_bias'], jitter, seq['dropped'], touches['count'], touches['p50']))
+
+# same loop in python, on a slice to keep it short
+part = load_array(path)[:100000]
+t0 = time.time()
+durations = []
+start = None
+for ts, buttons in zip(part['timestamp'].tolist(), part['buttons'].tolist()):
+    if buttons & SCButtons.LPadTouch:
+        if start is None:
+            start = ts
+    elif start is not None:
+        durations.append(ts - start)
+        start = None
+loop = (time.time() - t0) * len(arr) / len(part)
+# the first touch starts with the capture, not counted by touch_durations
+assert numpy.allclose(durations[1:], touch_durations(part, SCButtons.LPadTouch))
+print('python loop for touches alone: {:.2f} s estimated'.format(loop))
+os.remove(path)
+
+# seq statistics against the driver counters
+rnd = random.Random(2)
+cap = open_capture(path, 'w')
+seq = 0
+for i in range(5000):
+    r = rnd.random()
+    if r < 0.01:
+        seq += rnd.randint(2, 5)
+    elif r < 0.015:
+        seq -= rnd.randint(1, 10)
+    elif r < 0.016:
+        seq += 40000
+    else:
+        seq += 1
+    cap.write(REPORT_STRUCT.pack(SCStatus.Input, seq & 0xffff, 0, 0, 0,
+                                 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0), timestamp=i * PERIOD)
+cap.close()
+sc = SteamController(callback=lambda sc, sci: None, transport=ReplayTransport(path, speed=None))
+sc.run()
+stats = sc.stats()
+seq = seq_gaps(load_array(path))
+assert (seq['dropped'], seq['out_of_order']) == (stats['dropped'], stats['out_of_order']), \
+    (seq, stats)
+print('seq statistics match the driver ({dropped} dropped, {out_of_order} out of order)'.format(**seq))
+os.remove(path)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+Round trip checks of the binary vdf codec on synthetic files, then time
+pulling one controller config out of a large file with lazy decoding
+against decoding the whole file
+"""
+
+import os
+import time
+import tempfile
+from steamcontroller import vdf
+from steamcontroller.binvdf import (loads, dumps, open_mmap, BinaryVDFDict,
+                                    Pointer, Color, UInt64, Int64, WString)
+
+APPS = 20000
+
+def config(i):
+    """Small controller config like tree"""
+    return vdf.VDFDict([
+        ('controller_mappings', vdf.VDFDict([
+            ('version', '2'),
+            ('title', 'Config {}'.format(i)),
+            ('group', vdf.VDFDict([('id', '0'), ('mode', 'four_buttons')])),
+            ('group', vdf.VDFDict([('id', '1'), ('mode', 'joystick_move')])),
+        ])),
+    ])
+
+def document(apps):
+    apps_tree = vdf.VDFDict()
+    for i in range(apps):
+        apps_tree.append((str(i), vdf.VDFDict([
+            ('appid', i),
+            ('AppName', u'Game é {}'.format(i)),
+            ('LastPlayTime', UInt64(1440000000 + i)),
+            ('Rating', 0.5),
+            ('config', config(i)),
+        ])))
+    return vdf.VDFDict([('shortcuts', apps_tree)])
+
+# every type, duplicate keys, empty maps, non ascii keys
+types = vdf.VDFDict([
+    ('root', vdf.VDFDict([
+        ('string', 'value'),
+        ('int32', -5),
+        ('float32', 1.5),
+        ('pointer', Pointer(1234)),
+        ('wstring', WString(u'wide ☺')),
+        ('color', Color(0x00ff00ff)),
+        ('uint64', UInt64(1 << 63)),
+        ('int64', Int64(-(1 << 62))),
+        ('dup', 'a'),
+        ('dup', 'b'),
+        ('empty', vdf.VDFDict()),
+        (u'clé', vdf.VDFDict([('nested', vdf.VDFDict([('deep', '1')]))])),
+    ])),
+])
+
+data = dumps(types)
+decoded = loads(data)
+assert decoded == types, decoded
+for key, value in decoded.get('root'):
+    assert type(value) is type(types.get('root').get(key)), key
+lazy = BinaryVDFDict(data, root=True)
+assert lazy.find('root', u'clé', 'nested', 'deep') == '1'
+assert lazy.get('root').getall('dup') == ['a', 'b']
+assert dumps(lazy) == data
+lazy = BinaryVDFDict(data, root=True)
+root = lazy.get('root')
+scan = iter(root)
+assert next(scan)[0] == 'string'
+assert root.get('dup') == 'a'
+assert [k for k, _ in scan] == root.keys()[1:]
+print('types round trip ok')
+
+doc = document(APPS)
+fd, path = tempfile.mkstemp(suffix='.vdf')
+with os.fdopen(fd, 'wb') as f:
+    t0 = time.time()
+    f.write(dumps(doc))
+    t_dump = time.time() - t0
+
+t0 = time.time()
+with open(path, 'rb') as f:
+    full = loads(f.read())
+t_full = time.time() - t0
+assert full == doc
+
+t0 = time.time()
+with open_mmap(path) as root:
+    cfg = root.find('shortcuts', '0', 'config').decode()
+t_first = time.time() - t0
+assert cfg == config(0)
+
+target = str(APPS - 1)
+t0 = time.time()
+with open_mmap(path) as root:
+    cfg = root.find('shortcuts', target, 'config').decode()
+t_lazy = time.time() - t0
+assert cfg == config(APPS - 1)
+
+# unmapped on close, an empty file is an empty document
+try:
+    root.find('shortcuts', target, 'config').decode()
+except ValueError:
+    pass
+else:
+    assert False, 'closed map still readable'
+with open(path, 'rb+') as f:
+    data = f.read()
+    f.truncate(0)
+with open_mmap(path) as root:
+    assert list(root) == []
+with open(path, 'wb') as f:
+    f.write(data)
+
+print('{} apps, {:.1f} MB'.format(APPS, os.path.getsize(path) / float(1 << 20)))
+print('dump        : {:8.1f} ms'.format(t_dump * 1e3))
+print('full decode : {:8.1f} ms'.format(t_full * 1e3))
+print('lazy lookup : {:8.1f} ms (first app)'.format(t_first * 1e3))
+print('lazy lookup : {:8.1f} ms (last app, worst case)'.format(t_lazy * 1e3))
+
+os.remove(path)
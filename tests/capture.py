@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""
+Capture files written in batches must read back unchanged.
+
+CaptureRing: the in memory ring must hold the same records as a capture
+file of the last reports, and a write must cost the same whatever the
+window, unlike the list based history sc-gyro-plot used (append, filter
+the window, slice every field, per report).
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import subprocess
+from steamcontroller import SCStatus
+from steamcontroller.capture import CaptureRing, open_capture, load_array
+from steamcontroller.manager import ControllerManager
+from steamcontroller.transport import ReplayBus, ReplayTransport
+from common import report, write_capture
+
+N = 5000
+PERIOD = 0.004
+IMU = ('gpitch', 'groll', 'gyaw', 'q1', 'q2', 'q3', 'q4')
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+def synthetic(path, seed):
+    """Random pad and gyro values"""
+    rnd = random.Random(seed)
+    write_capture(path, (report(i, 0, 0, 0, *[rnd.randint(-32768, 32767) for _ in range(11)])
+                         for i in range(N)), PERIOD)
+
+captures = []
+for seed in range(4):
+    fd, path = tempfile.mkstemp(suffix='.sccap')
+    os.close(fd)
+    synthetic(path, seed)
+    captures.append(path)
+
+# writer batching: every report written is read back, whatever the batch
+written = [report(i, i % 2, lpad_x=-i) for i in range(1000)]
+fd, path = tempfile.mkstemp(suffix='.sccap')
+os.close(fd)
+for batch in (1, 7, 1000, 4096):
+    cap = open_capture(path, 'w', batch=batch)
+    for i, raw in enumerate(written):
+        cap.write(raw, timestamp=i * 0.25)
+    cap.close()
+    arr = load_array(path)
+    assert [rec['raw'].tobytes() for rec in arr] == written, batch
+    assert (arr['timestamp'] == [i * 0.25 for i in range(len(written))]).all(), batch
+    assert (arr['lpad_x'] == [-i for i in range(len(written))]).all(), batch
+    cap = open_capture(path)
+    buf = bytearray(len(written[0]))
+    for i, raw in enumerate(written):
+        assert cap.readinto(buf) == i * 0.25 and buf == raw, (batch, i)
+    assert cap.readinto(buf) is None
+    cap.close()
+print('write and load round trip ok')
+
+# sc-dump re-capturing a wireless receiver capture keeps its usb ids
+cap = open_capture(path, 'w', vendor=0x28de, product=0x1142)
+for i, raw in enumerate(written):
+    cap.write(raw, timestamp=i * 0.25)
+cap.close()
+fd, out = tempfile.mkstemp(suffix='.sccap')
+os.close(fd)
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'sc-dump.py')
+subprocess.check_call([sys.executable, script, '-i', path, '-o', out],
+                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+replay = ReplayTransport(out)
+assert (replay.vendor, replay.product) == (0x28de, 0x1142), (replay.vendor, replay.product)
+replay.close()
+assert [rec['raw'].tobytes() for rec in load_array(out)] == written
+os.remove(out)
+os.remove(path)
+print('re-capture keeps the usb ids')
+
+# same records as the file, wrapped several times
+ref = load_array(captures[0])
+for capacity in (1, 7, 1000, N, 2 * N):
+    ring = CaptureRing(capacity)
+    assert len(ring.array()) == 0 and len(ring.window(1.0)) == 0
+    for rec in ref:
+        ring.write(rec['raw'].tobytes(), rec['timestamp'])
+    kept = min(capacity, N)
+    assert (ring.array() == ref[N - kept:]).all(), capacity
+    assert (ring.array(3) == ref[N - min(3, kept):]).all(), capacity
+    win = ring.window(1.0)
+    assert (win == ref[N - min(kept, int(round(1.0 / PERIOD)) + 1):]).all(), (capacity, len(win))
+print('ring content ok')
+
+def list_history(window):
+    """Per report work of the previous sc-gyro-plot update()"""
+    times = []
+    imu = dict((name, []) for name in IMU)
+
+    def update(t, values):
+        times.append(t)
+        times[:] = [x for x in times if t - x <= window]
+        for name in IMU:
+            imu[name].append(values[name])
+            imu[name] = imu[name][-len(times):]
+    return update
+
+records = [(float(rec['timestamp']), dict((name, int(rec[name])) for name in IMU))
+           for rec in ref]
+raws = [(rec['raw'].tobytes(), float(rec['timestamp'])) for rec in ref]
+print('{:>8s} {:>14s} {:>14s}'.format('window', 'lists', 'ring'))
+for window in (1.0, 10.0, 60.0):
+    update = list_history(window)
+    # fill the window first, then measure
+    fill = int(window / PERIOD)
+    for i in range(fill):
+        update(i * PERIOD, records[i % N][1])
+    t0 = _clock()
+    for i in range(fill, fill + 1000):
+        update(i * PERIOD, records[i % N][1])
+    lists = (_clock() - t0) * 1e3
+
+    ring = CaptureRing(int(window * 1000))
+    write = ring.write
+    for i in range(fill):
+        write(raws[i % N][0], i * PERIOD)
+    t0 = _clock()
+    for i in range(fill, fill + 1000):
+        write(raws[i % N][0], i * PERIOD)
+    rings = (_clock() - t0) * 1e3
+    print('{:6.0f} s {:8.2f} us/rep {:8.2f} us/rep'.format(window, lists, rings))
+
+# four controllers replayed in real time, rings filled by the driver and
+# read 30 times per second like sc-gyro-plot does
+rings = {}
+def factory(name):
+    rings[name] = CaptureRing(10000)
+    return (lambda sc, sci: None), None, None, []
+
+def opened(name, sc):
+    sc.setCapture(rings[name])
+
+manager = ControllerManager(ReplayBus(captures, speed=1.0), factory, rescan=None,
+                            on_open=opened)
+manager.scan()
+redraws = 0
+redraw_time = 0.0
+t0 = time.time()
+next_draw = t0
+while time.time() - t0 < 2.0:
+    manager.poll(max(0.0, next_draw - time.time()))
+    now = time.time()
+    if now >= next_draw:
+        start = _clock()
+        for ring in rings.values():
+            recs = ring.window(10.0)
+            recs = recs[recs['status'] == int(SCStatus.Input)]
+            for name in IMU:
+                recs[name].astype(float)
+        redraw_time += _clock() - start
+        redraws += 1
+        next_draw = now + 1.0 / 30
+stats = manager.stats()
+manager.close()
+# attached when opened, no report missed
+assert all(ring.count == stats[name]['received'] for name, ring in rings.items())
+print('4 controllers: {} redraws in 2 s, {:.0f} us to extract {} fields each'.format(
+    redraws, redraw_time * 1e6 / redraws, len(IMU)))
+
+for path in captures:
+    os.remove(path)
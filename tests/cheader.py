@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""
+Compare the line oriented and the shlex #define extractors: same values
+for the defines both find, the line oriented one also follows the
+includes the shlex one misses. Defines that can not be evaluated are
+skipped by both.
+"""
+
+import os
+import sys
+import shutil
+import timeit
+import tempfile
+from steamcontroller.cheader import defines
+
+N = 20
+
+base = '/usr/include'
+headers = sys.argv[1:] or ['linux/input.h', 'linux/input-event-codes.h']
+
+for header in headers:
+    results = {}
+    for parser in ('shlex', 'lines'):
+        results[parser] = defines(base, header, parser=parser)
+        dt = timeit.timeit(lambda: defines(base, header, parser=parser), number=N) / N
+        print('{:28s} {:6s}: {:4d} defines {:8.2f} ms'.format(
+            header, parser, len(results[parser]), dt * 1e3))
+    common = [k for k in results['shlex'] if k in results['lines']]
+    assert len(common) == len(results['shlex']), \
+        [k for k in results['shlex'] if k not in results['lines']]
+    different = [k for k in common if results['shlex'][k] != results['lines'][k]]
+    assert not different, different
+    print('{:28s} {} common defines, identical'.format(header, len(common)))
+
+if not sys.argv[1:]:
+    # input.h defines the event codes through an include
+    lines = defines(base, 'linux/input.h', parser='lines')
+    assert all(name in lines for name in ('KEY_A', 'BTN_A', 'ABS_X', 'INPUT_PROP_POINTER'))
+    assert len(lines) > len(defines(base, 'linux/input.h', parser='shlex'))
+
+tmp = tempfile.mkdtemp()
+with open(os.path.join(tmp, 'bad.h'), 'w') as f:
+    f.write('#define NEGATIVE_SHIFT (1 << -1)\n'
+            '#define HUGE_SHIFT (1 << 100000000000000000000)\n'
+            '#define DIVIDED (1 / 0)\n'
+            '#define GOOD (1 << 4)\n')
+for parser in ('shlex', 'lines'):
+    assert dict(defines(tmp, 'bad.h', parser=parser)) == {'GOOD': 16}, parser
+shutil.rmtree(tmp)
+print('malformed defines skipped')
@@ -0,0 +1,78 @@
+"""
+Helpers shared by the tests: fake output devices and synthetic captures.
+Tests are run as scripts from any directory, this directory is then the
+first one of sys.path.
+"""
+
+import os
+import random
+from steamcontroller import SCStatus, SCButtons
+from steamcontroller.capture import open_capture
+from steamcontroller.decoder import REPORT_STRUCT
+from steamcontroller.uinput import UInput, loadLib
+
+REPORT_PERIOD = 0.004
+
+class FakeUInput(UInput):
+    """UInput writing to an arbitrary fd instead of /dev/uinput"""
+
+    def __init__(self, fd):
+        self._lib = loadLib()
+        self._fd = fd
+        self._initFrame()
+
+    def __del__(self):
+        os.close(self._fd)
+
+class FakeDevice(object):
+    """Records flushed events"""
+
+    def __init__(self):
+        self.events = []
+        self._queue = []
+
+    def queueKey(self, code, val):
+        self._queue.append((code, val))
+
+    def queueAxis(self, code, val):
+        self._queue.append((code, val))
+
+    def queueRel(self, code, val):
+        self._queue.append((code, val))
+
+    def flush(self):
+        self.events.extend(self._queue)
+        self._queue = []
+
+    def setLatencyRecorder(self, recorder):
+        pass
+
+def report(seq, buttons=0, ltrig=0, rtrig=0, lpad_x=0, lpad_y=0, rpad_x=0, rpad_y=0,
+           gpitch=0, groll=0, gyaw=0, q1=0, q2=0, q3=0, q4=0, status=SCStatus.Input):
+    """Raw report, an input one by default"""
+    return REPORT_STRUCT.pack(status, seq & 0xffff, buttons, ltrig, rtrig,
+                              lpad_x, lpad_y, rpad_x, rpad_y,
+                              gpitch, groll, gyaw, q1, q2, q3, q4)
+
+def write_capture(path, reports, period=REPORT_PERIOD):
+    """Capture file of raw reports, one every period seconds"""
+    cap = open_capture(path, 'w')
+    for i, raw in enumerate(reports):
+        cap.write(raw, timestamp=i * period)
+    cap.close()
+
+def synthetic(path, count, seed=0, period=REPORT_PERIOD):
+    """Mostly idle controller with a button change or pad move every 20 reports"""
+    rnd = random.Random(seed)
+
+    def reports():
+        buttons = 0
+        lpad = rpad = 0
+        for i in range(count):
+            if i % 20 == 0:
+                buttons ^= rnd.choice(list(SCButtons))
+                lpad = rnd.randint(-32768, 32767)
+                rpad = rnd.randint(-32768, 32767)
+            yield report(i, buttons, ltrig=i % 7, lpad_x=lpad, lpad_y=lpad // 2, rpad_x=rpad)
+
+    write_capture(path, reports(), period)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+ControlQueue with a fake clock and a fake asynchronous submit: coalescing
+(including a high priority push replacing a waiting normal one), priority
+order, min_interval pacing and completion before the next send.
+"""
+
+from steamcontroller.control import ControlQueue, PRIORITY_HIGH, PRIORITY_NORMAL
+
+class Clock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+sent = []
+pending = []
+
+def submit(data, callback, timeout):
+    sent.append(data)
+    pending.append(callback)
+    return True
+
+def complete(ok=True):
+    pending.pop(0)(ok)
+
+def drain(queue, clock):
+    """Send everything, completing each transfer at once"""
+    while len(queue):
+        delay = queue.pump()
+        if pending:
+            complete()
+        if delay:
+            clock.now += delay
+
+clock = Clock()
+queue = ControlQueue(submit, maxlen=3, min_interval=0.004, clock=clock)
+
+# coalescing: the last data of a key is sent, at the place of the first push
+queue.push(b'lpad1', key='lpad')
+queue.push(b'rpad1', key='rpad')
+queue.push(b'lpad2', key='lpad')
+assert len(queue) == 2 and queue.stats()['coalesced'] == 1
+drain(queue, clock)
+assert sent == [b'lpad2', b'rpad1'], sent
+print('coalescing ok')
+
+# priority: high messages first, a high push coalesced with a waiting
+# normal message moves it to the high queue
+del sent[:]
+clock.now += 1.0
+queue.push(b'normal1')
+queue.push(b'pulse', key='lpad')
+queue.push(b'config1', priority=PRIORITY_HIGH)
+queue.push(b'config2', key='lpad', priority=PRIORITY_HIGH)
+queue.push(b'late', key='lpad', priority=PRIORITY_NORMAL)
+drain(queue, clock)
+assert sent == [b'config1', b'late', b'normal1'], sent
+print('priority ok')
+
+# full normal queue drops the oldest message, never a high one
+del sent[:]
+clock.now += 1.0
+for i in range(5):
+    queue.push(str(i).encode(), priority=PRIORITY_NORMAL if i else PRIORITY_HIGH)
+assert queue.stats()['dropped'] == 1
+drain(queue, clock)
+assert sent == [b'0', b'2', b'3', b'4'], sent
+print('overflow ok')
+
+# pacing: nothing sent before min_interval, then one message at a time
+del sent[:]
+clock.now += 1.0
+queue.push(b'a')
+queue.push(b'b')
+assert queue.pump() == 0.004 and sent == [b'a']
+complete()
+clock.now += 0.001
+delay = queue.pump()
+assert abs(delay - 0.003) < 1e-9 and sent == [b'a'], (delay, sent)
+clock.now += delay
+assert queue.pump() is None and sent == [b'a', b'b']
+complete()
+print('pacing ok')
+
+# async completion: no send while a transfer is in flight, failures counted
+del sent[:]
+clock.now += 1.0
+queue.push(b'x')
+queue.push(b'y')
+queue.pump()
+clock.now += 1.0
+assert queue.pump() is None and sent == [b'x']
+complete(False)
+assert queue.pump() is None and sent == [b'x', b'y']
+complete()
+stats = queue.stats()
+assert stats['failed'] == 1 and stats['depth'] == 0, stats
+print('completion ok')
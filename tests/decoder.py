@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+"""Compare reports/second of the precompiled decoder against the legacy path"""
+
+import struct
+import timeit
+from steamcontroller.decoder import \
+    STEAM_CONTROLER_FORMAT, \
+    SteamControllerInput, \
+    SteamControllerState, \
+    REPORT_SIZE, \
+    decode, \
+    decode_batch
+
+_FORMATS = [x for x, _ in STEAM_CONTROLER_FORMAT]
+
+N = 100000
+BATCH = 256
+
+report = bytearray(range(REPORT_SIZE))
+batch = report * BATCH
+
+def legacy():
+    return SteamControllerInput._make(struct.unpack('<' + ''.join(_FORMATS), bytes(report)))
+
+assert legacy() == decode(report)
+assert decode_batch(batch)[-1] == decode(report)
+
+# equality with reports, not with unrelated objects
+state = SteamControllerState()
+state.update(report)
+assert state == decode(report) and state == list(decode(report)) and state == state.copy()
+assert state != None and state != 0 and not state == object()
+
+t_legacy = timeit.timeit(legacy, number=N)
+t_decode = timeit.timeit(lambda: decode(report), number=N)
+state = SteamControllerState()
+t_state = timeit.timeit(lambda: state.update(report), number=N)
+# normalized to the time needed to decode N reports
+t_batch = timeit.timeit(lambda: decode_batch(batch), number=N // BATCH) * N / (N // BATCH * BATCH)
+
+print('legacy unpack : {:10.0f} reports/s'.format(N / t_legacy))
+print('decode        : {:10.0f} reports/s ({:.2f}x)'.format(N / t_decode, t_legacy / t_decode))
+print('state update  : {:10.0f} reports/s ({:.2f}x)'.format(N / t_state, t_legacy / t_state))
+print('decode_batch  : {:10.0f} reports/s ({:.2f}x)'.format(N / t_batch, t_legacy / t_batch))
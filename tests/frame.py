@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""
+Compare per event writes with batched frames on a fake uinput fd (/dev/null)
+
+Write syscalls are counted from /proc/self/io
+"""
+
+import os
+import time
+from steamcontroller.uinput import Keys, Axes
+from common import FakeUInput
+
+N = 20000
+
+def syscw():
+    with open('/proc/self/io') as f:
+        for line in f:
+            if line.startswith('syscw'):
+                return int(line.split()[1])
+
+xb = FakeUInput(os.open(os.devnull, os.O_WRONLY))
+
+keys = [Keys.BTN_A, Keys.BTN_B, Keys.BTN_X, Keys.BTN_Y]
+axes = [Axes.ABS_X, Axes.ABS_Y, Axes.ABS_RX, Axes.ABS_RY]
+
+def single(i):
+    for k in keys:
+        xb.keyEvent(k, i & 1)
+    for a in axes:
+        xb.axisEvent(a, i)
+    xb.synEvent()
+
+def batched(i):
+    for k in keys:
+        xb.queueKey(k, i & 1)
+    for a in axes:
+        xb.queueAxis(a, i)
+    xb.flush()
+
+for name, func in (('single', single), ('batched', batched)):
+    w0 = syscw()
+    t0 = time.time()
+    for i in range(N):
+        func(i)
+    dt = time.time() - t0
+    print('{:8s}: {:5.2f} writes/frame {:7.2f} us/frame'.format(
+        name, float(syscw() - w0) / N, dt * 1e6 / N))
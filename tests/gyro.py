@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+Gyro pipeline on a synthetic capture: still with a rate bias, a quarter
+turn of yaw at 90 deg/s, still again. The quaternion follows the true
+rotation, the rates have the bias and some noise.
+
+ - the mouse must move by the quarter turn (MOUSE_SCALE counts / rad)
+   and stay quiet once the bias is learned
+ - the stick must deflect by 90 / 360 of its range while turning and be
+   centered on release
+ - the gyro is enabled once per controller connection
+ - no allocation per report, and the per report cost (replayed) must be a
+   small part of the report period
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from math import pi, cos, sin, radians
+from steamcontroller import SteamController, config_message
+from steamcontroller.transport import ReplayTransport
+from steamcontroller.mapping import compile_config, MappingEngine, MOUSE, GAMEPAD
+from steamcontroller.gyro import GyroFilter, GyroMouse, GyroStick, GYRO_RATE_SCALE, \
+    MOUSE_SCALE, REPORT_PERIOD
+from steamcontroller.uinput import REL_X, REL_Y, ABS_RX, ABS_RY
+from steamcontroller import vdf
+from common import FakeDevice, report, write_capture
+
+STILL = 1000
+TURN = 250
+BIAS = 25
+RATE = radians(90.0)
+
+CONFIG = """
+"controller_mappings"
+{
+    "group" { "id" "0" "mode" "absolute_mouse" "settings" { "sensitivity" "100" } }
+    "group" { "id" "1" "mode" "joystick_camera" }
+    "preset"
+    {
+        "id"    "0"
+        "group_source_bindings" { "%s" "gyro active" }
+    }
+}
+"""
+
+class NullDevice(object):
+
+    def queueRel(self, code, val):
+        pass
+
+    def queueAxis(self, code, val):
+        pass
+
+    def flush(self):
+        pass
+
+def synthetic(path):
+    rnd = random.Random(1)
+
+    def reports():
+        angle = 0.0
+        i = 0
+        for count, rate in ((STILL, 0.0), (TURN, RATE), (STILL, 0.0)):
+            for _ in range(count):
+                angle += rate * REPORT_PERIOD
+                gyaw = int(round(rate / GYRO_RATE_SCALE)) + BIAS + rnd.randint(-10, 10)
+                yield report(i, gpitch=rnd.randint(-10, 10), groll=rnd.randint(-10, 10),
+                             gyaw=gyaw, q1=int(32767 * cos(angle / 2)),
+                             q4=int(32767 * sin(angle / 2)))
+                i += 1
+
+    write_capture(path, reports(), REPORT_PERIOD)
+
+fd, capture = tempfile.mkstemp(suffix='.sccap')
+os.close(fd)
+synthetic(capture)
+
+reports = []
+def collect(sc, sci):
+    reports.append(sci.values())
+SteamController(callback=collect, transport=ReplayTransport(capture, speed=None)).run()
+
+def run_engine(group):
+    table = compile_config(vdf.loads(CONFIG % group))
+    assert not table.unsupported, table.unsupported
+    dev = FakeDevice()
+    engine = MappingEngine(table, {MOUSE: dev, GAMEPAD: dev})
+    sc = SteamController(callback=engine.callback,
+                         transport=ReplayTransport(capture, speed=None))
+    sc.run()
+    return engine, dev, sc.transport.controls
+
+# mouse
+engine, dev, controls = run_engine(0)
+assert controls.count(config_message(gyro=True) + b'\0' * 40) == 1, controls
+moved = sum(v for c, v in dev.events if c == REL_X)
+expected = -MOUSE_SCALE * pi / 2
+assert abs(moved - expected) < 0.03 * abs(expected), (moved, expected)
+assert abs(sum(v for c, v in dev.events if c == REL_Y)) < 0.01 * abs(expected)
+filt = GyroFilter()
+for values in reports:
+    filt.update(values)
+assert abs(filt.bias_yaw - BIAS) < 0.25 * BIAS, filt.bias_yaw
+print('mouse: {} counts for a quarter turn (expected {:.0f}), bias {:.1f}'.format(
+    moved, expected, filt.bias_yaw))
+
+# stick
+engine, dev, _ = run_engine(1)
+turning = [v for c, v in dev.events if c == ABS_RX]
+peak = min(turning)
+assert abs(peak + 32767 / 4.0) < 0.05 * 32767 / 4.0, peak
+engine.release()
+assert dev.events[-1][1] == 0 and dev.events[-2][1] == 0, dev.events[-2:]
+print('stick: peak deflection {} (expected {:.0f})'.format(peak, -32767 / 4.0))
+
+# allocations
+out = GyroMouse(NullDevice(), (REL_X, REL_Y))
+for values in reports:
+    out.update(values)
+blocks = sys.getallocatedblocks()
+for values in reports:
+    out.update(values)
+blocks = sys.getallocatedblocks() - blocks
+assert blocks < 10, blocks
+print('{} blocks allocated for {} reports'.format(blocks, len(reports)))
+
+# per report cost
+_clock = getattr(time, 'perf_counter', time.time)
+outputs = (
+    ('filter', GyroFilter()),
+    ('mouse', GyroMouse(NullDevice(), (REL_X, REL_Y))),
+    ('stick', GyroStick(NullDevice(), (ABS_RX, ABS_RY))),
+)
+for name, out in outputs:
+    update = out.update
+    t0 = _clock()
+    for _ in range(10):
+        for values in reports:
+            update(values)
+    cost = (_clock() - t0) * 1e6 / (10 * len(reports))
+    print('{:8s} {:6.2f} us/report ({:.2f}% of the report period)'.format(
+        name, cost, cost * 1e-4 / REPORT_PERIOD))
+
+def bench(callback):
+    sc = SteamController(callback=callback, transport=ReplayTransport(capture, speed=None))
+    t0 = _clock()
+    sc.run()
+    return (_clock() - t0) * 1e6 / sc.stats()['received']
+
+base = bench(lambda sc, sci: None)
+for group, dev in ((0, NullDevice()), (1, NullDevice())):
+    engine = MappingEngine(compile_config(vdf.loads(CONFIG % group)), {MOUSE: dev, GAMEPAD: dev})
+    total = bench(engine.callback)
+    print('replay {:5s} {:6.2f} us/report, {:6.2f} us over the bare replay'.format(
+        ('mouse', 'stick')[group], total, total - base))
+
+os.remove(capture)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""
+Latency instrumentation: histogram buckets and percentiles on known
+values, stage attribution with a fake clock, then the overhead with a
+fake report source and a fake uinput sink (/dev/null)
+"""
+
+import os
+import time
+import random
+from array import array
+from steamcontroller.uinput import Keys
+from steamcontroller.latency import LatencyRecorder, Histogram, SUB_BITS, MAX_BITS
+from common import FakeUInput
+
+N = 50000
+
+# exact below 2**SUB_BITS
+hist = Histogram()
+for val in range(1 << SUB_BITS):
+    hist.record(val)
+assert hist.percentile(50) == (1 << SUB_BITS) // 2 - 1, hist.percentile(50)
+assert hist.percentile(100) == (1 << SUB_BITS) - 1 and hist.min == 0
+assert (hist.count, hist.total) == (1 << SUB_BITS, sum(range(1 << SUB_BITS)))
+
+# then buckets of 2**(SUB_BITS-1) per power of two: a percentile is the
+# lower bound of its bucket, at most 1/2**(SUB_BITS-1) below the value
+def single(val):
+    hist = Histogram()
+    hist.record(0)
+    hist.record(val)
+    return hist.percentile(100)
+
+for val in ((1 << SUB_BITS), (1 << SUB_BITS) + 1, (1 << (SUB_BITS + 1)) - 1):
+    assert single(val) == val & ~1, (val, single(val))
+assert single(1 << (SUB_BITS + 1)) == 1 << (SUB_BITS + 1)
+assert single((1 << (SUB_BITS + 1)) + 3) == 1 << (SUB_BITS + 1)
+rnd = random.Random(0)
+for _ in range(10000):
+    val = rnd.randint(0, (1 << MAX_BITS) - 1)
+    low = single(val)
+    assert low <= val and val - low <= val >> (SUB_BITS - 1), (val, low)
+
+# above 2**MAX_BITS values go to the last bucket, negative ones are 0
+hist = Histogram()
+hist.record(-5)
+hist.record(1 << (MAX_BITS + 10))
+assert hist.min == 0 and hist.max == 1 << (MAX_BITS + 10)
+assert hist.percentile(50) == 0 and hist.percentile(100) >= 1 << (MAX_BITS - 1)
+
+# mixed samples: 90 x 10 us and 10 x 1000 us
+counts = array('L', [0] * Histogram.SIZE)
+hist = Histogram(counts)
+for val in [10] * 90 + [1000] * 10:
+    hist.record(val)
+assert (hist.percentile(50), hist.percentile(90), hist.percentile(99)) == (10, 10, 992)
+assert hist.mean() == 109.0 and (hist.min, hist.max) == (10, 1000)
+
+# same buckets read from another buffer, values become bucket bounds
+shared = Histogram(counts)
+assert (shared.count, shared.min, shared.max) == (100, 10, 992)
+assert shared.percentile(99) == 992
+print('histogram ok')
+
+class Clock(object):
+    """Fake time, in 1/1024 s ticks so differences are exact"""
+    ticks = 0
+
+    def __call__(self):
+        return self.ticks / 1024.0
+
+def us(ticks):
+    return int(ticks * 1e6 / 1024)
+
+def stages(rec):
+    return dict((name, (hist.count, hist.max)) for name, hist in rec.histograms.items())
+
+# arrival, callback, flush
+clock = Clock()
+rec = LatencyRecorder(clock=clock)
+for ticks, event in ((0, rec.arrival), (1, rec.enter), (3, rec.leave),
+                     (4, rec.flushing), (6, rec.flushed)):
+    clock.ticks = ticks
+    event()
+assert stages(rec) == {'dispatch': (1, us(1)), 'mapper': (1, us(2)),
+                       'output': (1, us(3)), 'total': (1, us(6))}, stages(rec)
+# only the first flush after arrival counts
+clock.ticks = 10
+rec.flushing()
+rec.flushed()
+assert rec.histograms['total'].count == 1
+
+# mapper flushing itself: the mapper stage ends when the flush starts
+rec.reset()
+for ticks, event in ((0, rec.arrival), (2, rec.enter), (5, rec.flushing),
+                     (6, rec.flushed), (7, rec.leave)):
+    clock.ticks = ticks
+    event()
+assert stages(rec) == {'dispatch': (1, us(2)), 'mapper': (1, us(3)),
+                       'output': (1, us(1)), 'total': (1, us(6))}, stages(rec)
+
+# flush without callback: total only
+rec.reset()
+for ticks, event in ((0, rec.arrival), (4, rec.flushed)):
+    clock.ticks = ticks
+    event()
+assert stages(rec) == {'dispatch': (0, None), 'mapper': (0, None),
+                       'output': (0, None), 'total': (1, us(4))}, stages(rec)
+assert rec.recent() == [4 / 1024.0]
+print('stages ok')
+
+def run(xb, rec):
+    t0 = time.time()
+    for i in range(N):
+        if rec is not None:
+            rec.arrival()
+            rec.enter()
+        xb.queueKey(Keys.BTN_A, i & 1)
+        if rec is not None:
+            rec.leave()
+        xb.flush()
+    return (time.time() - t0) * 1e6 / N
+
+xb = FakeUInput(os.open(os.devnull, os.O_WRONLY))
+rec = LatencyRecorder()
+disabled = run(xb, None)
+assert all(hist.count == 0 for hist in rec.histograms.values())
+
+xb.setLatencyRecorder(rec)
+enabled = run(xb, rec)
+assert all(hist.count == N for hist in rec.histograms.values()), stages(rec)
+assert len(rec.recent()) == 1024
+
+# disabled again: the recorder is left untouched
+xb.setLatencyRecorder(None)
+run(xb, None)
+assert all(hist.count == N for hist in rec.histograms.values()), stages(rec)
+
+print(rec.summary())
+print('disabled: {:6.2f} us/report'.format(disabled))
+print('enabled : {:6.2f} us/report (+{:.2f} us)'.format(enabled, enabled - disabled))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+Several controllers in one process without hardware (ReplayBus)
+
+ - each controller must produce exactly the events it produces alone
+ - a controller plugged while running is picked by the next scan, a
+   controller whose capture ends is released and reported as lost
+ - CPU time per report must stay the same when controllers are added
+"""
+
+import os
+import time
+import tempfile
+from steamcontroller import SteamController
+from steamcontroller.transport import ReplayTransport, ReplayBus
+from steamcontroller.mapping import compile_config, MappingEngine, GAMEPAD, XBOX360_CONFIG
+from steamcontroller.manager import ControllerManager
+from steamcontroller import vdf
+from common import FakeDevice, FakeUInput, synthetic
+
+N = 5000
+COUNTS = (1, 2, 4, 8)
+REALTIME = 1.0
+
+_clock = getattr(time, 'process_time', time.time)
+
+table = compile_config(vdf.loads(XBOX360_CONFIG))
+captures = []
+for seed in range(max(COUNTS)):
+    fd, path = tempfile.mkstemp(suffix='.sccap')
+    os.close(fd)
+    synthetic(path, N, seed)
+    captures.append(path)
+
+def alone(path):
+    dev = FakeDevice()
+    engine = MappingEngine(table, {GAMEPAD: dev})
+    SteamController(callback=engine.callback,
+                    transport=ReplayTransport(path, speed=None)).run()
+    engine.release()
+    return dev.events
+
+def recording_factory(devices):
+    def factory(name):
+        dev = FakeDevice()
+        devices[name] = dev
+        engine = MappingEngine(table, {GAMEPAD: dev})
+        return engine.callback, None, engine.release, [dev]
+    return factory
+
+# isolation
+devices = {}
+bus = ReplayBus(captures, speed=None)
+manager = ControllerManager(bus, recording_factory(devices), rescan=None)
+manager.run()
+for idx, path in enumerate(captures):
+    assert devices['replay{}'.format(idx)].events == alone(path), idx
+print('{} controllers isolated ok'.format(len(captures)))
+
+# plug and unplug while running
+devices = {}
+bus = ReplayBus(captures[:1], speed=4.0)
+manager = ControllerManager(bus, recording_factory(devices), rescan=0.05)
+manager.scan()
+t0 = time.time()
+while time.time() - t0 < 0.2:
+    manager.poll()
+bus.add(captures[1])
+while time.time() - t0 < 0.4:
+    manager.poll()
+assert manager.controllers() == ['replay0', 'replay1'], manager.controllers()
+stats = manager.stats()
+manager.close()
+assert all(s['received'] > 0 for s in stats.values()), stats
+stats = manager.stats()
+assert not any(s['connected'] for s in stats.values()), stats
+# outputs released when lost: the last events center everything
+assert devices['replay0'].events[-1][1] == 0, devices['replay0'].events[-1]
+print('plug / unplug ok')
+
+# scaling
+def xbox_factory(name):
+    engine = MappingEngine(table, {GAMEPAD: FakeUInput(os.open(os.devnull, os.O_WRONLY))})
+    return engine.callback, None, engine.release, engine.devices()
+
+print('{:>5s} {:>14s} {:>14s} {:>10s} {:>10s}'.format(
+    'ctrl', 'max speed', 'real time', 'p50', 'p99'))
+for count in COUNTS:
+    manager = ControllerManager(ReplayBus(captures[:count], speed=None), xbox_factory,
+                                rescan=None)
+    c0 = _clock()
+    manager.run()
+    received = sum(s['received'] for s in manager.stats().values())
+    per_report = (_clock() - c0) * 1e6 / received
+
+    manager = ControllerManager(ReplayBus(captures[:count], speed=1.0), xbox_factory,
+                                latency=True, rescan=None)
+    manager.scan()
+    c0 = _clock()
+    t0 = time.time()
+    while time.time() - t0 < REALTIME:
+        manager.poll(REALTIME)
+    cpu = (_clock() - c0) / (time.time() - t0) * 100 / count
+    stats = list(manager.stats().values())
+    manager.close()
+    print('{:5d} {:8.2f} us/rep {:7.2f} %/ctrl {:7d} us {:7d} us'.format(
+        count, per_report, cpu,
+        max(s['latency_p50'] for s in stats), max(s['latency_p99'] for s in stats)))
+
+for path in captures:
+    os.remove(path)
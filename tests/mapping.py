@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+Compare the vdf driven mapping engine with the hard coded sc-xbox mapper
+on a replayed capture, both writing to a fake uinput fd (/dev/null)
+
+usage: mapping.py [capture]   (a synthetic capture is generated if omitted)
+"""
+
+import os
+import sys
+import time
+import runpy
+import tempfile
+from steamcontroller import SteamController, SCStatus, SCButtons
+from steamcontroller.decoder import SteamControllerInput
+from steamcontroller.transport import ReplayTransport
+from steamcontroller.uinput import ABS_HAT0X, ABS_HAT0Y
+from steamcontroller.mapping import compile_config, MappingEngine, GAMEPAD, XBOX360_CONFIG
+from steamcontroller import vdf
+from common import FakeUInput, synthetic
+
+N = 50000
+
+def bench(path, callback, callback_args=None):
+    sc = SteamController(callback=callback, callback_args=callback_args,
+                         transport=ReplayTransport(path, speed=None))
+    t0 = time.time()
+    sc.run()
+    return (time.time() - t0) * 1e6 / sc.stats()['received']
+
+if len(sys.argv) > 1:
+    capture = sys.argv[1]
+else:
+    fd, capture = tempfile.mkstemp(suffix='.sccap')
+    os.close(fd)
+    synthetic(capture, N)
+
+t0 = time.time()
+table = compile_config(vdf.loads(XBOX360_CONFIG))
+print('compile       : {:8.2f} ms'.format((time.time() - t0) * 1e3))
+assert not table.unsupported, table.unsupported
+
+# dpad: a direct change to the opposite direction must not end centered,
+# both directions share a hat axis
+DPAD_CONFIG = """
+"controller_mappings"
+{
+    "group"
+    {
+        "id"    "0"
+        "mode"  "dpad"
+        "inputs"
+        {
+            "dpad_north" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_UP" } } } }
+            "dpad_south" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_DOWN" } } } }
+            "dpad_east"  { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_RIGHT" } } } }
+            "dpad_west"  { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button DPAD_LEFT" } } } }
+        }
+    }
+    "preset" { "id" "0" "group_source_bindings" { "0" "left_trackpad active" } }
+}
+"""
+
+class HatDevice(object):
+    """Last value of each axis"""
+
+    def __init__(self):
+        self.axes = {}
+
+    def queueAxis(self, code, val):
+        self.axes[code] = val
+
+    def flush(self):
+        pass
+
+def pad(x, y):
+    return SteamControllerInput._make((0,) * len(SteamControllerInput._fields))._replace(
+        status=SCStatus.Input, buttons=SCButtons.LPadTouch, lpad_x=x, lpad_y=y)
+
+hat = HatDevice()
+dpad = MappingEngine(compile_config(vdf.loads(DPAD_CONFIG)), {GAMEPAD: hat})
+dpad.process(pad(0, -30000))
+assert hat.axes[ABS_HAT0Y] == 1, hat.axes
+dpad.process(pad(0, 30000))
+assert hat.axes[ABS_HAT0Y] == -1, hat.axes
+dpad.process(pad(-30000, 0))
+assert hat.axes == {ABS_HAT0Y: 0, ABS_HAT0X: -1}, hat.axes
+dpad.process(pad(30000, 0))
+assert hat.axes[ABS_HAT0X] == 1, hat.axes
+print('dpad reversal ok')
+
+# malformed configurations
+for bad in ('"controller_mappings" { "group" "x" "preset" { "id" "0" } }',
+            '"controller_mappings" { "preset" "x" }',
+            '"controller_mappings" { "group" { "id" "0" "inputs" "x" } '
+            '"preset" { "id" "0" "group_source_bindings" { "0" "button_diamond active" } } }',
+            '"controller_mappings" { "group" { "id" "0" } "preset" { "group_source_bindings" "x" } }'):
+    try:
+        compile_config(vdf.loads(bad))
+    except ValueError:
+        pass
+    else:
+        assert False, bad
+print('malformed configurations ok')
+
+xbox = runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   '..', 'scripts', 'sc-xbox.py'))
+
+xb = FakeUInput(os.open(os.devnull, os.O_WRONLY))
+engine = MappingEngine(table, {GAMEPAD: xb})
+
+def null(sc, sci):
+    pass
+
+print('null callback : {:8.2f} us/report'.format(bench(capture, null)))
+print('sc-xbox       : {:8.2f} us/report'.format(bench(capture, xbox['scInput2Uinput'], [xb])))
+print('vdf engine    : {:8.2f} us/report'.format(bench(capture, engine.callback)))
+
+if len(sys.argv) == 1:
+    os.remove(capture)
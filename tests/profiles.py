@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+Mapping profile cache and hot reload
+
+Compares compiling a configuration with loading it from the memory and
+disk caches, then swaps tables while reports keep coming: the buttons held
+with the old table must be released and the new table must map the very
+next report.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+from steamcontroller import SCStatus, SCButtons
+from steamcontroller.decoder import SteamControllerInput
+from steamcontroller.mapping import MappingEngine, GAMEPAD
+from steamcontroller.profiles import ProfileCache, ProfileWatcher, summary
+from steamcontroller.uinput import BTN_A, BTN_B, ABS_X, ABS_Y
+from common import FakeDevice
+
+CONFIG = """
+"controller_mappings"
+{
+    "version"   "2"
+    "group"
+    {
+        "id"    "0"
+        "mode"  "four_buttons"
+        "inputs"
+        {
+            "button_a" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button %s" } } } }
+        }
+    }
+    "group" { "id" "1" "mode" "joystick_move" }
+    "preset"
+    {
+        "id"    "0"
+        "name"  "Default"
+        "group_source_bindings"
+        {
+            "0" "button_diamond active"
+            "1" "joystick active"
+        }
+    }
+}
+"""
+
+N = 1000
+
+def report(buttons, lpad_x=0):
+    values = [0] * len(SteamControllerInput._fields)
+    values[SteamControllerInput._fields.index('status')] = SCStatus.Input
+    values[SteamControllerInput._fields.index('buttons')] = buttons
+    values[SteamControllerInput._fields.index('lpad_x')] = lpad_x
+    return tuple(values)
+
+def write(path, button):
+    with open(path, 'w') as f:
+        f.write(CONFIG % button)
+
+def timed(func, *args):
+    t0 = time.time()
+    ret = func(*args)
+    return (time.time() - t0) * 1e3, ret
+
+tmp = tempfile.mkdtemp()
+path = os.path.join(tmp, 'config.vdf')
+write(path, 'A')
+
+# cache levels
+t_compile, table = timed(ProfileCache(tmp).get, path)
+cache = ProfileCache(tmp)
+t_disk, table2 = timed(cache.get, path)
+t_mem, table3 = timed(cache.get, path)
+assert table == table2 == table3
+assert cache.stats()['disk_hits'] == 1 and cache.stats()['hits'] == 1
+print('compile     : {:8.3f} ms'.format(t_compile))
+print('disk cache  : {:8.3f} ms'.format(t_disk))
+print('memory hit  : {:8.3f} ms'.format(t_mem))
+
+# synchronous swap
+watcher = ProfileWatcher(path, cache=cache)
+assert watcher.check() is None
+dev = FakeDevice()
+engine = MappingEngine(watcher.table(), {GAMEPAD: dev})
+engine.process(report(SCButtons.A, 1000))
+assert dev.events == [(BTN_A, 1), (ABS_X, 1000), (ABS_Y, 0)], dev.events
+
+write(path, 'B')
+os.utime(path, (time.time() + 1, time.time() + 1))
+new = watcher.check()
+assert new is not None
+engine.setTable(new)
+dev.events = []
+engine.process(report(SCButtons.A, 1000))
+assert dev.events == [(BTN_A, 0), (ABS_X, 0), (BTN_B, 1), (ABS_X, 1000), (ABS_Y, 0)], dev.events
+
+# unchanged content (touch) and broken file keep the current table
+os.utime(path, (time.time() + 2, time.time() + 2))
+assert watcher.check() is None
+with open(path, 'w') as f:
+    f.write('"controller_mappings" {')
+os.utime(path, (time.time() + 3, time.time() + 3))
+assert watcher.check() is None and watcher.errors == 1
+assert watcher.table() is new
+print('swap ok')
+
+# threaded watcher, reports every 4 ms while the file changes
+write(path, 'A')
+watcher = ProfileWatcher(path, cache=cache, interval=0.01)
+dev = FakeDevice()
+engine = MappingEngine(watcher.table(), {GAMEPAD: dev})
+watcher.start(engine.setTable)
+changes = 0
+for i in range(N):
+    if i % 100 == 50:
+        changes += 1
+        write(path, 'AB'[changes % 2])
+        os.utime(path, (time.time() + changes, time.time() + changes))
+    engine.process(report(SCButtons.A if i % 2 else 0))
+    time.sleep(0.004)
+watcher.stop()
+presses = [ev for ev in dev.events if ev[1] == 1]
+assert len(presses) >= N // 2, len(presses)
+assert engine.stats()['swaps'] == watcher.reloads == changes, (engine.stats(), watcher.stats())
+print(summary(watcher.stats(), engine.stats()))
+
+# tables set from another thread while reports are processed: the last
+# one set is the one installed, none is lost during a swap
+engine = MappingEngine(table, {GAMEPAD: FakeDevice()})
+tables = (table, new)
+def setter():
+    for i in range(20000):
+        engine.setTable(tables[i % 2])
+thread = threading.Thread(target=setter)
+thread.start()
+while thread.is_alive():
+    engine.process(report(SCButtons.A))
+thread.join()
+engine.process(report(0))
+assert engine.table() is tables[1], 'table set during a swap lost'
+print('concurrent setTable ok')
+
+# a structurally bad file does not stop the polling thread
+def wait(cond):
+    deadline = time.time() + 2.0
+    while not cond() and time.time() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+write(path, 'A')
+watcher = ProfileWatcher(path, cache=cache, interval=0.01)
+tables = []
+watcher.start(tables.append)
+with open(path, 'w') as f:
+    f.write('"controller_mappings" { "group" "x" "preset" "x" }')
+os.utime(path, (time.time() + 1, time.time() + 1))
+assert wait(lambda: watcher.errors == 1), watcher.stats()
+write(path, 'B')
+os.utime(path, (time.time() + 2, time.time() + 2))
+assert wait(lambda: len(tables) == 1), watcher.stats()
+watcher.stop()
+assert watcher.reloads == 1 and watcher.table() is tables[0]
+print('reload after a bad file ok')
+
+shutil.rmtree(tmp)
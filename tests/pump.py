@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+Differential test of the native event pump against the python reference
+implementation, followed by a throughput comparison
+
+Both pumps are fed the same reports and must write byte identical events.
+
+usage: pump.py [capture]   (synthetic reports are generated if omitted)
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from steamcontroller import SCStatus, SCButtons
+from steamcontroller.capture import open_capture
+from steamcontroller.pump import PumpTable, PyEventPump, NativeEventPump, available
+from steamcontroller.uinput import Keys, Axes
+from common import FakeUInput, report
+
+N = 50000
+
+def synthetic():
+    """Random button and axis changes, with a few non input reports"""
+    random.seed(0)
+    reports = []
+    buttons = 0
+    axes = [0] * 6
+    for i in range(N):
+        if i % 7 == 0:
+            buttons ^= random.choice(list(SCButtons))
+        if i % 3 == 0:
+            axes[random.randrange(6)] = random.randint(-32768, 32767)
+        status = SCStatus.Input if i % 50 else SCStatus.Idle
+        reports.append(report(i, buttons, axes[0] & 0xff, axes[1] & 0xff,
+                              axes[2], axes[3], axes[4], axes[5], status=status))
+    return reports
+
+def recorded(path):
+    cap = open_capture(path)
+    reports = [raw for _, raw in cap]
+    cap.close()
+    return reports
+
+table = PumpTable({
+    SCButtons.A: Keys.BTN_A,
+    SCButtons.B: Keys.BTN_B,
+    SCButtons.X: Keys.BTN_X,
+    SCButtons.Y: Keys.BTN_Y,
+    SCButtons.LB: Keys.BTN_TL,
+    SCButtons.RB: Keys.BTN_TR,
+    SCButtons.Back: Keys.BTN_SELECT,
+    SCButtons.Start: Keys.BTN_START,
+    SCButtons.Steam: Keys.BTN_MODE,
+    SCButtons.LPad: Keys.BTN_THUMBL,
+    SCButtons.RPad: Keys.BTN_THUMBR,
+    SCButtons.LGrip: Keys.BTN_A,
+    SCButtons.RGrip: Keys.BTN_B,
+}, {SCButtons.LPad: SCButtons.LPadTouch}, [
+    ('ltrig', Axes.ABS_Z, False, 0),
+    ('rtrig', Axes.ABS_RZ, False, 0),
+    ('lpad_x', Axes.ABS_X, False, 2000),
+    ('lpad_y', Axes.ABS_Y, True, 2000),
+    ('rpad_x', Axes.ABS_RX, False, 0),
+    ('rpad_y', Axes.ABS_RY, True, 0),
+])
+
+def run(pump_class, reports):
+    fd, path = tempfile.mkstemp()
+    xb = FakeUInput(fd)
+    pump = pump_class(table, xb)
+    rets = [pump.process(r) for r in reports]
+    del xb
+    with open(path, 'rb') as f:
+        data = f.read()
+    os.remove(path)
+    return rets, data, pump.stats()
+
+def bench(pump_class, reports):
+    xb = FakeUInput(os.open(os.devnull, os.O_WRONLY))
+    pump = pump_class(table, xb)
+    process = pump.process
+    t0 = time.time()
+    for r in reports:
+        process(r)
+    return (time.time() - t0) * 1e6 / len(reports)
+
+if not available():
+    print('libscpump not built, nothing to compare')
+    sys.exit(0)
+
+reports = recorded(sys.argv[1]) if len(sys.argv) > 1 else synthetic()
+
+py_rets, py_data, py_stats = run(PyEventPump, reports)
+c_rets, c_data, c_stats = run(NativeEventPump, reports)
+
+assert py_rets == c_rets, 'return values differ at report {}'.format(
+    next(i for i, (a, b) in enumerate(zip(py_rets, c_rets)) if a != b))
+assert py_data == c_data, 'written events differ'
+assert py_stats == c_stats, (py_stats, c_stats)
+print('{} reports, {} events, {} writes: identical'.format(
+    len(reports), py_stats['events'], py_stats['writes']))
+
+# short buffers are refused before reaching the C code
+pump = NativeEventPump(table, FakeUInput(os.open(os.devnull, os.O_WRONLY)))
+for call in (lambda: pump.process(reports[0][:32]),
+             lambda: pump.processBatch(b''.join(reports[:2]), 3)):
+    try:
+        call()
+    except ValueError:
+        pass
+    else:
+        assert False, 'short buffer accepted'
+assert pump.processBatch(b''.join(reports[:2]), 2) >= 0
+print('short buffers refused')
+
+py = bench(PyEventPump, reports)
+c = bench(NativeEventPump, reports)
+print('python : {:6.2f} us/report'.format(py))
+print('native : {:6.2f} us/report ({:.1f}x)'.format(c, py / c))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+Replay a capture through SteamController at max speed without hardware
+
+usage: replay.py [capture]   (a synthetic capture is generated if omitted)
+"""
+
+import os
+import sys
+import time
+import tempfile
+from steamcontroller import SteamController, SCButtons
+from steamcontroller.transport import ReplayTransport
+from steamcontroller.mapper import ButtonMapper
+from steamcontroller.latency import LatencyRecorder
+from steamcontroller.uinput import Keys, Axes
+from common import FakeUInput, synthetic
+
+N = 50000
+
+mapper = ButtonMapper({
+    SCButtons.A: Keys.BTN_A,
+    SCButtons.B: Keys.BTN_B,
+    SCButtons.X: Keys.BTN_X,
+    SCButtons.Y: Keys.BTN_Y,
+    SCButtons.LPad: Keys.BTN_THUMBL,
+}, {SCButtons.LPad: SCButtons.LPadTouch})
+
+def null(sc, sci):
+    pass
+
+def xbox(sc, sci, xb):
+    for ev in mapper.update(sci.buttons):
+        xb.queueKey(*ev)
+    if sci.lpad_x != sci.prev('lpad_x'):
+        xb.queueAxis(Axes.ABS_X, sci.lpad_x)
+    xb.flush()
+
+def bench(path, callback, callback_args=None, latency=None):
+    sc = SteamController(callback=callback, callback_args=callback_args,
+                         transport=ReplayTransport(path, speed=None))
+    if latency is not None:
+        sc.setLatencyRecorder(latency)
+    t0 = time.time()
+    sc.run()
+    dt = time.time() - t0
+    return sc.stats()['received'] / dt
+
+if len(sys.argv) > 1:
+    capture = sys.argv[1]
+else:
+    fd, capture = tempfile.mkstemp(suffix='.sccap')
+    os.close(fd)
+    synthetic(capture, N)
+
+xb = FakeUInput(os.open(os.devnull, os.O_WRONLY))
+rec = LatencyRecorder()
+xb.setLatencyRecorder(rec)
+
+print('null callback : {:10.0f} reports/s'.format(bench(capture, null)))
+print('xbox mapper   : {:10.0f} reports/s'.format(bench(capture, xbox, [xb])))
+print('with latency  : {:10.0f} reports/s'.format(bench(capture, xbox, [xb], rec)))
+print(rec.summary())
+
+if len(sys.argv) == 1:
+    os.remove(capture)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Supervised reconnection without hardware: the controller is a replayed
+capture that ends (unplugged) with a button held, and some connection
+attempts fail (not plugged yet). The uinput side must be the same object
+for the whole run, held buttons must be released on each disconnection.
+"""
+
+import os
+import time
+import tempfile
+from steamcontroller import SteamController, SCButtons
+from steamcontroller.transport import ReplayTransport
+from steamcontroller.mapping import MappingEngine, compile_config, GAMEPAD
+from steamcontroller.supervisor import Supervisor
+from steamcontroller.profiles import summary
+from steamcontroller.uinput import BTN_A
+from steamcontroller import vdf
+from common import FakeDevice, report, write_capture
+
+SESSIONS = 20
+REPORTS = 250
+
+CONFIG = """
+"controller_mappings"
+{
+    "group"
+    {
+        "id"    "0"
+        "mode"  "four_buttons"
+        "inputs"
+        {
+            "button_a" { "activators" { "Full_Press" { "bindings" { "binding" "xinput_button A" } } } }
+        }
+    }
+    "preset" { "id" "0" "group_source_bindings" { "0" "button_diamond active" } }
+}
+"""
+
+def synthetic(path):
+    """A pressed on the second half of the session, still held at the end"""
+    write_capture(path, (report(i, SCButtons.A if i >= REPORTS // 2 else 0)
+                         for i in range(REPORTS)))
+
+fd, capture = tempfile.mkstemp(suffix='.sccap')
+os.close(fd)
+synthetic(capture)
+
+dev = FakeDevice()
+engine = MappingEngine(compile_config(vdf.loads(CONFIG)), {GAMEPAD: dev})
+attempts = [0]
+sessions = [0]
+
+def connect():
+    attempts[0] += 1
+    # every other reconnection needs two attempts (dongle still resetting)
+    if sessions[0] % 2 and attempts[0] % 3:
+        raise ValueError('SteamControler Device not found')
+    sessions[0] += 1
+    if sessions[0] == SESSIONS:
+        supervisor.stop()
+    return SteamController(callback=engine.callback,
+                           transport=ReplayTransport(capture, speed=None))
+
+supervisor = Supervisor(connect, release=engine.release, backoff_min=0.001, backoff_max=0.004)
+t0 = time.time()
+supervisor.run()
+elapsed = time.time() - t0
+
+stats = supervisor.stats()
+assert stats['connects'] == stats['disconnects'] == SESSIONS, stats
+assert dev.events == [(BTN_A, 1), (BTN_A, 0)] * SESSIONS, dev.events
+print('{} sessions, {} failed attempts in {:.1f} ms'.format(SESSIONS, stats['failures'], elapsed * 1e3))
+print(summary(stats))
+
+os.remove(capture)
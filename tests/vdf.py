@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+Parse and write synthetic multi megabytes vdf files, throughput must stay
+the same when the size doubles (linear scaling)
+"""
+
+import io
+import os
+import time
+import tempfile
+from steamcontroller import vdf
+
+SIZES = (1, 2, 4, 8)
+
+def synthetic(path, size):
+    """localconfig.vdf like document of about size MB"""
+    with open(path, 'w') as f:
+        w = vdf.VDFWriter(f)
+        w.start('UserLocalConfigStore')
+        w.start('Software')
+        i = 0
+        while f.tell() < size << 20:
+            w.start(str(i))
+            w.value('LastPlayed', str(1440000000 + i))
+            w.value('Playtime', str(i % 1000))
+            w.value('name', 'Game "{}" \\ edition'.format(i))
+            w.start('cloud')
+            w.value('last_sync_state', 'synchronized')
+            w.end()
+            w.end()
+            i += 1
+        w.end()
+        w.end()
+
+def timed(func, *args):
+    t0 = time.time()
+    ret = func(*args)
+    return time.time() - t0, ret
+
+def count(path):
+    with open(path) as f:
+        return sum(1 for _ in vdf.iterparse(f))
+
+def load(path):
+    with open(path) as f:
+        return vdf.load(f)
+
+def loads(path):
+    with open(path) as f:
+        return vdf.loads(f.read())
+
+def dump(data):
+    with open(os.devnull, 'w') as f:
+        vdf.dump(data, f)
+
+fd, path = tempfile.mkstemp(suffix='.vdf')
+os.close(fd)
+
+print('{:>4s} {:>10s} {:>10s} {:>10s} {:>10s}'.format('MB', 'iterparse', 'load', 'loads', 'dump'))
+for size in SIZES:
+    synthetic(path, size)
+    mb = os.path.getsize(path) / float(1 << 20)
+    t_iter, events = timed(count, path)
+    t_load, data = timed(load, path)
+    t_loads, data2 = timed(loads, path)
+    t_dump, _ = timed(dump, data)
+    assert data == data2
+    out = io.StringIO()
+    vdf.dump(data, out)
+    assert vdf.loads(out.getvalue()) == data
+    print('{:4.0f} {:7.2f} MB/s {:7.2f} MB/s {:7.2f} MB/s {:7.2f} MB/s'.format(
+        mb, mb / t_iter, mb / t_load, mb / t_loads, mb / t_dump))
+
+os.remove(path)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+Worker process per controller against a single process, replayed in real
+time. Controller 0 has a heavy mapping (busy loop per report), the added
+latency of the other controllers is compared: in a single process they
+wait behind controller 0, with workers they must not.
+
+A worker is also killed while running: it must be restarted and the
+reports queued in its ring must still be processed.
+"""
+
+import os
+import mmap
+import time
+import signal
+import struct
+import random
+import tempfile
+import multiprocessing
+from steamcontroller.transport import ReplayBus
+from steamcontroller.manager import ControllerManager
+from steamcontroller.workers import Worker, PARENT_CHECK
+from common import report, synthetic
+
+N = 500
+CONTROLLERS = 4
+PERIOD = 0.004
+HEAVY = 0.002
+
+_clock = getattr(time, 'perf_counter', time.time)
+_DONE = struct.Struct('d')
+
+captures = []
+for seed in range(CONTROLLERS):
+    fd, path = tempfile.mkstemp(suffix='.sccap')
+    os.close(fd)
+    synthetic(path, N, seed, PERIOD)
+    captures.append(path)
+
+# callback completion time of each report, shared with the workers
+done = mmap.mmap(-1, _DONE.size * N * CONTROLLERS)
+
+def factory(name):
+    idx = int(name[len('replay'):])
+
+    def callback(sc, state):
+        if idx == 0:
+            end = _clock() + HEAVY
+            while _clock() < end:
+                pass
+        _DONE.pack_into(done, _DONE.size * (idx * N + state.seq), _clock())
+
+    return callback, None, None, []
+
+def run(workers, kill=None):
+    done[:] = b'\0' * len(done)
+    manager = ControllerManager(ReplayBus(captures, speed=1.0), factory,
+                                rescan=None, workers=workers, latency=workers)
+    manager.scan()
+    t0 = time.time()
+    killed = False
+    while manager.controllers():
+        manager.poll()
+        if kill and not killed and time.time() - t0 > 0.3:
+            for proc in multiprocessing.active_children():
+                if proc.name == 'sc-worker-' + kill:
+                    os.kill(proc.pid, signal.SIGKILL)
+                    killed = True
+    # let workers drain their rings
+    time.sleep(0.1)
+    stats = manager.stats()
+    manager.close()
+    return stats
+
+def added(idx):
+    """Latency added to each report, relative to the best one"""
+    times = [_DONE.unpack_from(done, _DONE.size * (idx * N + i))[0] for i in range(N)]
+    assert all(times), 'lost reports on controller {}'.format(idx)
+    late = [t - i * PERIOD for i, t in enumerate(times)]
+    best = min(late)
+    return sorted((x - best) * 1e6 for x in late)
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+print('{:10s} {:>10s} {:>10s} {:>12s}'.format('mode', 'p50', 'p99', 'heavy p99'))
+for workers in (False, True):
+    stats = run(workers)
+    if workers:
+        # measured by the workers, the parent devices list is empty
+        assert all(ctrl['latency_p99'] > 0 for ctrl in stats.values()), stats
+    light = sorted(sum((added(i) for i in range(1, CONTROLLERS)), []))
+    heavy = added(0)
+    print('{:10s} {:7.0f} us {:7.0f} us {:9.0f} us'.format(
+        'workers' if workers else 'single', percentile(light, 50), percentile(light, 99),
+        percentile(heavy, 99)))
+
+stats = run(True, kill='replay1')
+assert stats['replay1']['restarts'] == 1, stats['replay1']
+assert stats['replay1']['overflows'] == 0, stats['replay1']
+added(1)
+print('worker restart ok')
+
+# an idle worker is woken by every report, a lost wakeup would leave a
+# report waiting until the parent check
+def idle(name):
+    return (lambda sc, state: None), None, None, []
+
+worker = Worker('idle', idle)
+worker.start()
+rnd = random.Random(0)
+for i in range(300):
+    time.sleep(rnd.random() * 0.002)
+    worker.process(report(i))
+deadline = time.time() + 2.0
+while worker.stats()['depth'] and time.time() < deadline:
+    time.sleep(0.001)
+stats = worker.stats()
+worker.stop()
+assert stats['depth'] == 0 and stats['worker_p99'] < PARENT_CHECK * 1e6 / 10, stats
+print('idle worker wakeups: p99 {} us'.format(stats['worker_p99']))
+
+# a stuck worker (hung callback, full ring) is killed by stop() on time
+def stuck(name):
+    return (lambda sc, state: time.sleep(3600)), None, None, []
+
+worker = Worker('stuck', stuck, capacity=4)
+worker.start()
+for _ in range(8):
+    worker.process(report(0))
+t0 = time.time()
+worker.stop(timeout=0.2)
+assert time.time() - t0 < 1.0 and not worker.alive()
+print('stuck worker stopped in {:.0f} ms'.format((time.time() - t0) * 1e3))
+
+for path in captures:
+    os.remove(path)